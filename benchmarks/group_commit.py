@@ -0,0 +1,50 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import *
+
+from ext.database_manager import DatabaseManager
+from ext.utils import StringUtils
+
+
+def writes_per_second(group_commit: bool, writes: int, concurrency: int, synchronous: str) -> float:
+    db: DatabaseManager = DatabaseManager(StringUtils, db=os.path.join(tempfile.mkdtemp(prefix='mynotes-bench-'),
+                                                                       'MyNotes'),
+                                          pool_size=concurrency, group_commit=group_commit, synchronous=synchronous)
+    user_id: int = db.add_user('bench', 'password').user_id
+
+    def write(i: int) -> None:
+        note_id: int = db.add_note('subject', i % 6 + 1, user_id, weight=1.0)
+        if i % 4 == 3:
+            db.delete_note_by_id(user_id, note_id)
+
+    start: float = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(write, range(writes)))
+    elapsed: float = time.perf_counter() - start
+    db.close()
+    # every fourth write also deletes its note
+    return (writes + writes // 4) / elapsed
+
+
+def main() -> int:
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description='Write throughput with and without '
+                                                                          'group commit')
+    parser.add_argument('--writes', type=int, default=4000, help='Notes added per mode')
+    parser.add_argument('--concurrency', type=int, default=16, help='Writing threads')
+    parser.add_argument('--synchronous', default='NORMAL,FULL', help='Comma separated sqlite synchronous modes')
+    args: argparse.Namespace = parser.parse_args()
+
+    for synchronous in args.synchronous.split(','):
+        for group_commit in (False, True):
+            rate: float = writes_per_second(group_commit, args.writes, args.concurrency, synchronous)
+            print(f'synchronous={synchronous:<6} group commit {"on " if group_commit else "off"}: '
+                  f'{rate:9.1f} writes/s', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,75 @@
+import argparse
+import random
+import sys
+import time
+from typing import *
+
+from flask import jsonify
+
+from ext.flask_server import FlaskServer
+from ext.json_response import JsonResponses, encoder_from_string, orjson
+from ext.storage import NewNote, Subject, UserInfo
+
+
+def best_time(run: Callable[[], Any], rounds: int) -> float:
+    best: float = float('inf')
+    for _ in range(rounds):
+        start: float = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> int:
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description='Encoding time of /get_subject responses '
+                                                                          'with large note lists')
+    parser.add_argument('--notes', default='1000,10000,100000', help='Comma separated note counts')
+    parser.add_argument('--rounds', type=int, default=5, help='Runs per variant, the fastest counts')
+    args: argparse.Namespace = parser.parse_args()
+
+    encoders: List[str] = ['json'] + (['orjson'] if orjson is not None else [])
+    if orjson is None:
+        print('orjson is not installed, only the standard library is measured', file=sys.stderr)
+
+    # notes are kept in memory, so the end to end numbers are not dominated by sqlite
+    servers: Dict[str, FlaskServer] = {encoder: FlaskServer(storage='memory', json_encoder=encoder, metrics=False,
+                                                            token_lifetime=24 * 60 * 60, maintenance_interval=0)
+                                       for encoder in encoders}
+    rng: random.Random = random.Random(0)
+
+    for count in (int(count) for count in args.notes.split(',')):
+        notes: List[NewNote] = [NewNote('subject', rng.randint(1, 6), '2023-01-01', rng.choice((0.5, 1.0, 2.0)))
+                                for _ in range(count)]
+        print(f'/get_subject with {count} notes', file=sys.stderr)
+
+        # encoding only: the payload of /get_subject, once with jsonify as before and with every encoder
+        server: FlaskServer = servers[encoders[0]]
+        user: UserInfo = server.context.db.add_user(f'bench{count}', 'password')
+        user_id: int = user.user_id
+        server.context.db.add_notes(user_id, notes)
+        subject: Subject = server.context.db.get_subject(user_id, 'subject')
+        payload: dict = {'subject': subject.to_json(), 'notes': [note.to_json() for note in subject.notes],
+                         'next_after': None}
+        with server.app.app_context():
+            elapsed: float = best_time(lambda: jsonify(dict(status=200, error=False, **payload)), args.rounds)
+        print(f'  encode  jsonify : {elapsed * 1000:8.2f} ms', file=sys.stderr)
+        for encoder in encoders:
+            responses: JsonResponses = JsonResponses(encoder_from_string(encoder))
+            elapsed = best_time(lambda: responses.ok(payload), args.rounds)
+            print(f'  encode  {encoder:<8}: {elapsed * 1000:8.2f} ms', file=sys.stderr)
+
+        # the whole request through the Flask test client
+        for encoder, server in servers.items():
+            if server is not servers[encoders[0]]:
+                user = server.context.db.add_user(f'bench{count}', 'password')
+                server.context.db.add_notes(user.user_id, notes)
+            client = server.app.test_client()
+            body: dict = {'user_id': user.user_id, 'access_token': user.token_info.access_token, 'subject': 'subject'}
+            elapsed = best_time(lambda: client.post('/get_subject', json=body).get_data(), args.rounds)
+            print(f'  request {encoder:<8}: {elapsed * 1000:8.2f} ms', file=sys.stderr)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,45 @@
+import argparse
+import hashlib
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import *
+
+from ext.password_hashing import PasswordEngine, PasswordHasher, hasher_from_string
+
+COST_SETTINGS: Tuple[str, ...] = ('scrypt:ln=13,r=8,p=1', 'scrypt:ln=14,r=8,p=1', 'scrypt:ln=15,r=8,p=1',
+                                  'pbkdf2-sha256:i=300000', 'pbkdf2-sha256:i=600000')
+
+
+def logins_per_second(engine: PasswordEngine, stored: str, logins: int, concurrency: int) -> float:
+    password: str = hashlib.sha512(b'benchmark1').hexdigest()
+    start: float = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        checks = list(executor.map(lambda _: engine.verify(password, stored), range(logins)))
+    elapsed: float = time.perf_counter() - start
+    if not all(check.valid for check in checks):
+        raise RuntimeError('Password verification failed')
+    return logins / elapsed
+
+
+def main() -> int:
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description='Logins per second for each hash cost')
+    parser.add_argument('--settings', default=';'.join(COST_SETTINGS), help='Semicolon separated hash settings')
+    parser.add_argument('--logins', type=int, default=40, help='Password checks per setting')
+    parser.add_argument('--concurrency', type=int, default=8, help='Logins at the same time')
+    parser.add_argument('--workers', type=int, default=2, help='Hashing processes, 0 hashes on the calling thread')
+    args: argparse.Namespace = parser.parse_args()
+
+    for setting in args.settings.split(';'):
+        hasher: PasswordHasher = hasher_from_string(setting)
+        engine: PasswordEngine = PasswordEngine(hasher, workers=args.workers)
+        stored: str = engine.hash(hashlib.sha512(b'benchmark1').hexdigest())  # also starts the processes
+        rate: float = logins_per_second(engine, stored, args.logins, args.concurrency)
+        print(f'{setting:>26}: {rate:8.1f} logins/s  ({1000 / rate * args.concurrency:7.1f} ms per login '
+              f'at concurrency {args.concurrency})', file=sys.stderr)
+        engine.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,115 @@
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import *
+
+from ext.connection_pool import ConnectionPool
+from ext.database_manager import DatabaseManager
+from ext.storage import NewNote, Subject
+from ext.utils import StringUtils
+
+
+@dataclass
+class DictNote:
+    """
+    Note as it was before the row classes got slots, for comparison
+    """
+    id: int
+    subject: str
+    note: float
+    user_id: int
+    weight: float
+    release_date: str
+    created_at: str
+
+    def to_json(self, fields: Sequence[str] | None = None) -> dict:
+        data: dict = {
+            'id': self.id,
+            'subject': self.subject,
+            'note': self.note,
+            'user_id': self.user_id,
+            'weight': self.weight,
+            'release_date': self.release_date,
+            'created_at': self.created_at
+        }
+        if fields is None:
+            return data
+        return {field: data[field] for field in fields}
+
+
+def dict_notes(pool: ConnectionPool, user_id: int, subject: str) -> List[DictNote]:
+    """
+    Load the notes of a subject like get_subject did before
+    """
+    with pool.read() as cursor:
+        cursor.execute("""SELECT id, note, weight, release_date, created_at FROM notes WHERE note_owner = ?
+            AND subject = ? AND id > 0 ORDER BY id LIMIT -1""", (user_id, subject))
+        rows: List[Tuple] = cursor.fetchall()
+    return [DictNote(id=row[0], subject=subject, note=row[1], user_id=user_id, weight=row[2], release_date=row[3],
+                     created_at=row[4]) for row in rows]
+
+
+def measure(load: Callable[[], List], fields: Sequence[str] | None, rounds: int) -> Tuple[float, float, float]:
+    """
+    :return: Peak memory while loading in MB, seconds to load, seconds to convert the notes for the response
+    """
+    tracemalloc.start()
+    notes: List = load()
+    peak: int = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del notes
+
+    load_time: float = float('inf')
+    convert_time: float = float('inf')
+    for _ in range(rounds):
+        start: float = time.perf_counter()
+        notes = load()
+        load_time = min(load_time, time.perf_counter() - start)
+        start = time.perf_counter()
+        json.dumps([note.to_json(fields) for note in notes])
+        convert_time = min(convert_time, time.perf_counter() - start)
+    return peak / 1e6, load_time, convert_time
+
+
+def main() -> int:
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description='Memory and speed of loading and encoding '
+                                                                          'a large subject')
+    parser.add_argument('--notes', type=int, default=100000, help='Notes in the subject')
+    parser.add_argument('--rounds', type=int, default=5, help='Runs per variant, the fastest counts')
+    args: argparse.Namespace = parser.parse_args()
+
+    path: str = os.path.join(tempfile.mkdtemp(prefix='mynotes-bench-'), 'MyNotes')
+    db: DatabaseManager = DatabaseManager(StringUtils, db=path, pool_size=1)
+    user_id: int = db.add_user('bench', 'password').user_id
+    rng: random.Random = random.Random(0)
+    notes: List[NewNote] = [NewNote('subject', rng.randint(1, 6), '2023-01-01', rng.choice((0.5, 1.0, 2.0)))
+                            for _ in range(args.notes)]
+    for start in range(0, len(notes), 10000):
+        db.add_notes(user_id, notes[start:start + 10000])
+    pool: ConnectionPool = ConnectionPool(path, size=1)
+
+    def slotted() -> List:
+        subject: Subject = db.get_subject(user_id, 'subject')
+        return subject.notes
+
+    for fields in (None, ('id', 'note', 'weight')):
+        print(f'{args.notes} notes, fields: {", ".join(fields) if fields else "all"}', file=sys.stderr)
+        for name, load in (('dict rows', lambda: dict_notes(pool, user_id, 'subject')), ('slotted rows', slotted)):
+            peak, load_time, convert_time = measure(load, fields, args.rounds)
+            print(f'  {name:<12}: peak {peak:7.1f} MB  load {load_time * 1000:7.1f} ms  '
+                  f'to JSON {convert_time * 1000:7.1f} ms  ({args.notes / (load_time + convert_time):9.0f} notes/s)',
+                  file=sys.stderr)
+
+    pool.close()
+    db.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
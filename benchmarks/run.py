@@ -0,0 +1,668 @@
+import argparse
+import collections
+import contextlib
+import importlib.util
+import json
+import multiprocessing
+import os
+import random
+import socket
+import sqlite3 as sqlite
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from dataclasses import dataclass, asdict
+from typing import *
+
+from werkzeug.serving import make_server, BaseWSGIServer, WSGIRequestHandler
+
+from benchmarks.seed import BenchUser, SIZES, seed, encoded_password, login_password, parse_size
+from benchmarks.transport import TestClientTransport, HttpTransport
+from ext.connection_pool import ConnectionPool
+from ext.flask_server import FlaskServer
+from ext.storage import Note
+
+ENDPOINTS: Tuple[str, ...] = ('register', 'login', 'get_subjects', 'get_subject', 'get_note', 'add_note', 'add_notes',
+                              'delete_note', 'export', 'refresh_token')
+# endpoints of the modes which do not run everything by default
+MODE_ENDPOINTS: Dict[str, Tuple[str, ...]] = {'workers': ('get_subjects',), 'setup': ('get_note', 'get_subjects'),
+                                              'sizes': ('get_subjects',),
+                                              'servers': ('get_subjects', 'get_subject', 'add_note')}
+ROOT: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# servers started in a subprocess get the same settings as the in-process one
+SERVER_ENVIRONMENT: Dict[str, str] = {'MYNOTES_TOKEN_LIFETIME': str(24 * 60 * 60), 'MYNOTES_METRICS': '0',
+                                      'MYNOTES_LOGIN_LIMIT': 'off', 'MYNOTES_LOGIN_IP_LIMIT': 'off',
+                                      'MYNOTES_MAINTENANCE_INTERVAL': '0'}
+
+
+# the schema statements MyNotes.__init__ ran for every request before the database was shared
+LEGACY_SCHEMA: Tuple[str, ...] = (
+    """CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT NOT NULL,
+        password TEXT NOT NULL,
+        salt TEXT DEFAULT ''
+    )""",
+    """CREATE TABLE IF NOT EXISTS notes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        subject TEXT NOT NULL,
+        note TEXT NOT NULL,
+        note_owner INTEGER NOT NULL,
+        release_date TEXT DEFAULT '',
+        weight FLOAT DEFAULT 1.0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (note_owner) REFERENCES users(id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS tokens (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        access_token TEXT NOT NULL,
+        expires_at TIMESTAMP NOT NULL,
+        refresh_token TEXT NOT NULL,
+        user_id INTEGER NOT NULL,
+        FOREIGN KEY (user_id) REFERENCES users(id)
+    )"""
+)
+
+
+class QueryTransport:
+    def __init__(self, query: Callable[[int], Any]) -> None:
+        """
+        Calls a function with the user ID of the request instead of sending it, to time a query the same way
+        as an endpoint
+        :param query: Function which takes a user ID
+        """
+        self.__query: Callable[[int], Any] = query
+
+    def post(self, path: str, body: dict) -> Tuple[int, dict | str]:
+        self.__query(body['user_id'])
+        return 200, {}
+
+
+class OneByOneTransport:
+    def __init__(self, transport) -> None:
+        """
+        Sends the notes of an /add_notes request as one /add_note request per note
+        :param transport: Transport which sends the /add_note requests
+        """
+        self.__transport = transport
+
+    def post(self, path: str, body: dict) -> Tuple[int, dict | str]:
+        auth: dict = {'user_id': body['user_id'], 'access_token': body['access_token']}
+        for note in body['notes']:
+            status, response = self.__transport.post('/add_note', dict(auth, **note))
+            if status != 200:
+                break
+        return status, response
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs) -> None:
+        pass
+
+
+@dataclass
+class EndpointResult:
+    requests: int
+    errors: int
+    throughput_rps: float
+    mean_ms: float
+    p50_ms: float
+    p90_ms: float
+    p99_ms: float
+    max_ms: float
+
+
+class Scenarios:
+    def __init__(self, users: List[BenchUser], run_id: str, rng: random.Random, batch_size: int = 10) -> None:
+        """
+        Request bodies for every endpoint, drawn from the seeded users
+        :param users: Seeded users
+        :param run_id: Unique ID of the run (keeps registered usernames unique)
+        :param rng: Random number generator
+        :param batch_size: Notes per /add_notes request
+        """
+        self.__users: List[BenchUser] = users
+        self.__run_id: str = run_id
+        self.__rng: random.Random = rng
+        self.__batch_size: int = batch_size
+        self.__lock: threading.Lock = threading.Lock()
+        # notes created by add_note, deleted again by delete_note
+        self.__added: Deque[Tuple[BenchUser, int]] = collections.deque()
+
+    def __user(self) -> BenchUser:
+        with self.__lock:
+            return self.__rng.choice(self.__users)
+
+    def request(self, endpoint: str, i: int) -> Tuple[str, dict, Callable[[dict | str], None] | None]:
+        """
+        Build a request
+        :param endpoint: Endpoint name
+        :param i: Number of the request
+        :return: Path, JSON body and an optional callback for the response body
+        """
+        if endpoint == 'register':
+            return '/register', {'username': f'r{self.__run_id}{i}', 'password': encoded_password}, None
+
+        if endpoint == 'refresh_token':
+            user: BenchUser = self.__users[i % len(self.__users)]
+            return '/refresh_token', {'user_id': user.user_id, 'refresh_token': user.refresh_token}, None
+
+        if endpoint == 'delete_note':
+            with self.__lock:
+                user, note_id = self.__added.popleft() if self.__added else (self.__user(), -1)
+            return '/delete_note', dict(user.auth(), note_id=note_id), None
+
+        user: BenchUser = self.__user()
+        if endpoint == 'login':
+            return '/login', {'username': user.username, 'password': login_password}, None
+        if endpoint == 'get_subjects':
+            return '/get_subjects', user.auth(), None
+        if endpoint == 'export':
+            return '/export', user.auth(), None
+
+        with self.__lock:
+            subject: str = self.__rng.choice(user.subjects)
+            note_id: int = self.__rng.choice(user.note_ids) if user.note_ids else 0
+            note: dict = {'subject': subject, 'note': self.__rng.randint(1, 6), 'weight': 1.0,
+                          'release_date': '2023-06-01'}
+
+        if endpoint == 'get_subject':
+            return '/get_subject', dict(user.auth(), subject=subject), None
+        if endpoint == 'get_note':
+            return '/get_note', dict(user.auth(), note_id=note_id), None
+        if endpoint == 'add_note':
+            def remember(body: dict | str) -> None:
+                if isinstance(body, dict) and not body.get('error'):
+                    with self.__lock:
+                        self.__added.append((user, body['note_id']))
+
+            return '/add_note', dict(user.auth(), **note), remember
+        if endpoint == 'add_notes':
+            return '/add_notes', dict(user.auth(), notes=[note] * self.__batch_size), None
+
+        raise ValueError(f'Unknown endpoint {endpoint}')
+
+
+def percentile(values: List[float], p: float) -> float:
+    """
+    Nearest-rank percentile of sorted values
+    """
+    if not values:
+        return 0.0
+    index: int = max(0, min(len(values) - 1, int(round(p / 100 * len(values) + 0.5)) - 1))
+    return values[index]
+
+
+def send(transport, scenarios: Scenarios, endpoint: str, requests: int, concurrency: int) -> Tuple[List[float], int]:
+    """
+    Send requests to one endpoint from several threads
+    :return: Latencies in seconds and number of failed requests
+    """
+    latencies: List[float] = []
+    errors: List[int] = [0]
+    lock: threading.Lock = threading.Lock()
+
+    def one(i: int) -> None:
+        path, body, callback = scenarios.request(endpoint, i)
+        start: float = time.perf_counter()
+        status, response = transport.post(path, body)
+        duration: float = time.perf_counter() - start
+
+        failed: bool = status != 200 or (isinstance(response, dict) and response.get('error', False))
+        if callback is not None:
+            callback(response)
+        with lock:
+            latencies.append(duration)
+            errors[0] += failed
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one, range(requests)))
+    return latencies, errors[0]
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> EndpointResult:
+    latencies.sort()
+    return EndpointResult(
+        requests=len(latencies),
+        errors=errors,
+        throughput_rps=round(len(latencies) / elapsed, 1),
+        mean_ms=round(sum(latencies) / len(latencies) * 1000, 3),
+        p50_ms=round(percentile(latencies, 50) * 1000, 3),
+        p90_ms=round(percentile(latencies, 90) * 1000, 3),
+        p99_ms=round(percentile(latencies, 99) * 1000, 3),
+        max_ms=round(latencies[-1] * 1000, 3)
+    )
+
+
+def run_endpoint(transport, scenarios: Scenarios, endpoint: str, requests: int, concurrency: int) -> EndpointResult:
+    start: float = time.perf_counter()
+    latencies, errors = send(transport, scenarios, endpoint, requests, concurrency)
+    return summarize(latencies, errors, time.perf_counter() - start)
+
+
+def print_result(name: str, result: EndpointResult) -> None:
+    print(f'{name:>24}: {result.throughput_rps:>9} req/s  p50 {result.p50_ms:>8} ms  '
+          f'p99 {result.p99_ms:>8} ms  errors {result.errors}', file=sys.stderr)
+
+
+def client_process(url: str, users: List[BenchUser], run_id: str, seed: int, endpoint: str, requests: int,
+                   concurrency: int, barrier) -> Tuple[List[float], int, float, float]:
+    """
+    One load generating process of run_endpoint_processes
+    :return: Latencies, failed requests and wall clock start and end time
+    """
+    scenarios: Scenarios = Scenarios(users, run_id, random.Random(seed))
+    transport: HttpTransport = HttpTransport(url)
+    # all processes start at the same time, spawning them is not measured
+    barrier.wait()
+    start: float = time.time()
+    latencies, errors = send(transport, scenarios, endpoint, requests, concurrency)
+    return latencies, errors, start, time.time()
+
+
+def run_endpoint_processes(url: str, users: List[BenchUser], run_id: str, endpoint: str, requests: int,
+                           concurrency: int, processes: int) -> EndpointResult:
+    """
+    Like run_endpoint over HTTP, but the requests are sent from several processes. A single Python process
+    can not generate enough load for a server with several worker processes.
+    :param processes: Number of client processes, each with concurrency threads
+    """
+    context = multiprocessing.get_context('spawn')
+    with context.Manager() as manager, ProcessPoolExecutor(processes, mp_context=context) as executor:
+        barrier = manager.Barrier(processes)
+        futures: List = [executor.submit(client_process, url, users, f'{run_id}p{i}', i, endpoint,
+                                         requests // processes + (i < requests % processes), concurrency, barrier)
+                         for i in range(processes)]
+        parts: List[Tuple[List[float], int, float, float]] = [future.result() for future in futures]
+    latencies: List[float] = [latency for part in parts for latency in part[0]]
+    elapsed: float = max(part[3] for part in parts) - min(part[2] for part in parts)
+    return summarize(latencies, sum(part[1] for part in parts), elapsed)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@contextlib.contextmanager
+def server_process(command: List[str], port: int, environment: Dict[str, str] | None = None,
+                   timeout: float = 30.0) -> Iterator[str]:
+    """
+    Run a server in a subprocess until the block is left
+    :param command: Command line of the server, it must listen on 127.0.0.1:port
+    :param port: Port of the server
+    :param environment: Additional environment variables of the server
+    :param timeout: Seconds to wait for the server to accept connections
+    :return: URL of the server
+    """
+    process: subprocess.Popen = subprocess.Popen(command, cwd=ROOT,
+                                                 env=dict(os.environ, **SERVER_ENVIRONMENT, **(environment or {})),
+                                                 stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline: float = time.monotonic() + timeout
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f'{" ".join(command)} exited with status {process.returncode}')
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f'{" ".join(command)} did not start within {timeout} seconds')
+                time.sleep(0.1)
+        yield f'http://127.0.0.1:{port}'
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def run_endpoints(server: FlaskServer, users: List[BenchUser], run_id: str, rng: random.Random, endpoints: List[str],
+                  args: argparse.Namespace) -> Dict[str, dict]:
+    """
+    Run the endpoints through the test client, an in-process HTTP server or the server at args.url
+    :return: Results by endpoint
+    """
+    http_server: BaseWSGIServer | None = None
+    if args.mode == 'client':
+        transport = TestClientTransport(server.app)
+    elif args.url:
+        transport = HttpTransport(args.url)
+    else:
+        http_server = make_server('127.0.0.1', 0, server.app, threaded=True,
+                                  request_handler=QuietRequestHandler)
+        threading.Thread(target=http_server.serve_forever, daemon=True).start()
+        transport = HttpTransport(f'http://127.0.0.1:{http_server.server_port}')
+
+    scenarios: Scenarios = Scenarios(users, run_id, rng)
+    results: Dict[str, dict] = {}
+    try:
+        for endpoint in endpoints:
+            result: EndpointResult = run_endpoint(transport, scenarios, endpoint, args.requests, args.concurrency)
+            results[endpoint] = asdict(result)
+            print_result(endpoint, result)
+    finally:
+        if http_server is not None:
+            http_server.shutdown()
+    return results
+
+
+def legacy_request_setup(db: str) -> Callable[[], None]:
+    """
+    before_request hook which repeats the setup every request did when each view built its own DatabaseManager:
+    open a connection, run the schema statements and commit
+    :param db: Path to the database file
+    """
+    def setup() -> None:
+        connection: sqlite.Connection = sqlite.connect(db, check_same_thread=False)
+        cursor: sqlite.Cursor = connection.cursor()
+        for statement in LEGACY_SCHEMA:
+            cursor.execute(statement)
+        connection.commit()
+        connection.close()
+
+    return setup
+
+
+def run_setup(server: FlaskServer, db: str, users: List[BenchUser], run_id: str, endpoints: List[str],
+              args: argparse.Namespace) -> Dict[str, dict]:
+    """
+    Run the endpoints through the test client with the shared database and with the per-request setup
+    :return: Results by endpoint@shared and endpoint@per-request
+    """
+    legacy: FlaskServer = create_server(db, args)
+    legacy.app.before_request(legacy_request_setup(db))
+    results: Dict[str, dict] = {}
+    for name, app in (('shared', server.app), ('per-request', legacy.app)):
+        # both variants send the same requests
+        scenarios: Scenarios = Scenarios(users, run_id, random.Random(args.seed))
+        for endpoint in endpoints:
+            result: EndpointResult = run_endpoint(TestClientTransport(app), scenarios, endpoint, args.requests,
+                                                  args.concurrency)
+            results[f'{endpoint}@{name}'] = asdict(result)
+            print_result(f'{endpoint}@{name}', result)
+    close_server(legacy)
+    return results
+
+
+def subjects_per_subject(pool: ConnectionPool, user_id: int) -> List[Tuple[str, int, float]]:
+    """
+    Subject summaries as get_all_subjects built them at first: one query for the subject names, then one query
+    per subject which loads all its notes, the GPA is calculated in Python
+    """
+    with pool.read() as cursor:
+        cursor.execute("""SELECT DISTINCT subject FROM notes WHERE note_owner = ?""", (user_id,))
+        subjects: List[str] = [row[0] for row in cursor.fetchall()]
+        summaries: List[Tuple[str, int, float]] = []
+        for subject in subjects:
+            cursor.execute("""SELECT id, note, weight, release_date, created_at FROM notes WHERE note_owner = ?
+                AND subject = ?""", (user_id, subject))
+            notes: List[Note] = [Note(id=row[0], subject=subject, note=row[1], user_id=user_id, weight=row[2],
+                                      release_date=row[3], created_at=row[4]) for row in cursor.fetchall()]
+            gpa: float = sum(float(note.note) * note.weight for note in notes) / sum(note.weight for note in notes)
+            summaries.append((subject, len(notes), gpa))
+    return summaries
+
+
+def subjects_group_by(pool: ConnectionPool, user_id: int) -> List[Tuple[str, int, float]]:
+    """
+    Subject summaries aggregated by sqlite in a single GROUP BY query, before the stats were kept in subject_stats
+    """
+    with pool.read() as cursor:
+        cursor.execute("""SELECT subject, COUNT(*), SUM(note * weight) / SUM(weight) FROM notes WHERE note_owner = ?
+            GROUP BY subject""", (user_id,))
+        return cursor.fetchall()
+
+
+def run_sizes(db: str, endpoints: List[str], args: argparse.Namespace) -> Dict[str, dict]:
+    """
+    Seed a database per size in args.sizes and run the endpoints and both older ways of building
+    the /get_subjects summaries on each
+    :return: Results by endpoint@size, per-subject@size and group-by@size
+    """
+    results: Dict[str, dict] = {}
+    for size in (parse_size(size) for size in args.sizes.split(',')):
+        size_db: str = f'{db}-{size}'
+        server: FlaskServer = create_server(size_db, args)
+        rng: random.Random = random.Random(args.seed)
+        print(f'Seeding {args.users} users x {args.subjects} subjects x {size} notes into {size_db}',
+              file=sys.stderr)
+        users: List[BenchUser] = seed(server, args.users, args.subjects, size, prefix=f's{size}u', rng=rng)
+        pool: ConnectionPool = ConnectionPool(size_db, size=args.concurrency)
+
+        variants: List[Tuple[str, str, Any]] = [(endpoint, endpoint, TestClientTransport(server.app))
+                                                for endpoint in endpoints]
+        variants += [('per-subject', 'get_subjects',
+                      QueryTransport(lambda user_id: subjects_per_subject(pool, user_id))),
+                     ('group-by', 'get_subjects', QueryTransport(lambda user_id: subjects_group_by(pool, user_id)))]
+        for name, endpoint, transport in variants:
+            scenarios: Scenarios = Scenarios(users, f'{size}', random.Random(args.seed))
+            requests: int = args.requests
+            if isinstance(transport, QueryTransport):
+                # the older ways load or scan every note, at 100000 notes per subject one call takes seconds
+                requests = min(args.requests, max(args.concurrency, args.requests * 100 // size))
+            result: EndpointResult = run_endpoint(transport, scenarios, endpoint, requests, args.concurrency)
+            results[f'{name}@{size}'] = asdict(result)
+            print_result(f'{name}@{size}', result)
+
+        pool.close()
+        close_server(server)
+    return results
+
+
+def run_batch(server: FlaskServer, users: List[BenchUser], run_id: str, args: argparse.Namespace) -> Dict[str, dict]:
+    """
+    Import args.batch_size notes at a time, once with one /add_note request per note and once with
+    a single /add_notes request
+    :return: Results by add_note@batch_size and add_notes@batch_size, each request of them is one import
+    """
+    results: Dict[str, dict] = {}
+    transport: TestClientTransport = TestClientTransport(server.app)
+    for name, import_transport in (('add_note', OneByOneTransport(transport)), ('add_notes', transport)):
+        scenarios: Scenarios = Scenarios(users, run_id, random.Random(args.seed), batch_size=args.batch_size)
+        result: EndpointResult = run_endpoint(import_transport, scenarios, 'add_notes', args.requests,
+                                              args.concurrency)
+        results[f'{name}@{args.batch_size}'] = asdict(result)
+        print_result(f'{name}@{args.batch_size}', result)
+        print(f'{"":>24}  {result.throughput_rps * args.batch_size:>9.1f} notes/s', file=sys.stderr)
+    return results
+
+
+def prefork_command(db: str, port: int, workers: int) -> List[str]:
+    return [sys.executable, '-m', 'ext.prefork_server', '--host', '127.0.0.1', '--port', str(port),
+            '--workers', str(workers), '--db', db]
+
+
+def load_server(name: str, command: List[str], port: int, users: List[BenchUser], run_id: str, endpoints: List[str],
+                args: argparse.Namespace, environment: Dict[str, str] | None = None) -> Dict[str, dict]:
+    """
+    Start a server in a subprocess and run the endpoints against it from args.client_processes processes
+    :param name: Name of the server in the results
+    :param environment: Additional environment variables of the server
+    :return: Results by endpoint@name
+    """
+    results: Dict[str, dict] = {}
+    with server_process(command, port, environment) as url:
+        for endpoint in endpoints:
+            result: EndpointResult = run_endpoint_processes(url, users, f'{run_id}{name}', endpoint, args.requests,
+                                                            args.concurrency, args.client_processes)
+            results[f'{endpoint}@{name}'] = asdict(result)
+            print_result(f'{endpoint}@{name}', result)
+    return results
+
+
+def run_workers(db: str, users: List[BenchUser], run_id: str, endpoints: List[str],
+                args: argparse.Namespace) -> Dict[str, dict]:
+    """
+    Start the prefork server with 1 to args.workers workers and load it from args.client_processes processes
+    :return: Results by endpoint@workers
+    """
+    results: Dict[str, dict] = {}
+    for workers in range(1, args.workers + 1):
+        port: int = free_port()
+        results.update(load_server(str(workers), prefork_command(db, port, workers), port, users, run_id, endpoints,
+                                   args))
+    return results
+
+
+def run_servers(db: str, users: List[BenchUser], run_id: str, endpoints: List[str],
+                args: argparse.Namespace) -> Dict[str, dict]:
+    """
+    Run the endpoints against the WSGI server (the prefork server with a single worker, i.e. werkzeug's threaded
+    server) and the ASGI server (uvicorn)
+    :return: Results by endpoint@wsgi and endpoint@asgi
+    """
+    port: int = free_port()
+    results: Dict[str, dict] = load_server('wsgi', prefork_command(db, port, 1), port, users, run_id, endpoints,
+                                           args)
+    port = free_port()
+    command: List[str] = [sys.executable, '-m', 'uvicorn', '--factory', 'ext.asgi_server:create_app',
+                          '--host', '127.0.0.1', '--port', str(port), '--log-level', 'warning']
+    results.update(load_server('asgi', command, port, users, run_id, endpoints, args, {'MYNOTES_DB': db}))
+    return results
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], max_regression: float) -> List[str]:
+    """
+    Compare the median latency of every endpoint with a baseline
+    :param results: Endpoint results of this run
+    :param baseline: Endpoint results of the baseline run
+    :param max_regression: Allowed slowdown in percent
+    :return: Descriptions of the endpoints which got slower than allowed
+    """
+    regressions: List[str] = []
+    for endpoint, result in results.items():
+        if endpoint not in baseline or baseline[endpoint]['p50_ms'] <= 0:
+            continue
+        change: float = (result['p50_ms'] / baseline[endpoint]['p50_ms'] - 1) * 100
+        if change > max_regression:
+            regressions.append(f'{endpoint}: p50 {baseline[endpoint]["p50_ms"]} ms -> {result["p50_ms"]} ms '
+                               f'(+{change:.1f}%)')
+    return regressions
+
+
+def create_server(db: str, args: argparse.Namespace) -> FlaskServer:
+    # the tokens have to stay valid for the whole run, and the login benchmark must not be rate limited
+    return FlaskServer(db=db, pool_size=max(8, args.concurrency), token_lifetime=24 * 60 * 60, metrics=False,
+                       login_limit='off', storage=args.storage)
+
+
+def close_server(server: FlaskServer) -> None:
+    if server.maintenance is not None:
+        server.maintenance.stop()
+    server.context.db.close()
+
+
+def main() -> int:
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description='Benchmark every MyNotes endpoint')
+    parser.add_argument('--mode', choices=('client', 'http', 'workers', 'setup', 'sizes', 'batch', 'servers'),
+                        default='client',
+                        help='Flask test client (no network), real HTTP, the prefork server with 1 to --workers '
+                             'worker processes, the shared database against a database set up per request, '
+                             '/get_subjects with --sizes notes per subject, importing notes with /add_note '
+                             'against /add_notes, or the WSGI against the ASGI server')
+    parser.add_argument('--url', help='Benchmark an already running server (http mode), it must use --db')
+    parser.add_argument('--db', help='Database file (default: a new temporary file)')
+    parser.add_argument('--storage', choices=('sqlite', 'memory'), default='sqlite',
+                        help='Storage backend, memory measures the HTTP layer without any I/O')
+    parser.add_argument('--users', type=int, help='Seeded users (default: 20, 2 for sizes)')
+    parser.add_argument('--subjects', type=int, default=8)
+    parser.add_argument('--notes', type=parse_size, default=25,
+                        help=f'Notes per subject and user, a number or {", ".join(SIZES)}')
+    parser.add_argument('--sizes', default=','.join(SIZES),
+                        help='Comma separated notes per subject of the sizes mode (default: 10, 1000, 100000)')
+    parser.add_argument('--requests', type=int, default=500, help='Requests per endpoint, imports in the batch mode')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--endpoints', help='Comma separated endpoints to run (default: all, get_subjects for '
+                                            'workers and sizes, get_note and get_subjects for setup, get_subjects, '
+                                            'get_subject and add_note for servers)')
+    parser.add_argument('--batch-size', type=int, default=50,
+                        help='Notes per import of the batch mode (default: 50)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='Highest worker count of the workers mode (default: number of cores)')
+    parser.add_argument('--client-processes', type=int, default=os.cpu_count() or 1,
+                        help='Processes which send the requests in the workers and servers modes '
+                             '(default: number of cores)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    parser.add_argument('--baseline', help='Fail if an endpoint is slower than in this result file')
+    parser.add_argument('--max-regression', type=float, default=10.0, help='Allowed slowdown in percent')
+    args: argparse.Namespace = parser.parse_args()
+
+    if args.endpoints is None:
+        args.endpoints = ','.join(MODE_ENDPOINTS.get(args.mode, ENDPOINTS))
+    endpoints: List[str] = [endpoint for endpoint in args.endpoints.split(',') if endpoint]
+    for endpoint in endpoints:
+        if endpoint not in ENDPOINTS:
+            parser.error(f'Unknown endpoint {endpoint}')
+    if args.users is None:
+        args.users = 2 if args.mode == 'sizes' else 20
+    if args.mode in ('workers', 'setup', 'sizes', 'servers') and (args.storage != 'sqlite' or args.url):
+        parser.error(f'The {args.mode} mode starts its own servers on the sqlite database')
+    if args.mode == 'servers' and importlib.util.find_spec('uvicorn') is None:
+        parser.error('The servers mode needs uvicorn (pip install uvicorn)')
+
+    db: str = args.db or os.path.join(tempfile.mkdtemp(prefix='mynotes-bench-'), 'MyNotes')
+    if args.mode == 'sizes':
+        # seeds its own database for every size
+        results: Dict[str, dict] = run_sizes(db, endpoints, args)
+        return report(args, results)
+
+    rng: random.Random = random.Random(args.seed)
+    run_id: str = ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(6))
+
+    server: FlaskServer = create_server(db, args)
+    target: str = db if args.storage == 'sqlite' else 'memory'
+    print(f'Seeding {args.users} users x {args.subjects} subjects x {args.notes} notes into {target}',
+          file=sys.stderr)
+    users: List[BenchUser] = seed(server, args.users, args.subjects, args.notes, prefix=f'b{run_id}', rng=rng)
+
+    if args.mode == 'workers':
+        results = run_workers(db, users, run_id, endpoints, args)
+    elif args.mode == 'servers':
+        results = run_servers(db, users, run_id, endpoints, args)
+    elif args.mode == 'setup':
+        results = run_setup(server, db, users, run_id, endpoints, args)
+    elif args.mode == 'batch':
+        results = run_batch(server, users, run_id, args)
+    else:
+        results = run_endpoints(server, users, run_id, rng, endpoints, args)
+    return report(args, results)
+
+
+def report(args: argparse.Namespace, results: Dict[str, dict]) -> int:
+    """
+    Write the results and compare them with the baseline
+    :return: Exit code, 1 if an endpoint got slower than allowed
+    """
+    output: str = json.dumps({
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'baseline')},
+        'endpoints': results
+    }, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output + '\n')
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline: Dict[str, dict] = json.load(file)['endpoints']
+        regressions: List[str] = compare(results, baseline, args.max_regression)
+        for regression in regressions:
+            print(f'REGRESSION {regression}', file=sys.stderr)
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
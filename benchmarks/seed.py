@@ -0,0 +1,81 @@
+import base64
+import hashlib
+import random
+from dataclasses import dataclass, field
+from typing import *
+
+from ext.database_manager import NewNote
+from ext.flask_server import FlaskServer
+
+password: str = 'benchmark1'
+encoded_password: str = base64.b64encode(password.encode()).decode()
+# /login expects the sha512 hash of the password
+login_password: str = hashlib.sha512(password.encode()).hexdigest()
+# notes per subject of the named seed sizes
+SIZES: Dict[str, int] = {'small': 10, 'medium': 1000, 'large': 100000}
+
+
+def parse_size(value: str) -> int:
+    """
+    Parse a seed size
+    :param value: small, medium, large or a number of notes per subject
+    :return: Notes per subject
+    """
+    if value in SIZES:
+        return SIZES[value]
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f'Unknown seed size "{value}", expected {", ".join(SIZES)} or a number') from None
+
+
+@dataclass
+class BenchUser:
+    username: str
+    user_id: int
+    access_token: str
+    refresh_token: str
+    subjects: List[str]
+    note_ids: List[int] = field(default_factory=list)
+
+    def auth(self) -> dict:
+        return {'user_id': self.user_id, 'access_token': self.access_token}
+
+
+def seed(server: FlaskServer, users: int, subjects: int, notes: int, prefix: str = 'bench',
+         rng: random.Random | None = None) -> List[BenchUser]:
+    """
+    Create users through /register and give each of them notes in several subjects
+    :param server: Server which owns the database to seed
+    :param users: Number of users
+    :param subjects: Subjects per user
+    :param notes: Notes per subject
+    :param prefix: Prefix of the usernames
+    :param rng: Random number generator (seeded for reproducible runs)
+    :return: Seeded users
+    """
+    rng = rng or random.Random(0)
+    client = server.app.test_client()
+    subject_names: List[str] = [f'subject{i}' for i in range(subjects)]
+    seeded: List[BenchUser] = []
+
+    for i in range(users):
+        username: str = f'{prefix}{i}'
+        response: dict = client.post('/register', json={'username': username, 'password': encoded_password}).get_json()
+        if response['error']:
+            raise RuntimeError(f'Could not register {username}: {response["error_msg"]}')
+
+        user: BenchUser = BenchUser(username=username, user_id=response['user_id'],
+                                    access_token=response['access_token'], refresh_token=response['refresh_token'],
+                                    subjects=subject_names)
+
+        new_notes: List[NewNote] = [NewNote(subject=subject, note=rng.randint(1, 6),
+                                            release_date=f'2023-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}',
+                                            weight=rng.choice((0.5, 1.0, 2.0)))
+                                    for subject in subject_names for _ in range(notes)]
+        for start in range(0, len(new_notes), 10000):
+            user.note_ids.extend(server.context.db.add_notes(user.user_id, new_notes[start:start + 10000]))
+
+        seeded.append(user)
+
+    return seeded
@@ -0,0 +1,47 @@
+import argparse
+import random
+import string
+import sys
+import time
+from typing import *
+
+from ext.token_generator import generate_token, generate_tokens, TokenPool
+
+token_chars: str = string.ascii_letters + string.digits + '_!@#'
+
+
+def random_choice_token(length: int, chars: str) -> str:
+    # the previous implementation of StringUtils.generate_token
+    return ''.join(random.choice(chars) for _ in range(length))
+
+
+def measure(name: str, generate: Callable[[], Any], count: int, per_call: int = 1) -> float:
+    start: float = time.perf_counter()
+    for _ in range(count // per_call):
+        generate()
+    elapsed: float = time.perf_counter() - start
+    microseconds: float = elapsed / count * 1e6
+    print(f'{name:>22}: {microseconds:8.3f} us per token', file=sys.stderr)
+    return microseconds
+
+
+def main() -> int:
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description='Compare token generation strategies')
+    parser.add_argument('--tokens', type=int, default=100000, help='Tokens generated per strategy')
+    parser.add_argument('--length', type=int, default=32)
+    args: argparse.Namespace = parser.parse_args()
+
+    measure('random.choice loop', lambda: random_choice_token(args.length, token_chars), args.tokens)
+    measure('generate_token', lambda: generate_token(args.length, token_chars), args.tokens)
+    measure('generate_tokens x1000', lambda: generate_tokens(1000, args.length, token_chars), args.tokens, 1000)
+
+    pool: TokenPool = TokenPool(args.length, token_chars, size=args.tokens)
+    while len(pool) < args.tokens:
+        time.sleep(0.01)
+    measure('TokenPool.get (filled)', pool.get, args.tokens)
+    pool.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
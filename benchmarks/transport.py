@@ -0,0 +1,64 @@
+import http.client
+import json
+import threading
+import urllib.parse
+from typing import *
+
+from flask import Flask
+
+
+class TestClientTransport:
+    def __init__(self, app: Flask) -> None:
+        """
+        Send requests through the Flask test client (no network, measures the application only)
+        :param app: Flask app
+        """
+        self.__app: Flask = app
+        self.__local: threading.local = threading.local()
+
+    def post(self, path: str, body: dict) -> Tuple[int, dict | str]:
+        client = getattr(self.__local, 'client', None)
+        if client is None:
+            client = self.__local.client = self.__app.test_client()
+        response = client.post(path, json=body)
+        return response.status_code, response.get_json(silent=True) or response.get_data(as_text=True)
+
+
+class HttpTransport:
+    def __init__(self, url: str) -> None:
+        """
+        Send requests over real HTTP, one keep-alive connection per thread
+        :param url: Base URL of the server, e.g. http://127.0.0.1:5000
+        """
+        parsed: urllib.parse.ParseResult = urllib.parse.urlparse(url)
+        self.__host: str = parsed.hostname or '127.0.0.1'
+        self.__port: int = parsed.port or 80
+        self.__local: threading.local = threading.local()
+
+    def __connection(self) -> http.client.HTTPConnection:
+        connection: http.client.HTTPConnection | None = getattr(self.__local, 'connection', None)
+        if connection is None:
+            connection = self.__local.connection = http.client.HTTPConnection(self.__host, self.__port, timeout=60)
+        return connection
+
+    def post(self, path: str, body: dict) -> Tuple[int, dict | str]:
+        data: bytes = json.dumps(body).encode()
+        headers: dict = {'Content-Type': 'application/json'}
+        for attempt in range(2):
+            connection: http.client.HTTPConnection = self.__connection()
+            try:
+                connection.request('POST', path, body=data, headers=headers)
+                response: http.client.HTTPResponse = connection.getresponse()
+                raw: bytes = response.read()
+                break
+            except (ConnectionError, http.client.HTTPException):
+                # the server closed the keep-alive connection, retry once with a new one
+                connection.close()
+                self.__local.connection = None
+                if attempt == 1:
+                    raise
+
+        try:
+            return response.status, json.loads(raw)
+        except ValueError:
+            return response.status, raw.decode(errors='replace')
@@ -0,0 +1,102 @@
+import argparse
+import json
+import os
+import random
+import sqlite3 as sqlite
+import sys
+import tempfile
+import time
+from typing import *
+
+from ext.connection_pool import ConnectionPool
+from ext.migrations import MigrationRunner, MIGRATIONS
+from ext.storage import Note
+from ext.utils import StringUtils
+
+TEXT_SCHEMA: int = 3  # last schema version with TEXT notes
+
+
+def create_database(path: str, notes: int, rng: random.Random) -> None:
+    """
+    Create a database with the schema before the typed columns and one user with one subject
+    """
+    pool: ConnectionPool = ConnectionPool(path, size=1)
+    MigrationRunner(MIGRATIONS[:TEXT_SCHEMA]).migrate(pool)
+    with pool.write() as cursor:
+        cursor.execute("""INSERT INTO users (username, password) VALUES ('bench', 'password')""")
+        cursor.execute("""INSERT INTO tokens (access_token, expires_at, refresh_token, user_id)
+            VALUES ('token', ?, 'refresh', 1)""", (str(int(time.time()) + 3600),))
+        cursor.executemany("""INSERT INTO notes (subject, note, note_owner, release_date, weight)
+            VALUES ('subject', ?, 1, '2023-01-01', ?)""",
+                           [(str(rng.randint(1, 6)), rng.choice((0.5, 1.0, 2.0))) for _ in range(notes)])
+    pool.close()
+
+
+def get_subject_request(pool: ConnectionPool, is_expired: Callable[[Any], bool]) -> str:
+    """
+    What /get_subject does with the database: authenticate, load the subject and encode the response
+    """
+    with pool.read() as cursor:
+        cursor.execute("""SELECT tokens.access_token, tokens.refresh_token, tokens.expires_at FROM users
+            JOIN tokens ON tokens.user_id = users.id WHERE users.id = 1 LIMIT 1""")
+        if is_expired(cursor.fetchone()[2]):
+            raise RuntimeError('Token expired')
+        cursor.execute("""SELECT weighted_sum / total_weight, note_count FROM subject_stats
+            WHERE user_id = 1 AND subject = 'subject'""")
+        gpa, note_count = cursor.fetchone()
+        cursor.execute("""SELECT id, note, weight, release_date, created_at FROM notes
+            WHERE note_owner = 1 AND subject = 'subject' AND id > 0 ORDER BY id LIMIT -1""")
+        notes: List[Note] = [Note(id=row[0], subject='subject', note=row[1], user_id=1, weight=row[2],
+                                  release_date=row[3], created_at=row[4]) for row in cursor.fetchall()]
+    return json.dumps({'status': 200, 'error': False,
+                       'subject': {'name': 'subject', 'note_count': note_count, 'gpa': gpa},
+                       'notes': [note.to_json() for note in notes], 'next_after': None})
+
+
+def cpu_per_request(pool: ConnectionPool, is_expired: Callable[[Any], bool], requests: int) -> float:
+    get_subject_request(pool, is_expired)  # warm up the connection and the page cache
+    start: float = time.process_time()
+    for _ in range(requests):
+        get_subject_request(pool, is_expired)
+    return (time.process_time() - start) / requests
+
+
+def main() -> int:
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description='CPU time of /get_subject with TEXT notes '
+                                                                          'and with typed columns')
+    parser.add_argument('--notes', type=int, default=1000, help='Notes in the subject')
+    parser.add_argument('--requests', type=int, default=300, help='Requests per schema and round')
+    parser.add_argument('--rounds', type=int, default=5, help='Rounds, the schemas take turns and the best round counts')
+    args: argparse.Namespace = parser.parse_args()
+
+    directory: str = tempfile.mkdtemp(prefix='mynotes-bench-')
+    text_path: str = os.path.join(directory, 'text')
+    typed_path: str = os.path.join(directory, 'typed')
+    create_database(text_path, args.notes, random.Random(0))
+    with sqlite.connect(text_path) as source, sqlite.connect(typed_path) as target:
+        source.backup(target)
+
+    typed_pool: ConnectionPool = ConnectionPool(typed_path, size=1)
+    start: float = time.perf_counter()
+    MigrationRunner().migrate(typed_pool)
+    print(f'migrating {args.notes} notes took {(time.perf_counter() - start) * 1000:.1f} ms', file=sys.stderr)
+
+    text_pool: ConnectionPool = ConnectionPool(text_path, size=1)
+    text: float = float('inf')
+    typed: float = float('inf')
+    for _ in range(args.rounds):
+        # the expiration time used to be parsed on every request
+        text = min(text, cpu_per_request(text_pool, lambda expires_at: int(time.time()) > int(expires_at),
+                                         args.requests))
+        typed = min(typed, cpu_per_request(typed_pool, StringUtils.is_after_expiration_time, args.requests))
+    print(f'TEXT notes:    {text * 1e6:9.1f} us CPU per /get_subject', file=sys.stderr)
+    print(f'typed columns: {typed * 1e6:9.1f} us CPU per /get_subject ({(typed / text - 1) * 100:+.1f}%)',
+          file=sys.stderr)
+
+    text_pool.close()
+    typed_pool.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,141 @@
+import asyncio
+import io
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import *
+
+from ext.flask_server import FlaskServer
+
+
+class AsgiAdapter:
+    def __init__(self, wsgi_app: Callable, max_threads: int = 16) -> None:
+        """
+        Serve a WSGI application (the Flask app) over ASGI. Every request runs in a bounded thread pool,
+        so blocking sqlite calls (and slow fsyncs) never block the event loop.
+        :param wsgi_app: WSGI application
+        :param max_threads: Maximum number of requests handled at the same time
+        """
+        self.__wsgi_app: Callable = wsgi_app
+        self.__executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=max_threads,
+                                                                 thread_name_prefix='mynotes-request')
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable) -> None:
+        if scope['type'] == 'lifespan':
+            await self.__lifespan(receive, send)
+            return
+
+        if scope['type'] != 'http':
+            raise ValueError(f'Unsupported ASGI scope type {scope["type"]}')
+
+        # request bodies of the API are small JSON objects, so they are read completely
+        body: io.BytesIO = io.BytesIO()
+        while True:
+            message: dict = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            body.write(message.get('body', b''))
+            if not message.get('more_body', False):
+                break
+        body.seek(0)
+
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.__executor, self.__run_wsgi_app, loop, scope, body, send)
+
+    async def __lifespan(self, receive: Callable, send: Callable) -> None:
+        while True:
+            message: dict = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.__executor.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def __run_wsgi_app(self, loop: asyncio.AbstractEventLoop, scope: dict, body: io.BytesIO, send: Callable) -> None:
+        """
+        Run the WSGI application in a worker thread and pass the response to the event loop
+        :param loop: Event loop of the ASGI server
+        :param scope: ASGI connection scope
+        :param body: Request body
+        :param send: ASGI send callable
+        """
+
+        def send_from_thread(message: dict) -> None:
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        response_start: dict = {}
+
+        def start_response(status: str, headers: List[Tuple[str, str]], exc_info=None) -> Callable:
+            response_start['status'] = int(status.split(' ', 1)[0])
+            response_start['headers'] = [(name.lower().encode('latin1'), value.encode('latin1'))
+                                         for name, value in headers]
+            return lambda data: None  # the legacy write() callable is not supported
+
+        result: Iterable[bytes] = self.__wsgi_app(self.__build_environ(scope, body), start_response)
+        try:
+            started: bool = False
+            for chunk in result:
+                if not chunk:
+                    continue
+                if not started:
+                    send_from_thread({'type': 'http.response.start', **response_start})
+                    started = True
+                send_from_thread({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+
+            if not started:
+                send_from_thread({'type': 'http.response.start', **response_start})
+            send_from_thread({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+
+    @staticmethod
+    def __build_environ(scope: dict, body: io.BytesIO) -> dict:
+        """
+        Build the WSGI environ of an ASGI http scope
+        :param scope: ASGI connection scope
+        :param body: Request body
+        :return: WSGI environ
+        """
+        server: Tuple[str, int] = scope.get('server') or ('localhost', 80)
+        environ: dict = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', '').encode('utf8').decode('latin1'),
+            'PATH_INFO': scope['path'].encode('utf8').decode('latin1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin1'),
+            'SERVER_PROTOCOL': f'HTTP/{scope.get("http_version", "1.1")}',
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1]),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': body,
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+
+        if scope.get('client'):
+            environ['REMOTE_ADDR'] = scope['client'][0]
+
+        for raw_name, raw_value in scope.get('headers', []):
+            name: str = raw_name.decode('latin1').upper().replace('-', '_')
+            value: str = raw_value.decode('latin1')
+            if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                name = 'HTTP_' + name
+            environ[name] = environ[name] + ',' + value if name in environ else value
+
+        return environ
+
+
+def create_app() -> AsgiAdapter:
+    """
+    ASGI application factory, e.g. uvicorn --factory ext.asgi_server:create_app
+    The database file is taken from MYNOTES_DB and the thread pool size from MYNOTES_THREADS.
+    :return: ASGI application
+    """
+    threads: int = int(os.environ.get('MYNOTES_THREADS', '16'))
+    server: FlaskServer = FlaskServer(db=os.environ.get('MYNOTES_DB', 'MyNotes'), pool_size=threads)
+    server.handle_metrics_signals()
+    return AsgiAdapter(server.app, max_threads=threads)
@@ -0,0 +1,33 @@
+import argparse
+import sys
+from typing import *
+
+from ext.database_manager import DatabaseManager, SubjectStatsDifference
+from ext.utils import StringUtils
+
+
+def main() -> int:
+    """
+    Rebuild the subject stats from the notes table and print every subject whose stored stats differ.
+    Usage: python -m ext.check_subject_stats [--db MyNotes] [--repair]
+    :return: Exit code, 1 if differences were found
+    """
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description='Check the subject_stats table')
+    parser.add_argument('--db', default='MyNotes', help='Path to the database file')
+    parser.add_argument('--repair', action='store_true', help='Replace the stored stats with the rebuilt ones')
+    args: argparse.Namespace = parser.parse_args()
+
+    db: DatabaseManager = DatabaseManager(StringUtils, db=args.db, pool_size=1)
+    differences: List[SubjectStatsDifference] = db.check_subject_stats(repair=args.repair)
+    db.close()
+
+    for difference in differences:
+        print(f'user {difference.user_id}, subject "{difference.subject}": '
+              f'stored {difference.stored}, expected {difference.expected}')
+
+    print(f'{len(differences)} subject(s) differ' + (', repaired' if args.repair and differences else ''))
+    return 1 if differences else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,212 @@
+import sqlite3 as sqlite
+import threading
+import time
+import queue
+from contextlib import contextmanager
+from typing import *
+
+# called with the statement, its parameters, the duration in seconds and the number of rows
+QueryObserver = Callable[[str, Any, float, int], None]
+
+
+class InstrumentedCursor:
+    def __init__(self, cursor: sqlite.Cursor, observers: List[QueryObserver]) -> None:
+        """
+        Cursor wrapper which reports every statement to the query observers. The duration of a statement
+        includes fetching its rows, so it is reported on the next execute or when the cursor is closed.
+        :param cursor: sqlite cursor
+        :param observers: Query observers
+        """
+        self.__cursor: sqlite.Cursor = cursor
+        self.__observers: List[QueryObserver] = observers
+        self.__sql: str | None = None
+        self.__parameters: Any = None
+        self.__duration: float = 0.0
+        self.__rows: int = 0
+
+    @property
+    def lastrowid(self) -> int:
+        return self.__cursor.lastrowid
+
+    @property
+    def rowcount(self) -> int:
+        return self.__cursor.rowcount
+
+    def execute(self, sql: str, parameters: Any = ()) -> 'InstrumentedCursor':
+        self.__report()
+        start: float = time.perf_counter()
+        self.__cursor.execute(sql, parameters)
+        self.__begin(sql, parameters, time.perf_counter() - start)
+        return self
+
+    def executemany(self, sql: str, parameters: Iterable) -> 'InstrumentedCursor':
+        self.__report()
+        parameters = list(parameters)
+        start: float = time.perf_counter()
+        self.__cursor.executemany(sql, parameters)
+        self.__begin(sql, parameters, time.perf_counter() - start)
+        return self
+
+    def fetchone(self) -> Tuple | None:
+        start: float = time.perf_counter()
+        row: Tuple | None = self.__cursor.fetchone()
+        self.__duration += time.perf_counter() - start
+        self.__rows += row is not None
+        return row
+
+    def fetchmany(self, size: int = 1) -> List[Tuple]:
+        start: float = time.perf_counter()
+        rows: List[Tuple] = self.__cursor.fetchmany(size)
+        self.__duration += time.perf_counter() - start
+        self.__rows += len(rows)
+        return rows
+
+    def fetchall(self) -> List[Tuple]:
+        start: float = time.perf_counter()
+        rows: List[Tuple] = self.__cursor.fetchall()
+        self.__duration += time.perf_counter() - start
+        self.__rows += len(rows)
+        return rows
+
+    def close(self) -> None:
+        self.__report()
+        self.__cursor.close()
+
+    def __begin(self, sql: str, parameters: Any, duration: float) -> None:
+        self.__sql = sql
+        self.__parameters = parameters
+        self.__duration = duration
+        # for writes the affected rows are known right away, reads count the fetched rows
+        self.__rows = max(self.__cursor.rowcount, 0)
+
+    def __report(self) -> None:
+        if self.__sql is None:
+            return
+        for observer in self.__observers:
+            observer(self.__sql, self.__parameters, self.__duration, self.__rows)
+        self.__sql = None
+
+
+class ConnectionPool:
+    def __init__(self, db: str = 'MyNotes', size: int = 8, timeout: float = 30.0, synchronous: str = 'FULL') -> None:
+        """
+        Pool of sqlite connections which can be shared between threads. Reads borrow one of the pooled
+        connections, writes use one extra connection of their own, so waiting writers never take connections
+        away from readers.
+        :param db: Path to the database file
+        :param size: Number of read connections in the pool
+        :param timeout: Seconds to wait for a free connection (and for sqlite locks)
+        :param synchronous: sqlite synchronous mode, FULL (every commit is fsynced, the default) or NORMAL (no fsync
+            per commit in WAL mode, faster but a power loss can lose the last acknowledged commits)
+        """
+        if size < 1:
+            raise ValueError('Pool size must be at least 1')
+        if synchronous.upper() not in ('OFF', 'NORMAL', 'FULL', 'EXTRA'):
+            raise ValueError('Synchronous mode must be OFF, NORMAL, FULL or EXTRA')
+
+        self.__db: str = db
+        self.__size: int = size
+        self.__timeout: float = timeout
+        self.__synchronous: str = synchronous.upper()
+        self.__connections: queue.Queue = queue.Queue(maxsize=size)
+        self.__all_connections: List[sqlite.Connection] = []
+        # sqlite only allows one writer at a time, so writes are serialized here
+        # instead of failing with "database is locked"
+        self.__write_lock: threading.Lock = threading.Lock()
+        self.__observers: List[QueryObserver] = []
+
+        # only one write runs at a time, so a single write connection is enough
+        self.__writer: sqlite.Connection = self.__connect()
+        self.__all_connections.append(self.__writer)
+        for _ in range(size):
+            connection: sqlite.Connection = self.__connect()
+            self.__all_connections.append(connection)
+            self.__connections.put(connection)
+
+    @property
+    def size(self) -> int:
+        return self.__size
+
+    def add_observer(self, observer: QueryObserver) -> None:
+        """
+        Report every statement to an observer. Without observers the cursors are not wrapped at all
+        :param observer: Query observer
+        """
+        if observer not in self.__observers:
+            # copy on write, cursors which are in use keep their list
+            self.__observers = self.__observers + [observer]
+
+    def remove_observer(self, observer: QueryObserver) -> None:
+        self.__observers = [x for x in self.__observers if x != observer]
+
+    def __cursor(self, connection: sqlite.Connection) -> sqlite.Cursor | InstrumentedCursor:
+        cursor: sqlite.Cursor = connection.cursor()
+        observers: List[QueryObserver] = self.__observers
+        return InstrumentedCursor(cursor, observers) if observers else cursor
+
+    def __connect(self) -> sqlite.Connection:
+        """
+        Open a new connection to the database
+        :return: Connection
+        """
+        connection: sqlite.Connection = sqlite.connect(self.__db, timeout=self.__timeout, check_same_thread=False)
+        # only has an effect on new databases (before WAL is set up), lets the maintenance free pages in small steps
+        connection.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        # WAL lets readers run in parallel with the (single) writer
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute(f'PRAGMA synchronous={self.__synchronous}')
+        connection.execute(f'PRAGMA busy_timeout={int(self.__timeout * 1000)}')
+        return connection
+
+    def __acquire(self) -> sqlite.Connection:
+        try:
+            return self.__connections.get(timeout=self.__timeout)
+        except queue.Empty:
+            raise TimeoutError('No free database connection available')
+
+    def __release(self, connection: sqlite.Connection) -> None:
+        self.__connections.put(connection)
+
+    @contextmanager
+    def read(self) -> Iterator[sqlite.Cursor]:
+        """
+        Borrow a connection for reading
+        :return: Cursor which only lives for this call
+        """
+        connection: sqlite.Connection = self.__acquire()
+        cursor: sqlite.Cursor = self.__cursor(connection)
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+            # end the implicit read transaction so the WAL can be checkpointed
+            if connection.in_transaction:
+                connection.rollback()
+            self.__release(connection)
+
+    @contextmanager
+    def write(self) -> Iterator[sqlite.Cursor]:
+        """
+        Use the write connection, commits on success and rolls back on error. Writers wait for each other here,
+        the read connections stay free meanwhile
+        :return: Cursor which only lives for this call
+        """
+        with self.__write_lock:
+            connection: sqlite.Connection = self.__writer
+            cursor: sqlite.Cursor = self.__cursor(connection)
+            try:
+                yield cursor
+                connection.commit()
+            except BaseException:
+                connection.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    def close(self) -> None:
+        """
+        Close all connections of the pool
+        """
+        for connection in self.__all_connections:
+            connection.close()
+        self.__all_connections.clear()
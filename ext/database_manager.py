@@ -1,103 +1,74 @@
 import sqlite3 as sqlite
-import string
+from ext.connection_pool import ConnectionPool, QueryObserver
+from ext.migrations import MigrationRunner, rebuild_subject_stats
+from ext.storage import Storage, Note, NewNote, Subject, TokenPair, UserInfo, LoginCredentials
+from ext.write_queue import GroupCommitQueue
 from typing import *
 from dataclasses import dataclass
 
 
 @dataclass
-class Note:
-    id: int
-    subject: str
-    note: str
+class SubjectStatsDifference:
     user_id: int
-    weight: float  # how much the note counts
-    release_date: str  # when teacher gave the note
-    created_at: str  # when the note was inserted into the database
-
-    def to_json(self) -> dict:
-        return {
-            'id': self.id,
-            'subject': self.subject,
-            'note': self.note,
-            'user_id': self.user_id,
-            'weight': self.weight,
-            'release_date': self.release_date,
-            'created_at': self.created_at
-        }
+    subject: str
+    stored: Tuple[float, float, int] | None  # weighted_sum, total_weight, note_count
+    expected: Tuple[float, float, int] | None
 
 
-@dataclass
-class Subject:
-    name: str
-    notes: List[Note]
-    gpa: float
+class DatabaseManager(Storage):
+    """
+    sqlite backend of the storage, the one used in production
+    """
 
-    def to_json(self) -> dict:
-        return {
-            'name': self.name,
-            'note_count': len(self.notes),
-            'gpa': self.gpa
-        }
+    def __init__(self, string_helper, db: str = 'MyNotes', pool_size: int = 8, token_lifetime: int = 10,
+                 token_pool_size: int = 0, group_commit: bool = False, synchronous: str = 'FULL') -> None:
+        super().__init__(string_helper, token_lifetime=token_lifetime, token_pool_size=token_pool_size)
+        self.__pool: ConnectionPool = ConnectionPool(db, size=pool_size, synchronous=synchronous)
 
+        MigrationRunner().migrate(self.__pool)
 
-@dataclass
-class TokenPair:
-    access_token: str
-    refresh_token: str
-    expires_at: str
+        # small writes of concurrent requests share one commit
+        self.__write_queue: GroupCommitQueue | None = GroupCommitQueue(self.__pool) if group_commit else None
 
+    def __del__(self) -> None:
+        self.close()
 
-@dataclass
-class UserInfo:
-    token_info: TokenPair
-    user_id: int
+    def close(self) -> None:
+        """
+        Close all database connections and stop refilling the token pool
+        """
+        write_queue: GroupCommitQueue | None = getattr(self, '_DatabaseManager__write_queue', None)
+        if write_queue is not None:
+            write_queue.close()
+        pool: ConnectionPool | None = getattr(self, '_DatabaseManager__pool', None)
+        if pool is not None:
+            pool.close()
+        super().close()
 
+    def __write(self, work: Callable[[sqlite.Cursor], Any]) -> Any:
+        """
+        Run a write in its own transaction, or in a group commit if enabled
+        :param work: Gets the cursor, must not begin or commit transactions itself
+        :return: Return value of work
+        """
+        if self.__write_queue is not None:
+            return self.__write_queue.submit(work)
+        with self.__pool.write() as cursor:
+            return work(cursor)
 
-class DatabaseManager:
-    def __init__(self, string_helper, db: str = 'MyNotes') -> None:
-        self.__db: sqlite.Connection = sqlite.connect(db, check_same_thread=False)
-        self.__cursor: sqlite.Cursor = self.__db.cursor()
-
-        self.__string_helper = string_helper
-
-        self.__cursor.execute("""CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT NOT NULL,
-            password TEXT NOT NULL,
-            salt TEXT DEFAULT ''
-        )""")
-
-        self.__cursor.execute("""CREATE TABLE IF NOT EXISTS notes (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            subject TEXT NOT NULL,
-            note TEXT NOT NULL,
-            note_owner INTEGER NOT NULL,
-            release_date TEXT DEFAULT '',
-            weight FLOAT DEFAULT 1.0,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (note_owner) REFERENCES users(id)
-        )""")
-
-        self.__cursor.execute("""CREATE TABLE IF NOT EXISTS tokens (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            access_token TEXT NOT NULL,
-            expires_at TIMESTAMP NOT NULL,
-            refresh_token TEXT NOT NULL,
-            user_id INTEGER NOT NULL,
-            FOREIGN KEY (user_id) REFERENCES users(id)
-        )""")
-
-        self.__db.commit()
-
-        # self.__default_expiration_time: int = 60 * 60 * 24 * 30  # 30 days
-        # 10 seconds for testing purposes
-        self.__default_expiration_time: int = 10
-        self.__token_length: int = 32
-        self.__salt_length: int = 32
-        self.__token_chars: str = string.ascii_letters + string.digits + '_!@#'
+    def add_query_observer(self, observer: QueryObserver) -> None:
+        """
+        Report every executed SQL statement to an observer (used for metrics and query logging)
+        :param observer: Called with statement, parameters, duration in seconds and row count
+        """
+        self.__pool.add_observer(observer)
 
-    def __del__(self) -> None:
-        self.__db.close()
+    def remove_query_observer(self, observer: QueryObserver) -> None:
+        """
+        Stop reporting SQL statements to an observer
+        :param observer: Observer passed to add_query_observer
+        """
+        self.__pool.remove_observer(observer)
 
     def get_refresh_token_by_user_id(self, user_id: int) -> str:
         """
@@ -105,17 +76,9 @@ class DatabaseManager:
         :param user_id: User ID
         :return: Refresh token
         """
-        self.__cursor.execute("""SELECT refresh_token FROM tokens WHERE user_id = ? LIMIT 1""", (user_id,))
-        return self.__cursor.fetchone()[0]
-
-    def get_expiration_time(self, user_id: int) -> str:
-        """
-        Get the expiration time of a token
-        :param user_id: User ID
-        :return: Expiration time
-        """
-        self.__cursor.execute("""SELECT expires_at FROM tokens WHERE user_id = ? LIMIT 1""", (user_id,))
-        return self.__cursor.fetchone()[0]
+        with self.__pool.read() as cursor:
+            cursor.execute("""SELECT refresh_token FROM tokens WHERE user_id = ? LIMIT 1""", (user_id,))
+            return cursor.fetchone()[0]
 
     def refresh_access_token(self, user_id: int) -> TokenPair:
         """
@@ -123,30 +86,29 @@ class DatabaseManager:
         :param user_id: User ID
         :return: Token pair
         """
-        access_token: str = self.__string_helper.generate_token(self.__token_length, self.__token_chars)
-        expires_at: str = self.__string_helper.generate_expiration_time(self.__default_expiration_time)
+        access_token: str = self._generate_token()
+        expires_at: int = self._generate_expiration_time()
 
-        self.__cursor.execute(
+        self.__write(lambda cursor: cursor.execute(
             """UPDATE tokens SET access_token = ?, expires_at = ? WHERE user_id = ?""",
-            (access_token, expires_at, user_id))
-        self.__db.commit()
+            (access_token, expires_at, user_id)))
 
         return TokenPair(access_token, '', expires_at)
 
-    def generate_access_token(self, user_id: int) -> TokenPair:
+    def __insert_token_pair(self, cursor: sqlite.Cursor, user_id: int) -> TokenPair:
         """
-        Generate an access token
+        Insert a new token pair for a user
+        :param cursor: Cursor of a write connection
         :param user_id: User ID
-        :return: Access token
+        :return: Token pair
         """
-        access_token: str = self.__string_helper.generate_token(self.__token_length, self.__token_chars)
-        refresh_token: str = self.__string_helper.generate_token(self.__token_length, self.__token_chars)
-        expires_at: str = self.__string_helper.generate_expiration_time(self.__default_expiration_time)
+        access_token: str = self._generate_token()
+        refresh_token: str = self._generate_token()
+        expires_at: int = self._generate_expiration_time()
 
-        self.__cursor.execute(
+        cursor.execute(
             """INSERT INTO tokens (access_token, expires_at, refresh_token, user_id) VALUES (?, ?, ?, ?)""",
             (access_token, expires_at, refresh_token, user_id))
-        self.__db.commit()
 
         return TokenPair(access_token, refresh_token, expires_at)
 
@@ -156,53 +118,67 @@ class DatabaseManager:
         :param user_id: User ID
         :return: True if exists, False otherwise
         """
-        self.__cursor.execute("""SELECT id FROM users WHERE id = ? LIMIT 1""", (user_id,))
-        return self.__cursor.fetchone() is not None
+        with self.__pool.read() as cursor:
+            cursor.execute("""SELECT id FROM users WHERE id = ? LIMIT 1""", (user_id,))
+            return cursor.fetchone() is not None
 
-    def get_access_token_by_user_id(self, user_id: int) -> str:
+    def get_token_pair_if_user_exists(self, user_id: int) -> TokenPair | None:
         """
-        Get an access token by user id
+        Get the token pair of a user in one query, used to authenticate requests
         :param user_id: User ID
-        :return: Access token
+        :return: Token pair or None if the user does not exist
         """
-        self.__cursor.execute("""SELECT access_token FROM tokens WHERE user_id = ? LIMIT 1""", (user_id,))
-        return self.__cursor.fetchone()[0]
+        with self.__pool.read() as cursor:
+            cursor.execute(
+                """SELECT tokens.access_token, tokens.refresh_token, tokens.expires_at FROM users
+                JOIN tokens ON tokens.user_id = users.id WHERE users.id = ? LIMIT 1""",
+                (user_id,))
+            row: Tuple | None = cursor.fetchone()
 
-    def get_token_pair(self, user_id: int) -> TokenPair:
-        """
-        Get a token pair
-        :param user_id: User ID
-        :return: Token pair
-        """
-        self.__cursor.execute("""SELECT access_token, refresh_token, expires_at FROM tokens WHERE user_id = ?""",
-                              (user_id,))
-        return TokenPair(*self.__cursor.fetchone())
+        if row is None:
+            return None
+        return TokenPair(*row)
 
-    def get_salt_by_user_id(self, user_id: int) -> str:
+    def get_login_credentials(self, username: str) -> LoginCredentials | None:
         """
-        Get a salt by user ID
-        :param user_id: User ID
-        :return: Salt
+        Get everything a login needs (user ID, password hash, salt and tokens) in one indexed query
+        :param username: Username in plain text
+        :return: LoginCredentials object or None if the user does not exist
         """
-        self.__cursor.execute("""SELECT salt FROM users WHERE id = ? LIMIT 1""", (user_id,))
-        return self.__cursor.fetchone()[0]
+        with self.__pool.read() as cursor:
+            cursor.execute(
+                """SELECT users.id, users.password, users.salt,
+                tokens.access_token, tokens.refresh_token, tokens.expires_at FROM users
+                JOIN tokens ON tokens.user_id = users.id WHERE users.username = ? LIMIT 1""",
+                (username,))
+            row: Tuple | None = cursor.fetchone()
+
+        if row is None:
+            return None
+        return LoginCredentials(user_id=row[0], password=row[1], salt=row[2], token_pair=TokenPair(*row[3:]))
 
-    def add_user(self, username: str, password: str, salt: str) -> UserInfo:
+    def add_user(self, username: str, password: str, salt: str = '') -> UserInfo:
         """
         Add a user to the database
         :param username: Plain text username
         :param password: Hashed password
-        :param salt: Salt for the password
+        :param salt: Salt for the password (only used by old sha512 hashes, new hashes contain their salt)
         :return: UserInfo object
+        :raises ValueError: If the username already exists
         """
-        self.__cursor.execute("""INSERT INTO users (username, password, salt) VALUES (?, ?, ?)""",
-                              (username, password, salt))
-        self.__db.commit()
+        def insert(cursor: sqlite.Cursor) -> UserInfo:
+            try:
+                cursor.execute("""INSERT INTO users (username, password, salt) VALUES (?, ?, ?)""",
+                               (username, password, salt))
+            except sqlite.IntegrityError:
+                # unique index on users(username)
+                raise ValueError('Username already exists') from None
 
-        user_id: int = self.__cursor.lastrowid
-        token_info: TokenPair = self.generate_access_token(user_id)
+            user_id: int = cursor.lastrowid
+            token_info: TokenPair = self.__insert_token_pair(cursor, user_id)
+            return UserInfo(token_info, user_id)
 
-        return UserInfo(token_info, user_id)
+        return self.__write(insert)
 
     def delete_note_by_id(self, user_id: int, note_id: int) -> None:
         """
@@ -210,18 +186,8 @@ class DatabaseManager:
         :param user_id: User ID
         :param note_id: Note ID
         """
-        self.__cursor.execute("""DELETE FROM notes WHERE id = ? AND note_owner = ?""", (note_id, user_id))
-        self.__db.commit()
-
-    def note_id_exists(self, user_id: int, note_id: int) -> bool:
-        """
-        Check if a note ID exists
-        :param user_id: User ID
-        :param note_id: Note ID
-        :return: True if exists, False otherwise
-        """
-        self.__cursor.execute("""SELECT id FROM notes WHERE id = ? AND note_owner = ?""", (note_id, user_id))
-        return self.__cursor.fetchone() is not None
+        self.__write(lambda cursor: cursor.execute("""DELETE FROM notes WHERE id = ? AND note_owner = ?""",
+                                                   (note_id, user_id)))
 
     def get_note_by_id(self, user_id: int, note_id: int) -> Note | None:
         """
@@ -230,14 +196,15 @@ class DatabaseManager:
         :param note_id: Note ID
         :return: Note object
         """
-        if not self.note_id_exists(user_id, note_id):
-            return None
+        with self.__pool.read() as cursor:
+            cursor.execute(
+                """SELECT subject, note, note_owner, release_date, weight, created_at FROM notes WHERE id = ? AND 
+                note_owner = ?""",
+                (note_id, user_id))
+            row: Tuple | None = cursor.fetchone()
 
-        self.__cursor.execute(
-            """SELECT subject, note, note_owner, release_date, weight, created_at FROM notes WHERE id = ? AND 
-            note_owner = ?""",
-            (note_id, user_id))
-        row: Tuple = self.__cursor.fetchone()
+        if row is None:
+            return None
 
         note_owner: int = row[2]
         if note_owner != user_id:
@@ -260,26 +227,18 @@ class DatabaseManager:
         :param username: Username to check in plain text
         :return: True if username exists, False otherwise
         """
-        self.__cursor.execute("""SELECT id FROM users WHERE username = ? LIMIT 1""", (username,))
-        return self.__cursor.fetchone() is not None
+        with self.__pool.read() as cursor:
+            cursor.execute("""SELECT id FROM users WHERE username = ? LIMIT 1""", (username,))
+            return cursor.fetchone() is not None
 
-    def get_user_id(self, username: str) -> int:
+    def update_password(self, user_id: int, password: str) -> None:
         """
-        Get a user ID
-        :param username: Username in plain text
-        :return: User ID
-        """
-        self.__cursor.execute("""SELECT id FROM users WHERE username = ? LIMIT 1""", (username,))
-        return self.__cursor.fetchone()[0]
-
-    def get_user_password(self, user_id: int) -> str:
-        """
-        Get a user password
+        Replace the password hash of a user, e.g. when an old hash is upgraded
         :param user_id: User ID
-        :return: Password
+        :param password: New password hash (contains its own salt)
         """
-        self.__cursor.execute("""SELECT password FROM users WHERE id = ? LIMIT 1""", (user_id,))
-        return self.__cursor.fetchone()[0]
+        self.__write(lambda cursor: cursor.execute("""UPDATE users SET password = ?, salt = '' WHERE id = ?""",
+                                                   (password, user_id)))
 
     def add_note(self, subject: str, note: int, user_id: int, release_date: str = '', weight: float = 1.0) -> int:
         """
@@ -291,60 +250,218 @@ class DatabaseManager:
         :param weight: Weight of the note (how much it counts)
         :return: Note ID
         """
-        self.__cursor.execute(
-            """INSERT INTO notes (subject, note, note_owner, release_date, weight) VALUES (?, ?, ?, ?, ?)""",
-            (subject, note, user_id, release_date, weight))
-        self.__db.commit()
+        def insert(cursor: sqlite.Cursor) -> int:
+            cursor.execute(
+                """INSERT INTO notes (subject, note, note_owner, release_date, weight) VALUES (?, ?, ?, ?, ?)""",
+                (subject, note, user_id, release_date, weight))
+            return cursor.lastrowid
 
-        return self.__cursor.lastrowid
+        return self.__write(insert)
 
-    def get_subject(self, user_id: int, subject: str) -> Subject:
+    def add_notes(self, user_id: int, notes: List[NewNote]) -> List[int]:
         """
-        Get a subject
+        Add several notes to the database in one transaction
+        :param user_id: User ID
+        :param notes: Notes to add
+        :return: Note IDs in the same order as the notes
+        """
+        if not notes:
+            return []
+
+        with self.__pool.write() as cursor:
+            # the immediate lock keeps other processes from inserting notes until we commit,
+            # so every id above the current maximum belongs to this batch
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute("""SELECT COALESCE(MAX(id), 0) FROM notes""")
+            last_id: int = cursor.fetchone()[0]
+
+            cursor.executemany(
+                """INSERT INTO notes (subject, note, note_owner, release_date, weight) VALUES (?, ?, ?, ?, ?)""",
+                [(note.subject, note.note, user_id, note.release_date, note.weight) for note in notes])
+
+            cursor.execute("""SELECT id FROM notes WHERE id > ? ORDER BY id""", (last_id,))
+            return [row[0] for row in cursor.fetchall()]
+
+    def get_subject(self, user_id: int, subject: str, after: int = 0, limit: int | None = None) -> Subject:
+        """
+        Get a subject, optionally only one page of its notes (ordered by note ID).
+        The GPA and note count always cover all notes of the subject.
         :param user_id: User ID
         :param subject: Subject name
+        :param after: Only return notes with an ID greater than this
+        :param limit: Maximum number of notes to return, None for all
         :return: Subject object
         """
-        self.__cursor.execute(
-            """SELECT id, note, weight, release_date, created_at FROM notes WHERE note_owner = ? AND subject = ?""",
-            (user_id, subject))
-        notes: List[Note] = [Note(
-            id=note[0],
-            subject=subject,
-            note=note[1],
-            user_id=user_id,
-            weight=note[2],
-            release_date=note[3],
-            created_at=note[4]
-        ) for note in self.__cursor.fetchall()]
-
-        gpa: float = self.__calculate_gpa(notes)
+        with self.__pool.read() as cursor:
+            cursor.execute(
+                """SELECT weighted_sum / total_weight, note_count FROM subject_stats WHERE user_id = ? AND subject = ?""",
+                (user_id, subject))
+            stats: Tuple | None = cursor.fetchone()
+
+            if stats is None:
+                raise ValueError('Subject does not exist')
+
+            cursor.execute(
+                """SELECT id, note, weight, release_date, created_at FROM notes WHERE note_owner = ? AND subject = ?
+                AND id > ? ORDER BY id LIMIT ?""",
+                (user_id, subject, after, -1 if limit is None else limit))
+            # all notes of the page are returned as a list, only the row tuples are fetched in batches, so they
+            # are not all kept next to the notes. Positional arguments in field order are noticeably cheaper
+            # than keywords
+            notes: List[Note] = []
+            rows: List[Tuple] = cursor.fetchmany(1000)
+            while rows:
+                notes.extend([Note(row[0], subject, row[1], user_id, row[2], row[3], row[4]) for row in rows])
+                rows = cursor.fetchmany(1000)
 
         return Subject(
             name=subject,
             notes=notes,
-            gpa=gpa
+            gpa=stats[0],
+            note_count=stats[1]
         )
 
-    @staticmethod
-    def __calculate_gpa(notes: List[Note]) -> float:
-        """
-        Calculate the GPA of a subject
-        :param notes: List of notes
-        :return: GPA
+    def iter_notes(self, user_id: int, batch_size: int = 500) -> Iterator[Note]:
         """
-        total_weight: float = sum([note.weight for note in notes])
-        total_weighted_note: float = sum([float(note.note) * note.weight for note in notes])
-
-        return total_weighted_note / total_weight
+        Iterate over all notes of a user (ordered by subject and ID) without loading them all into memory.
+        Every batch is a short query of its own which continues after the last note of the previous batch,
+        so no connection (and no read transaction) is held while a slow client reads the export.
+        Notes added or deleted during the iteration may or may not be included.
+        :param user_id: User ID
+        :param batch_size: Number of notes loaded at once
+        :return: Iterator of notes
+        """
+        subject: str | None = None  # subject and ID of the last note of the previous batch
+        last_id: int = 0
+        while True:
+            with self.__pool.read() as cursor:
+                if subject is None:
+                    cursor.execute(
+                        """SELECT id, subject, note, weight, release_date, created_at FROM notes WHERE note_owner = ?
+                        ORDER BY subject, id LIMIT ?""",
+                        (user_id, batch_size))
+                    rows: List[Tuple] = cursor.fetchall()
+                else:
+                    # the rest of the current subject and then the next subjects. Both are ranges of the
+                    # (note_owner, subject) index, (subject, id) > (?, ?) would scan the current subject every time
+                    cursor.execute(
+                        """SELECT id, subject, note, weight, release_date, created_at FROM notes WHERE note_owner = ?
+                        AND subject = ? AND id > ? ORDER BY id LIMIT ?""",
+                        (user_id, subject, last_id, batch_size))
+                    rows = cursor.fetchall()
+                    if len(rows) < batch_size:
+                        cursor.execute(
+                            """SELECT id, subject, note, weight, release_date, created_at FROM notes
+                            WHERE note_owner = ? AND subject > ? ORDER BY subject, id LIMIT ?""",
+                            (user_id, subject, batch_size - len(rows)))
+                        rows += cursor.fetchall()
+
+            for row in rows:
+                yield Note(row[0], row[1], row[2], user_id, row[3], row[4], row[5])
+            if len(rows) < batch_size:
+                return
+            subject, last_id = rows[-1][1], rows[-1][0]
 
     def get_all_subjects(self, user_id: int) -> List[Subject]:
         """
-        Get all notes for a user
+        Get the summary (note count and GPA) of all subjects of a user, the notes themselves are not loaded
         :param user_id: User ID
         :return: List of subjects
         """
-        self.__cursor.execute("""SELECT DISTINCT subject FROM notes WHERE note_owner = ?""", (user_id,))
-        subjects: List[str] = [subject[0] for subject in self.__cursor.fetchall()]
+        with self.__pool.read() as cursor:
+            cursor.execute(
+                """SELECT subject, weighted_sum / total_weight, note_count FROM subject_stats WHERE user_id = ?
+                ORDER BY subject""",
+                (user_id,))
+            return [Subject(row[0], [], row[1], row[2]) for row in cursor.fetchall()]
+
+    def check_subject_stats(self, repair: bool = False) -> List[SubjectStatsDifference]:
+        """
+        Compare the stored subject stats with stats calculated from scratch
+        :param repair: Rebuild the subject_stats table afterwards
+        :return: List of subjects whose stored stats differ
+        """
+        with self.__pool.write() as cursor:
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute("""SELECT user_id, subject, weighted_sum, total_weight, note_count FROM subject_stats""")
+            stored: Dict[Tuple[int, str], Tuple] = {(row[0], row[1]): row[2:] for row in cursor.fetchall()}
+            cursor.execute("""SELECT note_owner, subject, SUM(CAST(note AS REAL) * weight), SUM(weight), COUNT(*)
+                FROM notes GROUP BY note_owner, subject""")
+            expected: Dict[Tuple[int, str], Tuple] = {(row[0], row[1]): row[2:] for row in cursor.fetchall()}
+
+            differences: List[SubjectStatsDifference] = []
+            for key in sorted(stored.keys() | expected.keys()):
+                if not self.__same_stats(stored.get(key), expected.get(key)):
+                    differences.append(SubjectStatsDifference(key[0], key[1], stored.get(key), expected.get(key)))
+
+            if repair and differences:
+                rebuild_subject_stats(cursor)
+
+        return differences
+
+    def delete_orphaned_tokens(self, limit: int = 500) -> int:
+        """
+        Delete token rows whose user does not exist anymore, at most limit rows per call
+        so the write lock is only held for a short time
+        :param limit: Maximum number of deleted rows
+        :return: Number of deleted rows
+        """
+        with self.__pool.write() as cursor:
+            cursor.execute("""DELETE FROM tokens WHERE id IN (SELECT tokens.id FROM tokens
+                LEFT JOIN users ON users.id = tokens.user_id WHERE users.id IS NULL LIMIT ?)""", (limit,))
+            return cursor.rowcount
+
+    def optimize(self) -> None:
+        """
+        Let sqlite update the statistics of the query planner where they are outdated
+        """
+        with self.__pool.write() as cursor:
+            cursor.execute('PRAGMA optimize')
+
+    def enable_incremental_vacuum(self) -> bool:
+        """
+        Convert a database created before MyNotes set auto_vacuum = INCREMENTAL. The setting of an existing file
+        only changes with a VACUUM, which rewrites the whole file and blocks all writers until it is done.
+        :return: True if the database was converted, False if it already used incremental vacuum
+        """
+        with self.__pool.write() as cursor:
+            # outside of a transaction a connection may still report the setting from before another one converted
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute('PRAGMA auto_vacuum')
+            converted: bool = cursor.fetchone()[0] == 2
+            cursor.execute('COMMIT')
+            if converted:
+                return False
+            # VACUUM can not run inside a transaction, the sqlite3 module does not open one for these
+            cursor.execute('PRAGMA auto_vacuum=INCREMENTAL')
+            cursor.execute('VACUUM')
+            return True
+
+    def incremental_vacuum(self, pages: int = 1000) -> int:
+        """
+        Give up to pages free pages back to the file system.
+        Only works on databases with auto_vacuum = INCREMENTAL (all databases created by MyNotes, older ones
+        are converted with enable_incremental_vacuum), does nothing on others
+        :param pages: Maximum number of pages to free
+        :return: Number of freed pages
+        """
+        with self.__pool.write() as cursor:
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute('PRAGMA auto_vacuum')
+            if cursor.fetchone()[0] != 2:
+                return 0
+            cursor.execute('PRAGMA freelist_count')
+            free: int = cursor.fetchone()[0]
+            # the pragma frees one page per step, but the sqlite3 module only steps it once
+            for _ in range(min(free, pages)):
+                cursor.execute('PRAGMA incremental_vacuum(1)')
+            # also finishes the last pragma, otherwise the transaction can not be committed
+            cursor.execute('PRAGMA freelist_count')
+            return free - cursor.fetchone()[0]
 
-        return [self.get_subject(user_id, subject) for subject in subjects]
+    @staticmethod
+    def __same_stats(a: Tuple | None, b: Tuple | None) -> bool:
+        if a is None or b is None:
+            return a is b
+        # sums are maintained incrementally, so allow for rounding errors
+        return a[2] == b[2] and abs(a[0] - b[0]) < 1e-6 and abs(a[1] - b[1]) < 1e-6
@@ -0,0 +1,29 @@
+import argparse
+import sys
+
+from ext.database_manager import DatabaseManager
+from ext.utils import StringUtils
+
+
+def main() -> int:
+    """
+    Convert a database created before MyNotes used auto_vacuum = INCREMENTAL, so the maintenance can give
+    free pages back to the file system. Rewrites the whole file once, stop the server before running it.
+    Usage: python -m ext.enable_incremental_vacuum [--db MyNotes]
+    :return: Exit code
+    """
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description='Enable incremental vacuum on an existing '
+                                                                          'database')
+    parser.add_argument('--db', default='MyNotes', help='Path to the database file')
+    args: argparse.Namespace = parser.parse_args()
+
+    db: DatabaseManager = DatabaseManager(StringUtils, db=args.db, pool_size=1)
+    converted: bool = db.enable_incremental_vacuum()
+    db.close()
+
+    print('converted to incremental vacuum' if converted else 'already uses incremental vacuum')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
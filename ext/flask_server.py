@@ -1,38 +1,144 @@
+import functools
+import os
+import signal
+import threading
 import flask.json
-from flask import Flask, jsonify, Response
+from flask import Flask, Response
 from flask_classful import FlaskView, route
 from ext.utils import *
-from ext.database_manager import DatabaseManager, UserInfo, TokenPair, Subject, Note
+from ext.storage import Storage, UserInfo, TokenPair, Subject, Note, NewNote, NOTE_FIELDS, LoginCredentials
+from ext.database_manager import DatabaseManager
+from ext.memory_storage import MemoryStorage
+from ext.token_cache import TokenCache
+from ext.metrics import Metrics
+from ext.profiling import SlowQueryLog, RequestProfiler
+from ext.maintenance import MaintenanceScheduler
+from ext.password_hashing import PasswordEngine, PasswordHasher, PasswordCheck, hasher_from_string
+from ext.json_response import JsonResponses, encoder_from_string
+from ext.rate_limit import LoginRateLimiter, MemoryRateLimitStore, SqliteRateLimitStore, RateLimitStore, parse_limit
 from typing import *
+from dataclasses import dataclass
+
+
+@dataclass
+class ServerContext:
+    """
+    Application scoped services, created once per server and shared by all views
+    """
+    db: Storage
+    hasher: Hasher
+    auth_helper: AuthHelper
+    passwords: PasswordEngine
+    login_limiter: LoginRateLimiter | None
+    token_cache: TokenCache | None
+    metrics: Metrics
+    json: JsonResponses
+
+    @staticmethod
+    def create(db: str = 'MyNotes', pool_size: int = 8, token_cache_size: int = 10000,
+               metrics: bool = True, token_lifetime: int = 10, token_pool_size: int = 0,
+               password_hasher: PasswordHasher | None = None, hash_workers: int = 0,
+               login_limiter: LoginRateLimiter | None = None, group_commit: bool = False,
+               synchronous: str = 'FULL', storage: str = 'sqlite',
+               json_encoder: str = 'auto') -> 'ServerContext':
+        """
+        Create the services for a server (opens the database and sets up the schema)
+        :param db: Path to the database file
+        :param pool_size: Number of pooled read connections, writes use one more
+        :param token_cache_size: Number of cached access tokens, 0 disables the cache
+        :param metrics: Collect metrics from the start (can be switched at runtime)
+        :param token_lifetime: Seconds an access token is valid
+        :param token_pool_size: Number of pre-generated tokens, 0 generates them on demand
+        :param password_hasher: Hasher for new passwords (default: scrypt)
+        :param hash_workers: Processes which hash passwords, 0 hashes on the request thread
+        :param login_limiter: Rate limiter for /login, None allows unlimited attempts
+        :param group_commit: Commit the writes of concurrent requests together
+        :param synchronous: sqlite synchronous mode, FULL fsyncs every commit, NORMAL can lose the last commits
+            on a power failure
+        :param storage: Storage backend, sqlite or memory (nothing is saved, the sqlite options are ignored)
+        :param json_encoder: Encoder of the responses, auto (orjson if installed), orjson or json
+        :return: ServerContext object
+        """
+        database: Storage
+        if storage == 'sqlite':
+            database = DatabaseManager(StringUtils, db=db, pool_size=pool_size, token_lifetime=token_lifetime,
+                                       token_pool_size=token_pool_size, group_commit=group_commit,
+                                       synchronous=synchronous)
+        elif storage == 'memory':
+            database = MemoryStorage(StringUtils, token_lifetime=token_lifetime, token_pool_size=token_pool_size)
+        else:
+            raise ValueError(f'Unknown storage "{storage}", expected sqlite or memory')
+        hasher: Hasher = Hasher(algorithm='sha512')
+        token_cache: TokenCache | None = TokenCache(max_size=token_cache_size) if token_cache_size > 0 else None
+        return ServerContext(
+            db=database,
+            hasher=hasher,
+            auth_helper=AuthHelper(database, token_cache=token_cache),
+            passwords=PasswordEngine(password_hasher, workers=hash_workers),
+            login_limiter=login_limiter,
+            token_cache=token_cache,
+            metrics=Metrics(database, token_cache=token_cache, enabled=metrics),
+            json=JsonResponses(encoder_from_string(json_encoder))
+        )
+
+
+def authenticated(view: Callable) -> Callable:
+    """
+    Authenticate the request (user_id and access_token in the JSON body) before calling the view.
+    The view gets the Principal of the authenticated user as argument.
+    :param view: View method of MyNotes
+    :return: Wrapped view method
+    """
+
+    @functools.wraps(view)
+    def wrapper(self: 'MyNotes') -> tuple[Response, int]:
+        try:
+            principal: Principal = self._authenticate()
+        except Exception as e:
+            return self._error(str(e))
+        return view(self, principal)
+
+    return wrapper
 
 
 class MyNotes(FlaskView):
-    def __init__(self):
+    def __init__(self, context: ServerContext):
         super().__init__()
-        self.__db: DatabaseManager = DatabaseManager(StringUtils)
-        self.__hasher: Hasher = Hasher(algorithm='sha512')
-        self.__login_utils: LoginUtils = LoginUtils(self.__db, self.__hasher)
-        self.__auth_helper: AuthHelper = AuthHelper(self.__db)
+        self.__db: Storage = context.db
+        self.__hasher: Hasher = context.hasher
+        self.__auth_helper: AuthHelper = context.auth_helper
+        self.__passwords: PasswordEngine = context.passwords
+        self.__login_limiter: LoginRateLimiter | None = context.login_limiter
+        self.__metrics: Metrics = context.metrics
+        self.__json: JsonResponses = context.json
+
+    def _authenticate(self) -> Principal:
+        """
+        Authenticate the current request
+        :return: Principal of the authenticated user
+        """
+        user_id: str = str(flask.request.json['user_id'])
+        access_token: str = str(flask.request.json['access_token'])
+        return self.__auth_helper.authenticate(user_id, access_token)
+
+    def _error(self, message: str) -> tuple[Response, int]:
+        """
+        Error response for the authenticated decorator
+        :param message: Error message
+        :return: Response and status code
+        """
+        return self.__json.error(message)
 
     @route('/delete_note', methods=['POST'])
-    def delete_note(self) -> tuple[Response, int]:
+    @authenticated
+    def delete_note(self, principal: Principal) -> tuple[Response, int]:
         """
         Delete a note from the database
+        :param principal: Authenticated user
         :return: Response and status code
         """
         try:
-            user_id: str = str(flask.request.json['user_id'])
-            access_token: str = str(flask.request.json['access_token'])
-
-            auth_correct: Tuple[bool, str] = self.__auth_helper.correct_api_credentials(user_id, access_token)
-
-            if not auth_correct[0]:
-                raise InvalidArgumentException(auth_correct[1])
-
-            user_id: int = int(user_id)
-
-            if self.__auth_helper.access_token_expired(user_id):
-                raise InvalidArgumentException('Access token expired')
+            user_id: int = principal.user_id
 
             if StringUtils.is_empty(str(flask.request.json['note_id'])):
                 raise InvalidArgumentException('Note id is empty')
@@ -45,32 +151,20 @@ class MyNotes(FlaskView):
                 raise InvalidArgumentException('Note does not exist or does not belong to user')
 
             self.__db.delete_note_by_id(user_id, note_id)
-            return jsonify({
-                'status': 200,
-                'error': False
-            }), 200
+            return self.__json.ok()
         except Exception as e:
-            return jsonify({'status': 500, 'error': True, "error_msg": str(e)}), 500
+            return self.__json.error(str(e))
 
     @route('/get_note', methods=['POST'])
-    def get_note(self) -> tuple[Response, int]:
+    @authenticated
+    def get_note(self, principal: Principal) -> tuple[Response, int]:
         """
         Get a note from the database
+        :param principal: Authenticated user
         :return: Response and status code
         """
         try:
-            user_id: str = str(flask.request.json['user_id'])
-            access_token: str = str(flask.request.json['access_token'])
-
-            auth_correct: Tuple[bool, str] = self.__auth_helper.correct_api_credentials(user_id, access_token)
-
-            if not auth_correct[0]:
-                raise InvalidArgumentException(auth_correct[1])
-
-            user_id: int = int(user_id)
-
-            if self.__auth_helper.access_token_expired(user_id):
-                raise InvalidArgumentException('Access token expired')
+            user_id: int = principal.user_id
 
             if StringUtils.is_empty(str(flask.request.json['note_id'])):
                 raise InvalidArgumentException('Note id is empty')
@@ -81,33 +175,20 @@ class MyNotes(FlaskView):
             if not Note or note is None:
                 raise InvalidArgumentException('Note does not exist or does not belong to user')
 
-            return jsonify({
-                'status': 200,
-                'error': False,
-                'note': note.to_json()
-            }), 200
+            return self.__json.ok({'note': note.to_json()})
         except Exception as e:
-            return jsonify({'status': 500, 'error': True, "error_msg": str(e)}), 500
+            return self.__json.error(str(e))
 
     @route('/add_note', methods=['POST'])
-    def add_note(self) -> tuple[Response, int]:
+    @authenticated
+    def add_note(self, principal: Principal) -> tuple[Response, int]:
         """
         Add a note to the database
+        :param principal: Authenticated user
         :return: Response and status code
         """
         try:
-            user_id: str = str(flask.request.json['user_id'])
-            access_token: str = str(flask.request.json['access_token'])
-
-            auth_correct: Tuple[bool, str] = self.__auth_helper.correct_api_credentials(user_id, access_token)
-
-            if not auth_correct[0]:
-                raise InvalidArgumentException(auth_correct[1])
-
-            user_id: int = int(user_id)
-
-            if self.__auth_helper.access_token_expired(user_id):
-                raise InvalidArgumentException('Access token expired')
+            user_id: int = principal.user_id
 
             subject: str = str(flask.request.json['subject'])
             note: int = int(flask.request.json['note'])
@@ -116,74 +197,127 @@ class MyNotes(FlaskView):
 
             note_id: int = self.__db.add_note(subject=subject, note=note, user_id=user_id, release_date=release_date,
                                               weight=weight)
-            return jsonify({
-                'status': 200,
-                'error': False,
-                'note_id': note_id
-            }), 200
+            return self.__json.ok({'note_id': note_id})
+        except Exception as e:
+            return self.__json.error(str(e))
+
+    @route('/add_notes', methods=['POST'])
+    @authenticated
+    def add_notes(self, principal: Principal) -> tuple[Response, int]:
+        """
+        Add several notes to the database at once, either all notes are added or none
+        :param principal: Authenticated user
+        :return: Response and status code
+        """
+        try:
+            user_id: int = principal.user_id
+
+            raw_notes: List[dict] = flask.request.json['notes']
+            if not isinstance(raw_notes, list) or len(raw_notes) == 0:
+                raise InvalidArgumentException('Notes must be a non-empty list')
+
+            if len(raw_notes) > max_notes_per_request:
+                raise InvalidArgumentException(f'At most {max_notes_per_request} notes can be added at once')
+
+            notes: List[NewNote] = []
+            for i, raw_note in enumerate(raw_notes):
+                try:
+                    notes.append(NewNote(
+                        subject=str(raw_note['subject']),
+                        note=int(raw_note['note']),
+                        weight=float(raw_note['weight']),
+                        release_date=str(raw_note['release_date'])
+                    ))
+                except Exception as e:
+                    raise InvalidArgumentException(f'Note {i} is invalid: {e}')
+
+            note_ids: List[int] = self.__db.add_notes(user_id, notes)
+            return self.__json.ok({'note_ids': note_ids})
         except Exception as e:
-            return jsonify({'status': 500, 'error': True, "error_msg": str(e)}), 500
+            return self.__json.error(str(e))
 
     @route('/get_subject', methods=['POST'])
-    def get_subject(self) -> tuple[Response, int]:
+    @authenticated
+    def get_subject(self, principal: Principal) -> tuple[Response, int]:
         """
-        Get a subject
+        Get a subject. The notes can be paginated with limit and after (ID of the last note of the previous page)
+        and reduced to the given fields.
+        :param principal: Authenticated user
         :return: Response and status code
         """
         try:
-            user_id: str = str(flask.request.json['user_id'])
-            access_token: str = str(flask.request.json['access_token'])
+            user_id: int = principal.user_id
 
-            auth_correct: Tuple[bool, str] = self.__auth_helper.correct_api_credentials(user_id, access_token)
+            subject: str = str(flask.request.json['subject'])
 
-            if not auth_correct[0]:
-                raise InvalidArgumentException(auth_correct[1])
+            limit: int | None = flask.request.json.get('limit')
+            if limit is not None:
+                limit = int(limit)
+                if not 1 <= limit <= max_notes_per_page:
+                    raise InvalidArgumentException(f'Limit must be between 1 and {max_notes_per_page}')
 
-            user_id: int = int(user_id)
+            after: int = int(flask.request.json.get('after') or 0)
 
-            if self.__auth_helper.access_token_expired(user_id):
-                raise InvalidArgumentException('Access token expired')
+            fields: List[str] | None = flask.request.json.get('fields')
+            if fields is not None:
+                if not isinstance(fields, list) or any(field not in NOTE_FIELDS for field in fields):
+                    raise InvalidArgumentException(f'Fields must be a list of: {", ".join(NOTE_FIELDS)}')
 
-            subject: str = str(flask.request.json['subject'])
-            subject: Subject = self.__db.get_subject(user_id, subject)
+            subject: Subject = self.__db.get_subject(user_id, subject, after=after, limit=limit)
+
+            # a full page means there may be more notes
+            next_after: int | None = None
+            if limit is not None and len(subject.notes) == limit:
+                next_after = subject.notes[-1].id
 
-            return jsonify({
-                'status': 200,
-                'error': False,
+            return self.__json.ok({
                 'subject': subject.to_json(),
-                'notes': [x.to_json() for x in subject.notes]
-            }), 200
+                'notes': [x.to_json(fields) for x in subject.notes],
+                'next_after': next_after
+            })
 
         except Exception as e:
-            return jsonify({'status': 500, 'error': True, "error_msg": str(e)}), 500
+            return self.__json.error(str(e))
 
     @route('/get_subjects', methods=['POST'])
-    def get_subjects(self) -> tuple[Response, int]:
+    @authenticated
+    def get_subjects(self, principal: Principal) -> tuple[Response, int]:
         """
         Get all subjects of a user
+        :param principal: Authenticated user
         :return: Response and status code
         """
         try:
-            user_id: str = str(flask.request.json['user_id'])
-            access_token: str = str(flask.request.json['access_token'])
+            user_id: int = principal.user_id
+
+            subjects: List[Subject] = self.__db.get_all_subjects(user_id)
+            return self.__json.ok({'subjects': [x.to_json() for x in subjects]})
+        except Exception as e:
+            return self.__json.error(str(e))
 
-            auth_correct: Tuple[bool, str] = self.__auth_helper.correct_api_credentials(user_id, access_token)
+    @route('/export', methods=['POST'])
+    @authenticated
+    def export(self, principal: Principal) -> Response:
+        """
+        Export all notes of a user as newline delimited JSON (one note per line), streamed straight from the database
+        :param principal: Authenticated user
+        :return: Streamed response
+        """
+        notes: Iterator[Note] = self.__db.iter_notes(principal.user_id)
 
-            if not auth_correct[0]:
-                raise InvalidArgumentException(auth_correct[1])
+        def generate() -> Iterator[bytes]:
+            for note in notes:
+                yield self.__json.line(note.to_json())
 
-            user_id: int = int(user_id)
-            if self.__auth_helper.access_token_expired(user_id):
-                raise InvalidArgumentException('Access token expired')
+        return Response(generate(), status=200, mimetype='application/x-ndjson')
 
-            subjects: List[Subject] = self.__db.get_all_subjects(user_id)
-            return jsonify({
-                'status': 200,
-                'error': False,
-                'subjects': [x.to_json() for x in subjects]
-            }), 200
-        except Exception as e:
-            return jsonify({'status': 500, 'error': True, "error_msg": str(e)}), 500
+    @route('/metrics', methods=['GET'])
+    def metrics(self) -> tuple[Response, int]:
+        """
+        Metrics in the Prometheus text format
+        :return: Response and status code
+        """
+        return Response(self.__metrics.render(), mimetype='text/plain; version=0.0.4'), 200
 
     # TODO: Implement refresh token
 
@@ -204,17 +338,15 @@ class MyNotes(FlaskView):
 
             user_id: int = int(user_id)
             # everything is fine, we can generate a new access token
-            token_pair: TokenPair = self.__db.refresh_access_token(user_id)
+            token_pair: TokenPair = self.__auth_helper.refresh_access_token(user_id)
             token_pair.refresh_token = refresh_token
-            return jsonify({
-                'status': 200,
-                'error': False,
+            return self.__json.ok({
                 'access_token': token_pair.access_token,
                 'expires_at': token_pair.expires_at,
                 'user_id': user_id
-            }), 200
+            })
         except Exception as e:
-            return jsonify({'status': 500, 'error': True, "error_msg": str(e)}), 500
+            return self.__json.error(str(e))
 
     @route('/login', methods=['POST'])
     def login_user(self) -> tuple[Response, int]:
@@ -225,6 +357,16 @@ class MyNotes(FlaskView):
         # If the user has given the correct credentials we generate an access token
         # and return it to the user
         try:
+            if self.__login_limiter is not None:
+                # checked before the database is touched, so a burst of attempts costs almost nothing
+                retry_after: int = self.__login_limiter.check(str(flask.request.json['username']),
+                                                              flask.request.remote_addr)
+                if retry_after:
+                    response, status = self.__json.error(f'Too many login attempts, try again in {retry_after} '
+                                                         f'seconds', status=429)
+                    response.headers['Retry-After'] = str(retry_after)
+                    return response, status
+
             username: CheckedParameter = StringUtils.validate_username(flask.request.json['username'])
             password: str = flask.request.json['password']
 
@@ -235,38 +377,39 @@ class MyNotes(FlaskView):
             if not username.valid:
                 raise InvalidArgumentException(username.message)
 
-            if not self.__login_utils.username_exists(username.parameter):
+            credentials: LoginCredentials | None = self.__db.get_login_credentials(username.parameter)
+            if credentials is None:
+                # hash anyway, an early answer would tell the client that the username doesn't exist
+                self.__passwords.verify(password, self.__passwords.dummy_hash())
                 print('Username does not exist')
                 raise InvalidArgumentException('Password or Username is incorrect')
 
-            user_id: int = self.__login_utils.get_user_id(username.parameter)
-
-            if self.__auth_helper.access_token_expired(user_id):
-                # Token expired, we need to generate a new one
-                self.__db.refresh_access_token(user_id)
-
-            user_salt: str = self.__db.get_salt_by_user_id(user_id)
-
-            salted_password: str = StringUtils.add_salt_to_hashed_password(password, self.__hasher, salt=user_salt)
-            db_password: str = self.__login_utils.get_user_password(user_id)
-
-            if not self.__hasher.equal_hashes(salted_password, db_password):
+            user_id: int = credentials.user_id
+            check: PasswordCheck = self.__passwords.verify(password, credentials.password,
+                                                           legacy_salt=credentials.salt)
+            if not check.valid:
                 print('Password is incorrect')
                 raise InvalidArgumentException('Password or Username is incorrect')
 
+            if check.upgraded_hash is not None:
+                # old sha512 hash or outdated cost, replace it now that we know the password
+                self.__db.update_password(user_id, check.upgraded_hash)
+
             # everything is fine, we can return the tokens
-            token_pair: TokenPair = self.__db.get_token_pair(user_id)
+            token_pair: TokenPair = credentials.token_pair
+            if StringUtils.is_after_expiration_time(token_pair.expires_at):
+                # Token expired, we need to generate a new one
+                refreshed: TokenPair = self.__auth_helper.refresh_access_token(user_id)
+                token_pair = TokenPair(refreshed.access_token, token_pair.refresh_token, refreshed.expires_at)
 
-            return jsonify({
-                'status': 200,
-                'error': False,
+            return self.__json.ok({
                 'access_token': token_pair.access_token,
                 'refresh_token': token_pair.refresh_token,
                 'expires_at': token_pair.expires_at,
                 'user_id': user_id
-            }), 200
+            })
         except Exception as e:
-            return jsonify({'status': 500, 'error': True, "error_msg": str(e)}), 500
+            return self.__json.error(str(e))
 
     @route('/register', methods=['POST'])
     def register_user(self) -> tuple[Response, int]:
@@ -275,11 +418,8 @@ class MyNotes(FlaskView):
         :return: Response and status code
         """
         try:
-            user_salt: str = self.__hasher.generate_salt()
-
             username: CheckedParameter = StringUtils.validate_username(flask.request.json['username'])
-            password: CheckedParameter = StringUtils.validate_password(flask.request.json['password'], self.__hasher,
-                                                                       salt=user_salt)
+            password: CheckedParameter = StringUtils.validate_password(flask.request.json['password'], self.__hasher)
 
             if self.__db.username_exists(username.parameter):
                 raise InvalidArgumentException('Username already exists')
@@ -290,27 +430,151 @@ class MyNotes(FlaskView):
             if not password.valid:
                 raise InvalidArgumentException(password.message)
 
-            # password.parameter is already a hashed salted password
+            # password.parameter is the sha512 hash of the password, the same clients send to /login
             user: UserInfo = self.__db.add_user(username=username.parameter,
-                                                password=password.parameter,
-                                                salt=user_salt)
-            return jsonify({
-                'status': 200,
-                'error': False,
+                                                password=self.__passwords.hash(password.parameter))
+            return self.__json.ok({
                 'access_token': user.token_info.access_token,
                 'refresh_token': user.token_info.refresh_token,
                 'expires_at': user.token_info.expires_at,
                 'user_id': user.user_id
-            }), 200
+            })
         except Exception as e:
-            return jsonify({'status': 500, 'error': True, "error_msg": str(e)}), 500
+            return self.__json.error(str(e))
 
 
 class FlaskServer:
-    def __init__(self, debug: bool = False) -> None:
+    def __init__(self, debug: bool = False, db: str = 'MyNotes', pool_size: int = 8,
+                 token_cache_size: int = 10000, metrics: bool | None = None, slow_query_ms: float | None = None,
+                 profile: str | None = None, token_lifetime: int | None = None,
+                 token_pool_size: int | None = None, password_hash: str | None = None,
+                 hash_workers: int | None = None, login_limit: str | None = None, login_ip_limit: str | None = None,
+                 rate_limit_db: str | None = None, maintenance_interval: float | None = None,
+                 group_commit: bool | None = None, synchronous: str | None = None,
+                 storage: str | None = None, json_encoder: str | None = None) -> None:
+        """
+        :param debug: Run Flask in debug mode
+        :param db: Path to the database file
+        :param pool_size: Number of pooled read connections, writes use one more
+        :param token_cache_size: Number of cached access tokens, 0 disables the cache
+        :param metrics: Collect metrics (default: MYNOTES_METRICS, on)
+        :param slow_query_ms: Log statements slower than this (default: MYNOTES_SLOW_QUERY_MS, off)
+        :param profile: Profiling mode off, request or all (default: MYNOTES_PROFILE, off)
+        :param token_lifetime: Seconds an access token is valid (default: MYNOTES_TOKEN_LIFETIME, 10)
+        :param token_pool_size: Pre-generated tokens, 0 disables the pool (default: MYNOTES_TOKEN_POOL, 256)
+        :param password_hash: Password hash scheme and cost, e.g. scrypt:ln=14,r=8,p=1 or pbkdf2-sha256:i=600000
+            (default: MYNOTES_PASSWORD_HASH, scrypt)
+        :param hash_workers: Processes which hash passwords, 0 hashes on the request thread
+            (default: MYNOTES_HASH_WORKERS, 2)
+        :param login_limit: Login attempts per username as requests/seconds, off disables the rate limit
+            (default: MYNOTES_LOGIN_LIMIT, 10/60)
+        :param login_ip_limit: Login attempts per client IP (default: MYNOTES_LOGIN_IP_LIMIT, 100/60)
+        :param rate_limit_db: sqlite file for the rate limits, shared by all processes using it
+            (default: MYNOTES_RATE_LIMIT_DB, limits are kept in memory per process)
+        :param maintenance_interval: Seconds between two database clean ups, 0 disables them
+            (default: MYNOTES_MAINTENANCE_INTERVAL, 300)
+        :param group_commit: Commit the writes of concurrent requests together (default: MYNOTES_GROUP_COMMIT, off)
+        :param synchronous: sqlite synchronous mode, FULL fsyncs every commit, NORMAL is faster but can lose the last
+            commits on a power failure (default: MYNOTES_SYNCHRONOUS, FULL)
+        :param storage: Storage backend, sqlite or memory (default: MYNOTES_STORAGE, sqlite)
+        :param json_encoder: Encoder of the responses, auto uses orjson if it is installed and the standard library
+            otherwise, orjson or json force one (default: MYNOTES_JSON, auto)
+        """
         self.__app: Flask = Flask(__name__)
-        MyNotes.register(self.__app, route_base='/')
+        if metrics is None:
+            metrics = os.environ.get('MYNOTES_METRICS', '1') != '0'
+        if token_lifetime is None:
+            token_lifetime = int(os.environ.get('MYNOTES_TOKEN_LIFETIME', '10'))
+        if token_pool_size is None:
+            token_pool_size = int(os.environ.get('MYNOTES_TOKEN_POOL', '256'))
+        if password_hash is None:
+            password_hash = os.environ.get('MYNOTES_PASSWORD_HASH', 'scrypt')
+        if hash_workers is None:
+            hash_workers = int(os.environ.get('MYNOTES_HASH_WORKERS', '2'))
+        if login_limit is None:
+            login_limit = os.environ.get('MYNOTES_LOGIN_LIMIT', '10/60')
+        if login_ip_limit is None:
+            login_ip_limit = os.environ.get('MYNOTES_LOGIN_IP_LIMIT', '100/60')
+        if rate_limit_db is None:
+            rate_limit_db = os.environ.get('MYNOTES_RATE_LIMIT_DB')
+        if maintenance_interval is None:
+            maintenance_interval = float(os.environ.get('MYNOTES_MAINTENANCE_INTERVAL', '300'))
+        if group_commit is None:
+            group_commit = os.environ.get('MYNOTES_GROUP_COMMIT', '0') != '0'
+        if synchronous is None:
+            synchronous = os.environ.get('MYNOTES_SYNCHRONOUS', 'FULL')
+        if storage is None:
+            storage = os.environ.get('MYNOTES_STORAGE', 'sqlite')
+        if json_encoder is None:
+            json_encoder = os.environ.get('MYNOTES_JSON', 'auto')
+
+        login_limiter: LoginRateLimiter | None = None
+        if login_limit not in ('off', '0', ''):
+            store: RateLimitStore = SqliteRateLimitStore(rate_limit_db) if rate_limit_db else MemoryRateLimitStore()
+            login_limiter = LoginRateLimiter(store, per_username=parse_limit(login_limit),
+                                             per_ip=parse_limit(login_ip_limit))
+        if slow_query_ms is None and os.environ.get('MYNOTES_SLOW_QUERY_MS'):
+            slow_query_ms = float(os.environ['MYNOTES_SLOW_QUERY_MS'])
+        # the database is opened and set up once, all views share the same services
+        self.context: ServerContext = ServerContext.create(db=db, pool_size=pool_size,
+                                                             token_cache_size=token_cache_size, metrics=metrics,
+                                                             token_lifetime=token_lifetime,
+                                                             token_pool_size=token_pool_size,
+                                                             password_hasher=hasher_from_string(password_hash),
+                                                             hash_workers=hash_workers,
+                                                             login_limiter=login_limiter,
+                                                             group_commit=group_commit,
+                                                             synchronous=synchronous, storage=storage,
+                                                             json_encoder=json_encoder)
+        MyNotes.register(self.__app, route_base='/', init_argument=self.context)
+
+        self.slow_query_log: SlowQueryLog | None = None
+        if slow_query_ms is not None:
+            self.slow_query_log = SlowQueryLog(threshold_ms=slow_query_ms)
+            self.context.db.add_query_observer(self.slow_query_log)
+
+        self.profiler: RequestProfiler = RequestProfiler(
+            mode=profile or os.environ.get('MYNOTES_PROFILE', 'off'),
+            output_dir=os.environ.get('MYNOTES_PROFILE_DIR', 'profiles'))
+
+        self.maintenance: MaintenanceScheduler | None = None
+        if maintenance_interval > 0:
+            self.maintenance = MaintenanceScheduler(self.context.db, interval=maintenance_interval)
+            self.maintenance.start()
+
+        self.__app.before_request(self.__start_request)
+        # unlike after_request, teardown also runs when a view raised: failed requests are measured as well
+        # and the profiler is always stopped
+        self.__app.teardown_request(self.__end_request)
         self.debug: bool = debug
 
+    @property
+    def app(self) -> Flask:
+        return self.__app
+
+    @staticmethod
+    def __endpoint() -> str:
+        return flask.request.url_rule.rule if flask.request.url_rule is not None else 'unmatched'
+
+    def __start_request(self) -> None:
+        self.profiler.start(requested=flask.request.args.get('profile') == '1')
+        self.context.metrics.start_request()
+
+    def __end_request(self, exception: BaseException | None) -> None:
+        endpoint: str = self.__endpoint()
+        self.context.metrics.end_request(endpoint)
+        self.profiler.stop(endpoint)
+
+    def handle_metrics_signals(self) -> None:
+        """
+        Switch the metrics of the running server with signals, SIGUSR1 enables and SIGUSR2 disables them.
+        Handlers can only be set in the main thread, elsewhere (and on Windows) nothing happens
+        """
+        if not hasattr(signal, 'SIGUSR1') or threading.current_thread() is not threading.main_thread():
+            return
+        signal.signal(signal.SIGUSR1, lambda signum, frame: self.context.metrics.enable())
+        signal.signal(signal.SIGUSR2, lambda signum, frame: self.context.metrics.disable())
+
     def run(self) -> None:
+        self.handle_metrics_signals()
         self.__app.run(debug=self.debug)
@@ -0,0 +1,95 @@
+import json
+from typing import *
+
+from flask import Response
+
+try:
+    import orjson
+except ImportError:  # optional, the standard library encoder is used without it
+    orjson = None
+
+
+class StdlibJsonEncoder:
+    @property
+    def name(self) -> str:
+        return 'json'
+
+    def dumps(self, data: Any) -> bytes:
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+class OrjsonEncoder:
+    def __init__(self) -> None:
+        if orjson is None:
+            raise ValueError('orjson is not installed')
+
+    @property
+    def name(self) -> str:
+        return 'orjson'
+
+    def dumps(self, data: Any) -> bytes:
+        return orjson.dumps(data)
+
+
+JsonEncoder = Union[StdlibJsonEncoder, OrjsonEncoder]
+
+
+def encoder_from_string(name: str) -> JsonEncoder:
+    """
+    Create an encoder from a configuration string
+    :param name: auto (orjson if installed, otherwise json), orjson or json
+    :return: Encoder
+    """
+    if name == 'auto':
+        return OrjsonEncoder() if orjson is not None else StdlibJsonEncoder()
+    if name == 'orjson':
+        return OrjsonEncoder()
+    if name == 'json':
+        return StdlibJsonEncoder()
+    raise ValueError(f'Unknown JSON encoder "{name}", expected auto, orjson or json')
+
+
+class JsonResponses:
+    def __init__(self, encoder: JsonEncoder | None = None) -> None:
+        """
+        Builds the JSON responses of the API. Every response has the envelope {"status": ..., "error": ...},
+        the envelope of successful responses is encoded once and only the payload is encoded per request.
+        :param encoder: Encoder for the payloads (default: orjson if installed, otherwise json)
+        """
+        self.encoder: JsonEncoder = encoder or encoder_from_string('auto')
+        self.__ok: bytes = self.encoder.dumps({'status': 200, 'error': False})
+        # the envelope without its closing brace, a payload is appended after a comma
+        self.__ok_prefix: bytes = self.__ok[:-1] + b','
+
+    def ok(self, payload: dict | None = None) -> Tuple[Response, int]:
+        """
+        Successful response
+        :param payload: Fields next to status and error, must not contain these two
+        :return: Response and status code
+        """
+        if not payload:
+            return self.__response(self.__ok, 200), 200
+        # the encoded payload starts with {, which is replaced by the envelope
+        return self.__response(self.__ok_prefix + self.encoder.dumps(payload)[1:], 200), 200
+
+    def error(self, message: str, status: int = 500) -> Tuple[Response, int]:
+        """
+        Error response
+        :param message: Error message for the client
+        :param status: HTTP status code, also in the body
+        :return: Response and status code
+        """
+        return self.__response(self.encoder.dumps({'status': status, 'error': True, 'error_msg': message}),
+                               status), status
+
+    def line(self, data: Any) -> bytes:
+        """
+        Encode one line of a newline delimited JSON stream
+        :param data: JSON serializable data
+        :return: Encoded line including the newline
+        """
+        return self.encoder.dumps(data) + b'\n'
+
+    @staticmethod
+    def __response(body: bytes, status: int) -> Response:
+        return Response(body, status=status, mimetype='application/json')
@@ -0,0 +1,91 @@
+import logging
+import threading
+import time
+from typing import *
+
+from ext.storage import Storage
+
+logger: logging.Logger = logging.getLogger('mynotes.maintenance')
+
+
+class MaintenanceScheduler:
+    def __init__(self, db: Storage, interval: float = 300.0, batch_size: int = 500,
+                 max_batches: int = 20, batch_pause: float = 0.05, optimize_interval: float = 3600.0,
+                 vacuum_pages: int = 200) -> None:
+        """
+        Background thread which cleans up the database in small steps: deletes orphaned token rows,
+        runs PRAGMA optimize and gives free pages back with incremental vacuum.
+        Every step is its own short write transaction with a pause in between, so requests never wait long
+        for the write lock.
+        :param db: Database to maintain
+        :param interval: Seconds between two runs
+        :param batch_size: Rows deleted per transaction
+        :param max_batches: Maximum transactions per task and run, the rest is done in the next run
+        :param batch_pause: Seconds to wait between two transactions
+        :param optimize_interval: Seconds between two PRAGMA optimize
+        :param vacuum_pages: Pages freed per transaction
+        """
+        self.__db: Storage = db
+        self.interval: float = interval
+        self.batch_size: int = batch_size
+        self.max_batches: int = max_batches
+        self.batch_pause: float = batch_pause
+        self.optimize_interval: float = optimize_interval
+        self.vacuum_pages: int = vacuum_pages
+
+        self.__stop: threading.Event = threading.Event()
+        self.__thread: threading.Thread | None = None
+        self.__last_optimize: float = time.monotonic()
+
+    def start(self) -> None:
+        if self.__thread is not None:
+            return
+        self.__stop.clear()
+        self.__thread = threading.Thread(target=self.__loop, name='db-maintenance', daemon=True)
+        self.__thread.start()
+
+    def stop(self) -> None:
+        self.__stop.set()
+        if self.__thread is not None and self.__thread is not threading.current_thread():
+            self.__thread.join()
+        self.__thread = None
+
+    def __loop(self) -> None:
+        while not self.__stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception('database maintenance failed')
+
+    def __batches(self, step: Callable[[], int]) -> int:
+        """
+        Repeat a step until it has nothing left to do, at most max_batches times
+        :param step: Returns how much it did, 0 when done
+        :return: Total of all steps
+        """
+        total: int = 0
+        for batch in range(self.max_batches):
+            if batch and self.__stop.wait(self.batch_pause):
+                break
+            done: int = step()
+            total += done
+            if done == 0:
+                break
+        return total
+
+    def run_once(self) -> Dict[str, int]:
+        """
+        Run all maintenance tasks once
+        :return: Deleted tokens, freed pages and whether optimize ran
+        """
+        deleted: int = self.__batches(lambda: self.__db.delete_orphaned_tokens(self.batch_size))
+        freed: int = self.__batches(lambda: self.__db.incremental_vacuum(self.vacuum_pages))
+
+        optimized: bool = time.monotonic() - self.__last_optimize >= self.optimize_interval
+        if optimized:
+            self.__db.optimize()
+            self.__last_optimize = time.monotonic()
+
+        if deleted or freed:
+            logger.info('deleted %d orphaned tokens, freed %d pages', deleted, freed)
+        return {'deleted_tokens': deleted, 'freed_pages': freed, 'optimized': int(optimized)}
@@ -0,0 +1,177 @@
+import bisect
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import *
+
+from ext.storage import Storage, Note, NewNote, Subject, TokenPair, UserInfo, LoginCredentials
+
+
+def _as_number(note: float) -> float:
+    # like the INTEGER column of sqlite, whole numbers are kept as int
+    value: float = float(note)
+    return int(value) if value.is_integer() else value
+
+
+@dataclass(slots=True)
+class _User:
+    id: int
+    username: str
+    password: str
+    salt: str
+
+
+@dataclass(slots=True)
+class _SubjectIndex:
+    note_ids: List[int] = field(default_factory=list)  # ascending, new notes always get the highest ID
+    weighted_sum: float = 0.0
+    total_weight: float = 0.0
+
+    @property
+    def gpa(self) -> float | None:
+        # same as weighted_sum / total_weight in sqlite, which is NULL for a total weight of 0
+        return self.weighted_sum / self.total_weight if self.total_weight else None
+
+
+class MemoryStorage(Storage):
+    """
+    Keeps everything in dicts of the process and is lost on restart. Without any I/O it shows how fast
+    the HTTP layer is on its own (benchmarks) and is a quick backend for trying things out.
+    Stored values are converted like sqlite converts them into the columns of DatabaseManager,
+    so both backends return the same data.
+    """
+
+    def __init__(self, string_helper, token_lifetime: int = 10, token_pool_size: int = 0) -> None:
+        super().__init__(string_helper, token_lifetime=token_lifetime, token_pool_size=token_pool_size)
+        self.__lock: threading.Lock = threading.Lock()
+        self.__users: Dict[int, _User] = {}
+        self.__user_ids: Dict[str, int] = {}  # username -> user ID
+        self.__tokens: Dict[int, TokenPair] = {}  # user ID -> tokens
+        self.__notes: Dict[int, Note] = {}
+        # user ID -> subject -> note IDs and running sums for the GPA
+        self.__subjects: Dict[int, Dict[str, _SubjectIndex]] = {}
+        self.__last_user_id: int = 0
+        self.__last_note_id: int = 0
+
+    def __new_token_pair(self, user_id: int) -> TokenPair:
+        token_pair: TokenPair = TokenPair(self._generate_token(), self._generate_token(),
+                                          self._generate_expiration_time())
+        self.__tokens[user_id] = token_pair
+        return token_pair
+
+    def get_refresh_token_by_user_id(self, user_id: int) -> str:
+        return self.__tokens[user_id].refresh_token
+
+    def refresh_access_token(self, user_id: int) -> TokenPair:
+        access_token: str = self._generate_token()
+        expires_at: int = self._generate_expiration_time()
+        with self.__lock:
+            token_pair: TokenPair | None = self.__tokens.get(user_id)
+            if token_pair is not None:
+                self.__tokens[user_id] = TokenPair(access_token, token_pair.refresh_token, expires_at)
+        return TokenPair(access_token, '', expires_at)
+
+    def get_token_pair_if_user_exists(self, user_id: int) -> TokenPair | None:
+        if user_id not in self.__users:
+            return None
+        return self.__tokens.get(user_id)
+
+    def user_id_exists(self, user_id: int) -> bool:
+        return user_id in self.__users
+
+    def username_exists(self, username: str) -> bool:
+        return username in self.__user_ids
+
+    def get_login_credentials(self, username: str) -> LoginCredentials | None:
+        with self.__lock:
+            user_id: int | None = self.__user_ids.get(username)
+            if user_id is None or user_id not in self.__tokens:
+                return None
+            user: _User = self.__users[user_id]
+            return LoginCredentials(user_id=user.id, password=user.password, salt=user.salt,
+                                    token_pair=self.__tokens[user_id])
+
+    def add_user(self, username: str, password: str, salt: str = '') -> UserInfo:
+        with self.__lock:
+            if username in self.__user_ids:
+                raise ValueError('Username already exists')
+            self.__last_user_id += 1
+            user: _User = _User(self.__last_user_id, username, password, salt)
+            self.__users[user.id] = user
+            self.__user_ids[username] = user.id
+            return UserInfo(self.__new_token_pair(user.id), user.id)
+
+    def update_password(self, user_id: int, password: str) -> None:
+        with self.__lock:
+            user: _User | None = self.__users.get(user_id)
+            if user is not None:
+                user.password = password
+                user.salt = ''
+
+    def delete_note_by_id(self, user_id: int, note_id: int) -> None:
+        with self.__lock:
+            note: Note | None = self.__notes.get(note_id)
+            if note is None or note.user_id != user_id:
+                return
+            del self.__notes[note_id]
+
+            subjects: Dict[str, _SubjectIndex] = self.__subjects[user_id]
+            index: _SubjectIndex = subjects[note.subject]
+            del index.note_ids[bisect.bisect_left(index.note_ids, note_id)]
+            if not index.note_ids:
+                del subjects[note.subject]
+                return
+            index.weighted_sum -= note.note * note.weight
+            index.total_weight -= note.weight
+
+    def get_note_by_id(self, user_id: int, note_id: int) -> Note | None:
+        note: Note | None = self.__notes.get(note_id)
+        if note is None or note.user_id != user_id:
+            return None
+        return note
+
+    def __insert_note(self, user_id: int, subject: str, note: float, release_date: str, weight: float) -> int:
+        self.__last_note_id += 1
+        self.__notes[self.__last_note_id] = Note(self.__last_note_id, subject, note, user_id, weight, release_date,
+                                                 time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime()))
+
+        index: _SubjectIndex = self.__subjects.setdefault(user_id, {}).setdefault(subject, _SubjectIndex())
+        index.note_ids.append(self.__last_note_id)
+        index.weighted_sum += note * weight
+        index.total_weight += weight
+        return self.__last_note_id
+
+    def add_note(self, subject: str, note: int, user_id: int, release_date: str = '', weight: float = 1.0) -> int:
+        # convert before locking, a bad value must not leave a half added note behind
+        values: Tuple[str, float, str, float] = (str(subject), _as_number(note), str(release_date), float(weight))
+        with self.__lock:
+            return self.__insert_note(user_id, *values)
+
+    def add_notes(self, user_id: int, notes: List[NewNote]) -> List[int]:
+        values: List[Tuple[str, float, str, float]] = [
+            (str(note.subject), _as_number(note.note), str(note.release_date), float(note.weight)) for note in notes]
+        with self.__lock:
+            return [self.__insert_note(user_id, *value) for value in values]
+
+    def get_subject(self, user_id: int, subject: str, after: int = 0, limit: int | None = None) -> Subject:
+        with self.__lock:
+            index: _SubjectIndex | None = self.__subjects.get(user_id, {}).get(subject)
+            if index is None:
+                raise ValueError('Subject does not exist')
+
+            start: int = bisect.bisect_right(index.note_ids, after)
+            end: int = len(index.note_ids) if limit is None else start + limit
+            notes: List[Note] = [self.__notes[note_id] for note_id in index.note_ids[start:end]]
+            return Subject(subject, notes, index.gpa, len(index.note_ids))
+
+    def iter_notes(self, user_id: int, batch_size: int = 500) -> Iterator[Note]:
+        with self.__lock:
+            subjects: Dict[str, _SubjectIndex] = self.__subjects.get(user_id, {})
+            notes: List[Note] = [self.__notes[note_id] for subject in sorted(subjects)
+                                 for note_id in subjects[subject].note_ids]
+        return iter(notes)
+
+    def get_all_subjects(self, user_id: int) -> List[Subject]:
+        with self.__lock:
+            subjects: Dict[str, _SubjectIndex] = self.__subjects.get(user_id, {})
+            return [Subject(name, [], subjects[name].gpa, len(subjects[name].note_ids)) for name in sorted(subjects)]
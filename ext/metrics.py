@@ -0,0 +1,160 @@
+import bisect
+import threading
+import time
+from typing import *
+
+from ext.storage import Storage
+from ext.token_cache import TokenCache, CacheStats
+
+LATENCY_BUCKETS: Tuple[float, ...] = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+STATEMENT_BUCKETS: Tuple[float, ...] = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float]) -> None:
+        """
+        Cumulative histogram in the Prometheus format, not thread-safe on its own
+        :param buckets: Upper bounds of the buckets (sorted)
+        """
+        self.buckets: Tuple[float, ...] = tuple(buckets)
+        self.counts: List[int] = [0] * (len(self.buckets) + 1)  # the last one is +Inf
+        self.sum: float = 0.0
+        self.count: int = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    def __init__(self, db: Storage | None = None, token_cache: TokenCache | None = None,
+                 enabled: bool = True) -> None:
+        """
+        Collects per endpoint request latencies, SQL statement counts/durations and token cache hit rates.
+        Can be switched on and off at runtime, when disabled nothing is measured.
+        :param db: Database whose statements are counted
+        :param token_cache: Token cache whose hit rate is reported
+        :param enabled: Start collecting right away
+        """
+        self.__db: Storage | None = db
+        self.__token_cache: TokenCache | None = token_cache
+        self.__enabled: bool = False
+        self.__lock: threading.Lock = threading.Lock()
+        self.__local: threading.local = threading.local()
+
+        self.__latency: Dict[str, Histogram] = {}
+        self.__statements: Dict[str, Histogram] = {}
+        self.__sql_time: Dict[str, Histogram] = {}
+
+        if enabled:
+            self.enable()
+
+    @property
+    def enabled(self) -> bool:
+        return self.__enabled
+
+    def enable(self) -> None:
+        if self.__enabled:
+            return
+        self.__enabled = True
+        if self.__db is not None:
+            self.__db.add_query_observer(self.observe_query)
+
+    def disable(self) -> None:
+        if not self.__enabled:
+            return
+        self.__enabled = False
+        if self.__db is not None:
+            self.__db.remove_query_observer(self.observe_query)
+
+    def start_request(self) -> None:
+        """
+        Start measuring a request on the current thread
+        """
+        if not self.__enabled:
+            return
+        local: threading.local = self.__local
+        local.start = time.perf_counter()
+        local.statements = 0
+        local.sql_time = 0.0
+
+    def observe_query(self, sql: str, parameters: Any, duration: float, rows: int) -> None:
+        """
+        Query observer of the database, counts the statements of the current request
+        """
+        local: threading.local = self.__local
+        if getattr(local, 'start', None) is None:
+            return  # statement outside of a request
+        local.statements += 1
+        local.sql_time += duration
+
+    def end_request(self, endpoint: str) -> None:
+        """
+        Finish measuring the request on the current thread
+        :param endpoint: Endpoint the request was routed to
+        """
+        local: threading.local = self.__local
+        start: float | None = getattr(local, 'start', None)
+        if start is None:
+            return
+        local.start = None
+        if not self.__enabled:
+            return
+
+        duration: float = time.perf_counter() - start
+        with self.__lock:
+            if endpoint not in self.__latency:
+                self.__latency[endpoint] = Histogram(LATENCY_BUCKETS)
+                self.__statements[endpoint] = Histogram(STATEMENT_BUCKETS)
+                self.__sql_time[endpoint] = Histogram(LATENCY_BUCKETS)
+            self.__latency[endpoint].observe(duration)
+            self.__statements[endpoint].observe(local.statements)
+            self.__sql_time[endpoint].observe(local.sql_time)
+
+    def render(self) -> str:
+        """
+        Render all metrics in the Prometheus text format
+        :return: Metrics as text
+        """
+        lines: List[str] = [
+            '# HELP mynotes_metrics_enabled Whether metrics are collected',
+            '# TYPE mynotes_metrics_enabled gauge',
+            f'mynotes_metrics_enabled {int(self.__enabled)}',
+        ]
+
+        with self.__lock:
+            self.__render_histograms(lines, 'mynotes_request_duration_seconds', 'Request latency per endpoint',
+                                     self.__latency)
+            self.__render_histograms(lines, 'mynotes_request_sql_statements', 'SQL statements per request',
+                                     self.__statements)
+            self.__render_histograms(lines, 'mynotes_request_sql_duration_seconds', 'SQL time per request',
+                                     self.__sql_time)
+
+        if self.__token_cache is not None:
+            stats: CacheStats = self.__token_cache.stats()
+            for name, kind, value, description in (
+                    ('mynotes_token_cache_hits_total', 'counter', stats.hits, 'Token cache hits'),
+                    ('mynotes_token_cache_misses_total', 'counter', stats.misses, 'Token cache misses'),
+                    ('mynotes_token_cache_evictions_total', 'counter', stats.evictions, 'Token cache evictions'),
+                    ('mynotes_token_cache_size', 'gauge', stats.size, 'Cached tokens'),
+                    ('mynotes_token_cache_hit_ratio', 'gauge', stats.hit_rate, 'Token cache hit ratio')):
+                lines.append(f'# HELP {name} {description}')
+                lines.append(f'# TYPE {name} {kind}')
+                lines.append(f'{name} {value}')
+
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def __render_histograms(lines: List[str], name: str, description: str, histograms: Dict[str, Histogram]) -> None:
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} histogram')
+        for endpoint, histogram in sorted(histograms.items()):
+            label: str = endpoint.replace('\\', '\\\\').replace('"', '\\"')
+            cumulative: int = 0
+            for bucket, count in zip(histogram.buckets + (float('inf'),), histogram.counts):
+                cumulative += count
+                bound: str = '+Inf' if bucket == float('inf') else repr(float(bucket))
+                lines.append(f'{name}_bucket{{endpoint="{label}",le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_sum{{endpoint="{label}"}} {histogram.sum}')
+            lines.append(f'{name}_count{{endpoint="{label}"}} {histogram.count}')
@@ -0,0 +1,239 @@
+import sqlite3 as sqlite
+from typing import *
+from dataclasses import dataclass
+
+from ext.connection_pool import ConnectionPool
+
+
+@dataclass
+class Migration:
+    version: int
+    description: str
+    apply: Callable[[sqlite.Cursor], None]
+
+
+def _create_tables(cursor: sqlite.Cursor) -> None:
+    cursor.execute("""CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT NOT NULL,
+        password TEXT NOT NULL,
+        salt TEXT DEFAULT ''
+    )""")
+
+    cursor.execute("""CREATE TABLE IF NOT EXISTS notes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        subject TEXT NOT NULL,
+        note TEXT NOT NULL,
+        note_owner INTEGER NOT NULL,
+        release_date TEXT DEFAULT '',
+        weight FLOAT DEFAULT 1.0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (note_owner) REFERENCES users(id)
+    )""")
+
+    cursor.execute("""CREATE TABLE IF NOT EXISTS tokens (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        access_token TEXT NOT NULL,
+        expires_at TIMESTAMP NOT NULL,
+        refresh_token TEXT NOT NULL,
+        user_id INTEGER NOT NULL,
+        FOREIGN KEY (user_id) REFERENCES users(id)
+    )""")
+
+
+def _add_lookup_indexes(cursor: sqlite.Cursor) -> None:
+    cursor.execute("""SELECT username FROM users GROUP BY username HAVING COUNT(*) > 1 LIMIT 1""")
+    duplicate: Tuple | None = cursor.fetchone()
+    if duplicate is not None:
+        raise RuntimeError(f'Cannot add unique index on users(username), "{duplicate[0]}" exists more than once')
+
+    # every user should only have one token row, older databases may contain more.
+    # The lookups used to return the first row, so that is the one we keep
+    cursor.execute("""DELETE FROM tokens WHERE id NOT IN (SELECT MIN(id) FROM tokens GROUP BY user_id)""")
+
+    cursor.execute("""CREATE UNIQUE INDEX IF NOT EXISTS idx_users_username ON users (username)""")
+    cursor.execute("""CREATE UNIQUE INDEX IF NOT EXISTS idx_tokens_user_id ON tokens (user_id)""")
+    # covers get_subject (owner + subject) and get_all_subjects (owner, distinct subject)
+    cursor.execute("""CREATE INDEX IF NOT EXISTS idx_notes_owner_subject ON notes (note_owner, subject)""")
+
+
+def _add_subject_stats(cursor: sqlite.Cursor) -> None:
+    cursor.execute("""CREATE TABLE IF NOT EXISTS subject_stats (
+        user_id INTEGER NOT NULL,
+        subject TEXT NOT NULL,
+        weighted_sum REAL NOT NULL DEFAULT 0,
+        total_weight REAL NOT NULL DEFAULT 0,
+        note_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, subject),
+        FOREIGN KEY (user_id) REFERENCES users(id)
+    )""")
+
+    # the triggers keep subject_stats in the same transaction as the note changes
+    add_note: str = """
+        INSERT OR IGNORE INTO subject_stats (user_id, subject) VALUES (NEW.note_owner, NEW.subject);
+        UPDATE subject_stats SET weighted_sum = weighted_sum + CAST(NEW.note AS REAL) * NEW.weight,
+            total_weight = total_weight + NEW.weight, note_count = note_count + 1
+            WHERE user_id = NEW.note_owner AND subject = NEW.subject;"""
+    remove_note: str = """
+        UPDATE subject_stats SET weighted_sum = weighted_sum - CAST(OLD.note AS REAL) * OLD.weight,
+            total_weight = total_weight - OLD.weight, note_count = note_count - 1
+            WHERE user_id = OLD.note_owner AND subject = OLD.subject;
+        DELETE FROM subject_stats WHERE user_id = OLD.note_owner AND subject = OLD.subject AND note_count <= 0;"""
+
+    cursor.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_notes_insert_stats AFTER INSERT ON notes BEGIN
+        {add_note}
+    END""")
+    cursor.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_notes_delete_stats AFTER DELETE ON notes BEGIN
+        {remove_note}
+    END""")
+    cursor.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_notes_update_stats
+        AFTER UPDATE OF subject, note, note_owner, weight ON notes BEGIN
+        {remove_note}
+        {add_note}
+    END""")
+
+    rebuild_subject_stats(cursor)
+
+
+def rebuild_subject_stats(cursor: sqlite.Cursor) -> None:
+    """
+    Recalculate subject_stats from the notes table
+    :param cursor: Cursor of a write connection
+    """
+    cursor.execute("""DELETE FROM subject_stats""")
+    cursor.execute("""INSERT INTO subject_stats (user_id, subject, weighted_sum, total_weight, note_count)
+        SELECT note_owner, subject, SUM(CAST(note AS REAL) * weight), SUM(weight), COUNT(*) FROM notes
+        GROUP BY note_owner, subject""")
+
+
+def _rebuild_table(cursor: sqlite.Cursor, table: str, columns: str, select: str) -> None:
+    """
+    Replace a table by one with new column definitions (sqlite can not change the type of a column).
+    Keeps the AUTOINCREMENT counter, indexes and triggers are dropped with the old table.
+    :param cursor: Cursor of a write connection
+    :param table: Table name
+    :param columns: Column definitions of the new table
+    :param select: SELECT on the old table which returns the rows for the new one
+    """
+    cursor.execute("""SELECT seq FROM sqlite_sequence WHERE name = ?""", (table,))
+    sequence: Tuple | None = cursor.fetchone()
+
+    cursor.execute(f"""CREATE TABLE {table}_new ({columns})""")
+    cursor.execute(f"""INSERT INTO {table}_new {select}""")
+    cursor.execute(f"""DROP TABLE {table}""")
+    cursor.execute(f"""ALTER TABLE {table}_new RENAME TO {table}""")
+
+    # IDs of deleted rows must not be handed out again
+    cursor.execute("""DELETE FROM sqlite_sequence WHERE name = ?""", (table,))
+    cursor.execute(f"""INSERT INTO sqlite_sequence (name, seq) SELECT ?, MAX(?, COALESCE(MAX(id), 0)) FROM {table}""",
+                   (table, sequence[0] if sequence else 0))
+
+
+def _typed_columns(cursor: sqlite.Cursor) -> None:
+    # INTEGER affinity turns numeric text into numbers ('5' -> 5, '5.5' -> 5.5), anything else stays text
+    _rebuild_table(cursor, 'notes', """
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        subject TEXT NOT NULL,
+        note INTEGER NOT NULL,
+        note_owner INTEGER NOT NULL,
+        release_date TEXT DEFAULT '',
+        weight REAL DEFAULT 1.0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (note_owner) REFERENCES users(id)""",
+                   """SELECT id, subject, note, note_owner, release_date, weight, created_at FROM notes""")
+
+    cursor.execute("""SELECT id, note FROM notes WHERE typeof(note) NOT IN ('integer', 'real') LIMIT 1""")
+    invalid: Tuple | None = cursor.fetchone()
+    if invalid is not None:
+        raise RuntimeError(f'Cannot convert notes to numbers, note {invalid[0]} is "{invalid[1]}"')
+
+    cursor.execute("""CREATE INDEX IF NOT EXISTS idx_notes_owner_subject ON notes (note_owner, subject)""")
+
+    # same as in _add_subject_stats, but the note does not have to be parsed anymore
+    add_note: str = """
+        INSERT OR IGNORE INTO subject_stats (user_id, subject) VALUES (NEW.note_owner, NEW.subject);
+        UPDATE subject_stats SET weighted_sum = weighted_sum + NEW.note * NEW.weight,
+            total_weight = total_weight + NEW.weight, note_count = note_count + 1
+            WHERE user_id = NEW.note_owner AND subject = NEW.subject;"""
+    remove_note: str = """
+        UPDATE subject_stats SET weighted_sum = weighted_sum - OLD.note * OLD.weight,
+            total_weight = total_weight - OLD.weight, note_count = note_count - 1
+            WHERE user_id = OLD.note_owner AND subject = OLD.subject;
+        DELETE FROM subject_stats WHERE user_id = OLD.note_owner AND subject = OLD.subject AND note_count <= 0;"""
+
+    cursor.execute(f"""CREATE TRIGGER trg_notes_insert_stats AFTER INSERT ON notes BEGIN
+        {add_note}
+    END""")
+    cursor.execute(f"""CREATE TRIGGER trg_notes_delete_stats AFTER DELETE ON notes BEGIN
+        {remove_note}
+    END""")
+    cursor.execute(f"""CREATE TRIGGER trg_notes_update_stats
+        AFTER UPDATE OF subject, note, note_owner, weight ON notes BEGIN
+        {remove_note}
+        {add_note}
+    END""")
+
+    # a timestamp which is not a number could never be checked, such tokens count as expired
+    _rebuild_table(cursor, 'tokens', """
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        access_token TEXT NOT NULL,
+        expires_at INTEGER NOT NULL,
+        refresh_token TEXT NOT NULL,
+        user_id INTEGER NOT NULL,
+        FOREIGN KEY (user_id) REFERENCES users(id)""",
+                   """SELECT id, access_token, CASE typeof(expires_at) WHEN 'integer' THEN expires_at
+                   WHEN 'real' THEN CAST(expires_at AS INTEGER) ELSE 0 END, refresh_token, user_id FROM tokens""")
+    cursor.execute("""CREATE UNIQUE INDEX IF NOT EXISTS idx_tokens_user_id ON tokens (user_id)""")
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, 'Create users, notes and tokens tables', _create_tables),
+    Migration(2, 'Add indexes for user, token and note lookups', _add_lookup_indexes),
+    Migration(3, 'Add subject_stats table maintained by triggers', _add_subject_stats),
+    Migration(4, 'Store notes and token expiration times as numbers', _typed_columns),
+]
+
+
+class MigrationRunner:
+    def __init__(self, migrations: List[Migration] = None) -> None:
+        self.__migrations: List[Migration] = sorted(migrations if migrations is not None else MIGRATIONS,
+                                                    key=lambda migration: migration.version)
+
+    @staticmethod
+    def current_version(pool: ConnectionPool) -> int:
+        """
+        Get the schema version of a database
+        :param pool: Connection pool of the database
+        :return: Schema version (0 for a new database)
+        """
+        with pool.read() as cursor:
+            cursor.execute('PRAGMA user_version')
+            return cursor.fetchone()[0]
+
+    def migrate(self, pool: ConnectionPool) -> int:
+        """
+        Apply all migrations which are newer than the schema version of the database.
+        Each migration runs in its own transaction together with the version bump.
+        :param pool: Connection pool of the database
+        :return: Schema version after migrating
+        """
+        version: int = self.current_version(pool)
+
+        for migration in self.__migrations:
+            if migration.version <= version:
+                continue
+
+            with pool.write() as cursor:
+                cursor.execute('BEGIN IMMEDIATE')
+                # another process may have migrated while we were waiting for the lock
+                cursor.execute('PRAGMA user_version')
+                if cursor.fetchone()[0] >= migration.version:
+                    version = migration.version
+                    continue
+
+                migration.apply(cursor)
+                cursor.execute(f'PRAGMA user_version = {int(migration.version)}')
+
+            version = migration.version
+
+        return version
@@ -0,0 +1,205 @@
+import base64
+import hashlib
+import hmac
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import *
+
+salt_length: int = 16
+key_length: int = 32
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.b64encode(data).decode().rstrip('=')
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.b64decode(text + '=' * (-len(text) % 4))
+
+
+def _parse_parameters(parameters: str) -> Dict[str, str]:
+    """
+    Parse parameters in the form ln=14,r=8,p=1
+    """
+    try:
+        return dict(item.split('=', 1) for item in parameters.split(',') if item)
+    except ValueError:
+        raise ValueError(f'Invalid hash parameters "{parameters}"') from None
+
+
+@dataclass(frozen=True)
+class ScryptHasher:
+    log_n: int = 14
+    r: int = 8
+    p: int = 1
+
+    @property
+    def scheme(self) -> str:
+        return 'scrypt'
+
+    @property
+    def parameters(self) -> str:
+        return f'ln={self.log_n},r={self.r},p={self.p}'
+
+    @staticmethod
+    def from_parameters(parameters: str) -> 'ScryptHasher':
+        values: Dict[str, str] = _parse_parameters(parameters)
+        return ScryptHasher(log_n=int(values.get('ln', 14)), r=int(values.get('r', 8)), p=int(values.get('p', 1)))
+
+    def derive(self, password: str, salt: bytes) -> bytes:
+        n: int = 1 << self.log_n
+        # scrypt needs 128 * n * r * p bytes, OpenSSL refuses more than 32 MiB unless told otherwise
+        return hashlib.scrypt(password.encode(), salt=salt, n=n, r=self.r, p=self.p,
+                              maxmem=128 * n * self.r * (self.p + 1) + 1024 * 1024, dklen=key_length)
+
+
+@dataclass(frozen=True)
+class Pbkdf2Hasher:
+    iterations: int = 600000
+    digest: str = 'sha256'
+
+    @property
+    def scheme(self) -> str:
+        return f'pbkdf2-{self.digest}'
+
+    @property
+    def parameters(self) -> str:
+        return f'i={self.iterations}'
+
+    @staticmethod
+    def from_parameters(parameters: str, digest: str = 'sha256') -> 'Pbkdf2Hasher':
+        values: Dict[str, str] = _parse_parameters(parameters)
+        return Pbkdf2Hasher(iterations=int(values.get('i', 600000)), digest=digest)
+
+    def derive(self, password: str, salt: bytes) -> bytes:
+        return hashlib.pbkdf2_hmac(self.digest, password.encode(), salt, self.iterations, dklen=key_length)
+
+
+PasswordHasher = Union[ScryptHasher, Pbkdf2Hasher]
+
+
+def hasher_from_string(spec: str) -> PasswordHasher:
+    """
+    Create a hasher from a configuration string
+    :param spec: Scheme and optional parameters, e.g. scrypt, scrypt:ln=15,r=8,p=1 or pbkdf2-sha256:i=600000
+    :return: Hasher
+    """
+    scheme, _, parameters = spec.strip().partition(':')
+    if scheme == 'scrypt':
+        return ScryptHasher.from_parameters(parameters)
+    if scheme.startswith('pbkdf2-') and scheme[len('pbkdf2-'):] in hashlib.algorithms_guaranteed:
+        return Pbkdf2Hasher.from_parameters(parameters, digest=scheme[len('pbkdf2-'):])
+    raise ValueError(f'Unknown password hash scheme "{scheme}"')
+
+
+@dataclass
+class PasswordCheck:
+    valid: bool
+    # new hash if the stored one uses an old scheme or cost, should be saved
+    upgraded_hash: str | None = None
+
+
+def _derive(hasher: PasswordHasher, password: str, salt: bytes) -> bytes:
+    # module level, so it can be sent to the process pool
+    return hasher.derive(password, salt)
+
+
+class PasswordEngine:
+    def __init__(self, hasher: PasswordHasher | None = None, workers: int = 0) -> None:
+        """
+        Hashes passwords with scrypt or PBKDF2 in the format $scheme$parameters$salt$hash.
+        Hashes of the old format (sha512 of password + salt) are still accepted and upgraded.
+        :param hasher: Hasher for new passwords (default: scrypt with ln=14, r=8, p=1)
+        :param workers: Number of processes which do the hashing, 0 hashes on the calling thread
+        """
+        self.hasher: PasswordHasher = hasher or ScryptHasher()
+        self.__workers: int = workers
+        self.__executor: ProcessPoolExecutor | None = None
+        self.__pid: int = -1
+        self.__lock: threading.Lock = threading.Lock()
+        self.__dummy_hash: str | None = None
+
+    def __executor_for_process(self) -> ProcessPoolExecutor:
+        with self.__lock:
+            if self.__executor is None or self.__pid != os.getpid():
+                # the server is multithreaded by now, a forked worker could inherit a lock held by another thread.
+                # forkserver forks the workers from a separate single threaded process instead
+                method: str = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                self.__executor = ProcessPoolExecutor(max_workers=self.__workers,
+                                                      mp_context=multiprocessing.get_context(method))
+                self.__pid = os.getpid()
+            return self.__executor
+
+    def __derive(self, hasher: PasswordHasher, password: str, salt: bytes) -> bytes:
+        if self.__workers <= 0:
+            return hasher.derive(password, salt)
+        executor: ProcessPoolExecutor = self.__executor_for_process()
+        try:
+            return executor.submit(_derive, hasher, password, salt).result()
+        except BrokenProcessPool:
+            # a worker died (e.g. killed), start new ones with the next password
+            with self.__lock:
+                if self.__executor is executor:
+                    self.__executor = None
+            return hasher.derive(password, salt)
+
+    def hash(self, password: str) -> str:
+        """
+        Hash a password with the configured hasher and a new salt
+        :param password: Password (the sha512 hash sent by the client)
+        :return: Encoded hash
+        """
+        salt: bytes = os.urandom(salt_length)
+        key: bytes = self.__derive(self.hasher, password, salt)
+        return f'${self.hasher.scheme}${self.hasher.parameters}${_b64encode(salt)}${_b64encode(key)}'
+
+    def verify(self, password: str, stored: str, legacy_salt: str = '') -> PasswordCheck:
+        """
+        Check a password against a stored hash
+        :param password: Password (the sha512 hash sent by the client)
+        :param stored: Stored hash, in the current or the old format
+        :param legacy_salt: Salt of the user, only used by the old format
+        :return: Whether the password is correct and a new hash if the stored one is outdated
+        """
+        if not stored.startswith('$'):
+            legacy: str = hashlib.sha512((password + legacy_salt).encode()).hexdigest()
+            if not hmac.compare_digest(legacy, stored):
+                return PasswordCheck(valid=False)
+            return PasswordCheck(valid=True, upgraded_hash=self.hash(password))
+
+        try:
+            _, scheme, parameters, salt, key = stored.split('$')
+            hasher: PasswordHasher = hasher_from_string(f'{scheme}:{parameters}')
+            expected: bytes = _b64decode(key)
+            derived: bytes = self.__derive(hasher, password, _b64decode(salt))
+        except ValueError:
+            return PasswordCheck(valid=False)
+
+        if not hmac.compare_digest(derived, expected):
+            return PasswordCheck(valid=False)
+        if hasher != self.hasher:
+            return PasswordCheck(valid=True, upgraded_hash=self.hash(password))
+        return PasswordCheck(valid=True)
+
+    def dummy_hash(self) -> str:
+        """
+        Hash of a random password with the configured hasher, created once.
+        Verifying against it takes as long as a real login, so unknown usernames can't be found by timing
+        :return: Encoded hash which no password matches
+        """
+        if self.__dummy_hash is None:
+            self.__dummy_hash = self.hash(os.urandom(salt_length).hex())
+        return self.__dummy_hash
+
+    def close(self) -> None:
+        """
+        Stop the hashing processes
+        """
+        with self.__lock:
+            if self.__executor is not None and self.__pid == os.getpid():
+                self.__executor.shutdown(wait=False, cancel_futures=True)
+            self.__executor = None
@@ -0,0 +1,263 @@
+import argparse
+import os
+import signal
+import socket
+import threading
+import time
+import traceback
+from typing import *
+
+from werkzeug.serving import ThreadedWSGIServer
+
+from ext.connection_pool import ConnectionPool
+from ext.flask_server import FlaskServer
+from ext.migrations import MigrationRunner
+
+# signals the master handles, blocked while a worker is forked
+WORKER_SIGNALS: Set[int] = {signal.SIGTERM, signal.SIGINT, signal.SIGHUP}
+# forwarded to the workers, they switch the metrics on (SIGUSR1) and off (SIGUSR2)
+METRICS_SIGNALS: Set[int] = {signal.SIGUSR1, signal.SIGUSR2}
+
+
+class DrainingWSGIServer(ThreadedWSGIServer):
+    def __init__(self, host: str, port: int, app: Callable, fd: int | None = None) -> None:
+        """
+        Threaded werkzeug server whose request threads can be waited for. werkzeug starts them as daemon
+        threads without keeping track of them, so they would be killed in the middle of a request when the
+        worker exits. werkzeug closes the connection after every response, so one thread is one request.
+        :param host: Host to listen on
+        :param port: Port to listen on
+        :param app: WSGI application
+        :param fd: File descriptor of an already listening socket
+        """
+        super().__init__(host, port, app, fd=fd)
+        self.__threads: Set[threading.Thread] = set()
+        self.__lock: threading.Lock = threading.Lock()
+
+    def process_request(self, request, client_address) -> None:
+        thread: threading.Thread = threading.Thread(target=self.__process, args=(request, client_address),
+                                                    daemon=True)
+        with self.__lock:
+            self.__threads.add(thread)
+        thread.start()
+
+    def __process(self, request, client_address) -> None:
+        try:
+            self.process_request_thread(request, client_address)
+        finally:
+            with self.__lock:
+                self.__threads.discard(threading.current_thread())
+
+    def drain(self, timeout: float) -> bool:
+        """
+        Wait until the running requests are finished, call after serve_forever returned
+        :param timeout: Maximum seconds to wait
+        :return: True if all requests are finished, False if some are still running after the timeout
+        """
+        deadline: float = time.monotonic() + timeout
+        while True:
+            with self.__lock:
+                threads: List[threading.Thread] = list(self.__threads)
+            remaining: float = deadline - time.monotonic()
+            if not threads or remaining <= 0:
+                return not threads
+            threads[0].join(remaining)
+
+
+class PreforkServer:
+    def __init__(self, host: str = '0.0.0.0', port: int = 5000, workers: int | None = None, db: str = 'MyNotes',
+                 pool_size: int = 8, drain_timeout: float = 30.0) -> None:
+        """
+        Production launcher which forks one worker process per core. All workers accept connections
+        on the same listening socket and open their own database connections.
+        Only works on platforms with os.fork (Linux, macOS).
+        :param host: Host to listen on
+        :param port: Port to listen on
+        :param workers: Number of worker processes, defaults to the number of cores
+        :param db: Path to the database file
+        :param pool_size: Number of read connections per worker, writes use one more
+        :param drain_timeout: Seconds a stopping worker waits for its running requests
+        """
+        self.__host: str = host
+        self.__port: int = port
+        self.__workers: int = workers or os.cpu_count() or 1
+        self.__db: str = db
+        self.__pool_size: int = pool_size
+        self.__drain_timeout: float = drain_timeout
+
+        self.__socket: socket.socket | None = None
+        self.__children: Dict[int, int] = {}  # pid -> worker number
+        self.__running: bool = False
+        # rolling restart: workers which still have to be restarted and the one which is stopping right now
+        self.__reload_queue: List[int] = []
+        self.__retiring: int | None = None
+        # last metrics signal, new workers get it as well
+        self.__metrics_signal: int | None = None
+
+    def run(self) -> None:
+        """
+        Set up the database, fork the workers and supervise them until SIGINT/SIGTERM.
+        SIGHUP restarts the workers one after the other, the others keep accepting connections meanwhile.
+        SIGUSR1 and SIGUSR2 are passed on to the workers to switch their metrics on and off.
+        """
+        # schema setup happens once here, the workers only see an up-to-date database.
+        # No connection may survive the fork, so the pool is closed again right away
+        pool: ConnectionPool = ConnectionPool(self.__db, size=1)
+        MigrationRunner().migrate(pool)
+        pool.close()
+
+        self.__socket = socket.create_server((self.__host, self.__port), reuse_port=False, backlog=1024)
+        self.__socket.set_inheritable(True)
+        self.__running = True
+
+        signal.signal(signal.SIGTERM, self.__handle_stop)
+        signal.signal(signal.SIGINT, self.__handle_stop)
+        signal.signal(signal.SIGHUP, self.__handle_reload)
+        for sig in METRICS_SIGNALS:
+            signal.signal(sig, self.__handle_metrics)
+
+        print(f'MyNotes listening on {self.__host}:{self.__port} with {self.__workers} workers')
+        for number in range(self.__workers):
+            if not self.__running:
+                break  # stopped while the workers were started
+            self.__spawn(number)
+
+        while self.__children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+
+            number: int | None = self.__children.pop(pid, None)
+            if pid == self.__retiring:
+                # replaced by a new worker during a reload, continue with the next one
+                self.__retiring = None
+                if self.__running:
+                    self.__reload_next()
+            elif number is not None and self.__running:
+                print(f'Worker {number} (pid {pid}) exited with status {status}, restarting')
+                # avoid a tight fork loop if workers crash on startup
+                time.sleep(0.5)
+                self.__spawn(number)
+
+        self.__socket.close()
+
+    def __spawn(self, number: int) -> None:
+        # until the worker has its own handlers, a signal would run the handler of the master in the worker.
+        # It stays pending while it is blocked and is delivered to the worker's handler afterwards
+        signal.pthread_sigmask(signal.SIG_BLOCK, WORKER_SIGNALS | METRICS_SIGNALS)
+        pid: int = os.fork()
+        if pid != 0:
+            # registered first, so the stop handler also signals this worker
+            self.__children[pid] = number
+            if self.__metrics_signal is not None:
+                # stays pending until the worker has set up its handlers
+                self.__kill(pid, self.__metrics_signal)
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, WORKER_SIGNALS | METRICS_SIGNALS)
+            return
+
+        # worker process
+        exit_code: int = 0
+        try:
+            self.__run_worker()
+        except BaseException:
+            traceback.print_exc()
+            exit_code = 1
+        finally:
+            os._exit(exit_code)
+
+    def __run_worker(self) -> None:
+        for sig in (signal.SIGINT, signal.SIGHUP):
+            signal.signal(sig, signal.SIG_IGN)
+        stopping: threading.Event = threading.Event()
+        http_server: DrainingWSGIServer | None = None
+
+        def stop(signum, frame) -> None:
+            stopping.set()
+            if http_server is not None:
+                # shutdown() waits for serve_forever to return, so it can not run in the main thread
+                threading.Thread(target=http_server.shutdown, daemon=True).start()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.pthread_sigmask(signal.SIG_UNBLOCK, WORKER_SIGNALS)
+
+        # login rate limits have to be shared by all workers, so they are kept in a sqlite file
+        server: FlaskServer = FlaskServer(debug=False, db=self.__db, pool_size=self.__pool_size,
+                                          rate_limit_db=os.environ.get('MYNOTES_RATE_LIMIT_DB',
+                                                                       f'{self.__db}-ratelimit'))
+        # metrics signals which arrived during the start up are handled now
+        server.handle_metrics_signals()
+        signal.pthread_sigmask(signal.SIG_UNBLOCK, METRICS_SIGNALS)
+        http_server = DrainingWSGIServer(self.__host, self.__port, server.app, fd=self.__socket.fileno())
+        # stopped while starting up. A SIGTERM after this check makes serve_forever return right away
+        if not stopping.is_set():
+            http_server.serve_forever()
+        # no new connections are accepted anymore, the running requests still need the database
+        if not http_server.drain(self.__drain_timeout):
+            print(f'Worker (pid {os.getpid()}) stopped with requests still running after {self.__drain_timeout} '
+                  f'seconds')
+        if server.maintenance is not None:
+            server.maintenance.stop()
+        server.context.passwords.close()
+        server.context.db.close()
+
+    def __handle_stop(self, signum, frame) -> None:
+        self.__running = False
+        self.__reload_queue.clear()
+        for pid in list(self.__children):
+            self.__kill(pid, signal.SIGTERM)
+
+    def __handle_metrics(self, signum, frame) -> None:
+        self.__metrics_signal = signum
+        for pid in list(self.__children):
+            self.__kill(pid, signum)
+
+    def __handle_reload(self, signum, frame) -> None:
+        # a reload which is still running starts over with the workers which are left
+        self.__reload_queue = [pid for pid in self.__children if pid != self.__retiring]
+        if self.__retiring is None:
+            self.__reload_next()
+
+    def __reload_next(self) -> None:
+        """
+        Replace the next worker of the reload: start the new worker first, then stop the old one.
+        The supervise loop calls this again when the old worker has exited.
+        """
+        while self.__reload_queue:
+            pid: int = self.__reload_queue.pop(0)
+            number: int | None = self.__children.get(pid)
+            if number is None:
+                continue  # exited in the meantime and was already restarted
+            self.__retiring = pid
+            self.__spawn(number)
+            self.__kill(pid, signal.SIGTERM)
+            return
+        print('All workers restarted')
+
+    @staticmethod
+    def __kill(pid: int, sig: int) -> None:
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            pass
+
+
+def main() -> None:
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description='Run MyNotes with multiple worker processes')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=None, help='Number of workers (default: number of cores)')
+    parser.add_argument('--db', default='MyNotes', help='Path to the database file')
+    parser.add_argument('--pool-size', type=int, default=8, help='Read connections per worker')
+    parser.add_argument('--drain-timeout', type=float, default=30.0,
+                        help='Seconds a stopping worker waits for its running requests')
+    args: argparse.Namespace = parser.parse_args()
+
+    PreforkServer(host=args.host, port=args.port, workers=args.workers, db=args.db, pool_size=args.pool_size,
+                  drain_timeout=args.drain_timeout).run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+import cProfile
+import logging
+import os
+import re
+import threading
+import time
+from typing import *
+
+logger: logging.Logger = logging.getLogger('mynotes.profiling')
+
+
+class SlowQueryLog:
+    def __init__(self, threshold_ms: float = 50.0, log: logging.Logger | None = None) -> None:
+        """
+        Query observer which logs every statement taking longer than the threshold.
+        Only the shape of the parameters is logged, never their values (they contain passwords and tokens).
+        :param threshold_ms: Minimum duration of a logged statement in milliseconds
+        :param log: Logger to write to
+        """
+        self.threshold_ms: float = threshold_ms
+        self.__log: logging.Logger = log or logging.getLogger('mynotes.slow_query')
+
+    def __call__(self, sql: str, parameters: Any, duration: float, rows: int) -> None:
+        duration_ms: float = duration * 1000
+        if duration_ms < self.threshold_ms:
+            return
+        self.__log.warning('slow query (%.1f ms, %d rows, parameters %s): %s', duration_ms, rows,
+                           self.parameter_shape(parameters), re.sub(r'\s+', ' ', sql).strip())
+
+    @staticmethod
+    def parameter_shape(parameters: Any) -> str:
+        """
+        Describe parameters without their values, e.g. (int, str) or 25 x (str, int)
+        :param parameters: Parameters of execute or executemany
+        :return: Description
+        """
+        if not parameters:
+            return '()'
+        if isinstance(parameters, (list, tuple)) and isinstance(parameters[0], (list, tuple)):
+            return f'{len(parameters)} x {SlowQueryLog.parameter_shape(parameters[0])}'
+        if isinstance(parameters, dict):
+            return '{' + ', '.join(f'{key}: {type(value).__name__}' for key, value in parameters.items()) + '}'
+        return '(' + ', '.join(type(value).__name__ for value in parameters) + ')'
+
+
+class RequestProfiler:
+    def __init__(self, mode: str = 'off', output_dir: str = 'profiles') -> None:
+        """
+        Profile requests with cProfile and dump one stats file per request (readable with pstats, snakeviz
+        or flameprof). Only one request is profiled at a time, concurrent requests are not profiled.
+        :param mode: 'off', 'request' (only requests with ?profile=1) or 'all'
+        :param output_dir: Directory for the .prof files
+        """
+        if mode not in ('off', 'request', 'all'):
+            raise ValueError('Profiling mode must be off, request or all')
+
+        self.mode: str = mode
+        self.__output_dir: str = output_dir
+        self.__lock: threading.Lock = threading.Lock()
+        self.__local: threading.local = threading.local()
+
+    def start(self, requested: bool) -> None:
+        """
+        Start profiling the request on the current thread if profiling is enabled for it
+        :param requested: The request asked to be profiled (?profile=1)
+        """
+        if self.mode == 'off' or (self.mode == 'request' and not requested):
+            return
+        if not self.__lock.acquire(blocking=False):
+            return
+
+        profile: cProfile.Profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # another profiler is active in this process
+            self.__lock.release()
+            return
+        self.__local.profile = profile
+
+    def stop(self, endpoint: str) -> str | None:
+        """
+        Stop profiling the request on the current thread and write the stats file
+        :param endpoint: Endpoint of the request, used in the file name
+        :return: Path of the stats file or None if the request was not profiled
+        """
+        profile: cProfile.Profile | None = getattr(self.__local, 'profile', None)
+        if profile is None:
+            return None
+
+        self.__local.profile = None
+        try:
+            profile.disable()
+            os.makedirs(self.__output_dir, exist_ok=True)
+            name: str = re.sub(r'[^A-Za-z0-9_]+', '_', endpoint).strip('_') or 'root'
+            path: str = os.path.join(self.__output_dir, f'{name}-{time.time_ns()}.prof')
+            profile.dump_stats(path)
+            logger.info('wrote profile of %s to %s', endpoint, path)
+            return path
+        finally:
+            self.__lock.release()
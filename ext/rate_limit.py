@@ -0,0 +1,194 @@
+import math
+import threading
+import time
+from typing import *
+
+from ext.connection_pool import ConnectionPool
+
+
+def _window_state(window_index: int, current: int, previous: int, now_index: int) -> Tuple[int, int]:
+    """
+    Move the counters of a key to the current window
+    :return: Count of the current and of the previous window
+    """
+    if window_index == now_index:
+        return current, previous
+    if window_index == now_index - 1:
+        return 0, current
+    return 0, 0
+
+
+def _retry_after(current: int, previous: int, limit: int, window: float, now: float) -> float:
+    """
+    Sliding window counter: the previous window counts with the part of it that still overlaps the last
+    `window` seconds. Returns 0 if one more request is allowed, otherwise seconds until it is.
+    """
+    elapsed: float = (now % window) / window
+    if previous * (1 - elapsed) + current < limit:
+        return 0.0
+    if current >= limit or previous == 0:
+        return window - now % window
+    # the weight of the previous window has to drop until the estimate is below the limit
+    allowed_elapsed: float = 1 - (limit - current) / previous
+    return max(0.0, (allowed_elapsed - elapsed) * window) + 0.001
+
+
+class MemoryRateLimitStore:
+    def __init__(self, max_keys: int = 100000, eviction_interval: float = 60.0) -> None:
+        """
+        Sliding window counters of one process, O(1) per request.
+        Keys whose windows are over are evicted periodically.
+        :param max_keys: Maximum number of tracked keys, the oldest ones are dropped first
+        :param eviction_interval: Seconds between two evictions
+        """
+        self.__max_keys: int = max_keys
+        self.__eviction_interval: float = eviction_interval
+        # key -> [window index, current count, previous count, expires at]
+        self.__counters: Dict[str, List] = {}
+        self.__lock: threading.Lock = threading.Lock()
+        self.__next_eviction: float = 0.0
+
+    def hit(self, key: str, limit: int, window: float, now: float | None = None) -> float:
+        """
+        Count a request if it is allowed
+        :param key: Key to limit, e.g. user:name
+        :param limit: Maximum requests per window
+        :param window: Window in seconds
+        :param now: Current time (for tests)
+        :return: 0 if the request is allowed, otherwise seconds until it would be
+        """
+        now = time.time() if now is None else now
+        now_index: int = int(now // window)
+        with self.__lock:
+            if now >= self.__next_eviction:
+                self.__evict(now)
+
+            counter: List | None = self.__counters.get(key)
+            current, previous = _window_state(counter[0], counter[1], counter[2], now_index) if counter else (0, 0)
+            retry_after: float = _retry_after(current, previous, limit, window, now)
+            if retry_after > 0:
+                return retry_after
+
+            if counter is None:
+                if len(self.__counters) >= self.__max_keys:
+                    self.__evict(now)
+                    if len(self.__counters) >= self.__max_keys:
+                        del self.__counters[next(iter(self.__counters))]
+                self.__counters[key] = [now_index, current + 1, previous, (now_index + 2) * window]
+            else:
+                counter[0], counter[1], counter[2], counter[3] = (now_index, current + 1, previous,
+                                                                  (now_index + 2) * window)
+            return 0.0
+
+    def __evict(self, now: float) -> None:
+        self.__next_eviction = now + self.__eviction_interval
+        expired: List[str] = [key for key, counter in self.__counters.items() if counter[3] <= now]
+        for key in expired:
+            del self.__counters[key]
+
+    def __len__(self) -> int:
+        return len(self.__counters)
+
+    def close(self) -> None:
+        pass
+
+
+class SqliteRateLimitStore:
+    def __init__(self, db: str, eviction_interval: float = 60.0) -> None:
+        """
+        Sliding window counters in a sqlite file, shared by all processes which open the same file
+        :param db: Path to the database file (should not be the main database)
+        :param eviction_interval: Seconds between two evictions
+        """
+        # the counters are only written, and losing the last ones on a power failure is harmless,
+        # so commits don't wait for an fsync
+        self.__pool: ConnectionPool = ConnectionPool(db, size=1, synchronous='NORMAL')
+        self.__eviction_interval: float = eviction_interval
+        self.__next_eviction: float = 0.0
+
+        with self.__pool.write() as cursor:
+            cursor.execute("""CREATE TABLE IF NOT EXISTS rate_limits (
+                key TEXT PRIMARY KEY,
+                window_index INTEGER NOT NULL,
+                current INTEGER NOT NULL,
+                previous INTEGER NOT NULL,
+                expires_at REAL NOT NULL
+            )""")
+
+    def hit(self, key: str, limit: int, window: float, now: float | None = None) -> float:
+        """
+        Count a request if it is allowed
+        :param key: Key to limit, e.g. user:name
+        :param limit: Maximum requests per window
+        :param window: Window in seconds
+        :param now: Current time (for tests)
+        :return: 0 if the request is allowed, otherwise seconds until it would be
+        """
+        now = time.time() if now is None else now
+        now_index: int = int(now // window)
+        with self.__pool.write() as cursor:
+            # other processes must not change the counter between reading and writing it
+            cursor.execute('BEGIN IMMEDIATE')
+            if now >= self.__next_eviction:
+                self.__next_eviction = now + self.__eviction_interval
+                cursor.execute("""DELETE FROM rate_limits WHERE expires_at <= ?""", (now,))
+
+            cursor.execute("""SELECT window_index, current, previous FROM rate_limits WHERE key = ?""", (key,))
+            row: Tuple | None = cursor.fetchone()
+            current, previous = _window_state(row[0], row[1], row[2], now_index) if row else (0, 0)
+            retry_after: float = _retry_after(current, previous, limit, window, now)
+            if retry_after > 0:
+                return retry_after
+
+            cursor.execute("""INSERT OR REPLACE INTO rate_limits (key, window_index, current, previous, expires_at)
+                VALUES (?, ?, ?, ?, ?)""", (key, now_index, current + 1, previous, (now_index + 2) * window))
+            return 0.0
+
+    def close(self) -> None:
+        self.__pool.close()
+
+
+RateLimitStore = Union[MemoryRateLimitStore, SqliteRateLimitStore]
+
+
+def parse_limit(limit: str) -> Tuple[int, float]:
+    """
+    Parse a limit in the form requests/seconds, e.g. 10/60
+    :param limit: Limit as string
+    :return: Requests and seconds
+    """
+    try:
+        requests, seconds = limit.split('/')
+        return int(requests), float(seconds)
+    except ValueError:
+        raise ValueError(f'Invalid rate limit "{limit}", expected requests/seconds') from None
+
+
+class LoginRateLimiter:
+    def __init__(self, store: RateLimitStore | None = None, per_username: Tuple[int, float] = (10, 60.0),
+                 per_ip: Tuple[int, float] = (100, 60.0)) -> None:
+        """
+        Limits login attempts per username and per client IP
+        :param store: Store of the counters (default: in memory)
+        :param per_username: Attempts per seconds for one username
+        :param per_ip: Attempts per seconds from one IP address
+        """
+        self.store: RateLimitStore = store or MemoryRateLimitStore()
+        self.per_username: Tuple[int, float] = per_username
+        self.per_ip: Tuple[int, float] = per_ip
+
+    def check(self, username: str, ip: str | None) -> int:
+        """
+        Count a login attempt
+        :param username: Username of the attempt
+        :param ip: Client IP address
+        :return: 0 if the attempt is allowed, otherwise seconds (rounded up) the client has to wait
+        """
+        if ip:
+            retry_after: float = self.store.hit(f'ip:{ip}', *self.per_ip)
+            if retry_after > 0:
+                return math.ceil(retry_after)
+        return math.ceil(self.store.hit(f'user:{username}', *self.per_username))
+
+    def close(self) -> None:
+        self.store.close()
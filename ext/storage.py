@@ -0,0 +1,307 @@
+import string
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import *
+
+from ext.connection_pool import QueryObserver
+from ext.token_generator import TokenPool
+
+
+# the row classes use slots: no __dict__ per instance, which matters for subjects with many notes
+@dataclass(slots=True)
+class Note:
+    id: int
+    subject: str
+    note: float  # whole notes are stored and returned as int
+    user_id: int
+    weight: float  # how much the note counts
+    release_date: str  # when teacher gave the note
+    created_at: str  # when the note was inserted into the database
+
+    def to_json(self, fields: Sequence[str] | None = None) -> dict:
+        """
+        Convert the note to a JSON serializable dict. This is still one dict per note, letting orjson encode
+        the slotted notes directly was slower than encoding these dicts.
+        :param fields: Only include these fields (see NOTE_FIELDS), None for all
+        :return: Note as dict
+        """
+        if fields is not None:
+            return {field: getattr(self, field) for field in fields}
+        return {
+            'id': self.id,
+            'subject': self.subject,
+            'note': self.note,
+            'user_id': self.user_id,
+            'weight': self.weight,
+            'release_date': self.release_date,
+            'created_at': self.created_at
+        }
+
+
+NOTE_FIELDS: Tuple[str, ...] = ('id', 'subject', 'note', 'user_id', 'weight', 'release_date', 'created_at')
+
+
+@dataclass(slots=True)
+class NewNote:
+    subject: str
+    note: int
+    release_date: str = ''
+    weight: float = 1.0
+
+
+@dataclass(slots=True)
+class Subject:
+    name: str
+    notes: List[Note]  # empty if only the summary of the subject was loaded
+    gpa: float
+    note_count: int = 0
+
+    def to_json(self) -> dict:
+        return {
+            'name': self.name,
+            'note_count': self.note_count,
+            'gpa': self.gpa
+        }
+
+
+@dataclass(slots=True)
+class TokenPair:
+    access_token: str
+    refresh_token: str
+    expires_at: int  # seconds since epoch
+
+
+@dataclass(slots=True)
+class UserInfo:
+    token_info: TokenPair
+    user_id: int
+
+
+@dataclass(slots=True)
+class LoginCredentials:
+    user_id: int
+    password: str
+    salt: str
+    token_pair: TokenPair
+
+
+class Storage(ABC):
+    """
+    Users, tokens and notes of MyNotes. The server only talks to this interface, so the backend
+    (sqlite in DatabaseManager, dicts in MemoryStorage) can be swapped without touching the views.
+    """
+
+    def __init__(self, string_helper, token_lifetime: int = 10, token_pool_size: int = 0) -> None:
+        """
+        :param string_helper: Generates tokens and expiration times (StringUtils)
+        :param token_lifetime: Seconds an access token is valid
+        :param token_pool_size: Number of pre-generated tokens, 0 generates them on demand
+        """
+        self.__string_helper = string_helper
+        # self.__default_expiration_time: int = 60 * 60 * 24 * 30  # 30 days
+        # 10 seconds for testing purposes (default of token_lifetime)
+        self.__default_expiration_time: int = token_lifetime
+        self.__token_length: int = 32
+        self.__token_chars: str = string.ascii_letters + string.digits + '_!@#'
+        # pre-generated tokens, so registering and refreshing don't generate them on the request path
+        self.__token_pool: TokenPool | None = None
+        if token_pool_size > 0:
+            self.__token_pool = TokenPool(self.__token_length, self.__token_chars, size=token_pool_size)
+
+    def _generate_token(self) -> str:
+        """
+        Get a new random access or refresh token
+        """
+        if self.__token_pool is not None:
+            return self.__token_pool.get()
+        return self.__string_helper.generate_token(self.__token_length, self.__token_chars)
+
+    def _generate_expiration_time(self) -> int:
+        """
+        Get the expiration time of an access token created now
+        """
+        return self.__string_helper.generate_expiration_time(self.__default_expiration_time)
+
+    def close(self) -> None:
+        """
+        Release the resources of the backend and stop refilling the token pool
+        """
+        token_pool: TokenPool | None = getattr(self, '_Storage__token_pool', None)
+        if token_pool is not None:
+            token_pool.close()
+
+    def add_query_observer(self, observer: QueryObserver) -> None:
+        """
+        Report every executed query to an observer, backends without queries ignore it
+        :param observer: Called with statement, parameters, duration in seconds and row count
+        """
+
+    def remove_query_observer(self, observer: QueryObserver) -> None:
+        """
+        Stop reporting queries to an observer
+        :param observer: Observer passed to add_query_observer
+        """
+
+    # tokens
+
+    @abstractmethod
+    def get_refresh_token_by_user_id(self, user_id: int) -> str:
+        """
+        Get a refresh token by user ID
+        :param user_id: User ID
+        :return: Refresh token
+        """
+
+    @abstractmethod
+    def refresh_access_token(self, user_id: int) -> TokenPair:
+        """
+        Replace the access token of a user, the refresh token stays the same
+        :param user_id: User ID
+        :return: Token pair with the new access token and an empty refresh token
+        """
+
+    @abstractmethod
+    def get_token_pair_if_user_exists(self, user_id: int) -> TokenPair | None:
+        """
+        Get the token pair of a user, used to authenticate requests
+        :param user_id: User ID
+        :return: Token pair or None if the user does not exist
+        """
+
+    # users
+
+    @abstractmethod
+    def user_id_exists(self, user_id: int) -> bool:
+        """
+        Check if a user ID exists
+        :param user_id: User ID
+        :return: True if exists, False otherwise
+        """
+
+    @abstractmethod
+    def username_exists(self, username: str) -> bool:
+        """
+        Check if a username exists
+        :param username: Username to check in plain text
+        :return: True if username exists, False otherwise
+        """
+
+    @abstractmethod
+    def get_login_credentials(self, username: str) -> LoginCredentials | None:
+        """
+        Get everything a login needs (user ID, password hash, salt and tokens) at once
+        :param username: Username in plain text
+        :return: LoginCredentials object or None if the user does not exist
+        """
+
+    @abstractmethod
+    def add_user(self, username: str, password: str, salt: str = '') -> UserInfo:
+        """
+        Add a user together with its first token pair
+        :param username: Plain text username
+        :param password: Hashed password
+        :param salt: Salt for the password (only used by old sha512 hashes, new hashes contain their salt)
+        :return: UserInfo object
+        :raises ValueError: If the username already exists
+        """
+
+    @abstractmethod
+    def update_password(self, user_id: int, password: str) -> None:
+        """
+        Replace the password hash of a user, e.g. when an old hash is upgraded
+        :param user_id: User ID
+        :param password: New password hash (contains its own salt)
+        """
+
+    # notes
+
+    @abstractmethod
+    def delete_note_by_id(self, user_id: int, note_id: int) -> None:
+        """
+        Delete a note by ID
+        :param user_id: User ID
+        :param note_id: Note ID
+        """
+
+    @abstractmethod
+    def get_note_by_id(self, user_id: int, note_id: int) -> Note | None:
+        """
+        Get note information
+        :param user_id: User ID
+        :param note_id: Note ID
+        :return: Note object or None if the user has no note with this ID
+        """
+
+    @abstractmethod
+    def add_note(self, subject: str, note: int, user_id: int, release_date: str = '', weight: float = 1.0) -> int:
+        """
+        Add a note
+        :param subject: Subject
+        :param note: Note
+        :param user_id: User ID
+        :param release_date: Release date
+        :param weight: Weight of the note (how much it counts)
+        :return: Note ID
+        """
+
+    @abstractmethod
+    def add_notes(self, user_id: int, notes: List[NewNote]) -> List[int]:
+        """
+        Add several notes at once, either all of them or none
+        :param user_id: User ID
+        :param notes: Notes to add
+        :return: Note IDs in the same order as the notes
+        """
+
+    @abstractmethod
+    def get_subject(self, user_id: int, subject: str, after: int = 0, limit: int | None = None) -> Subject:
+        """
+        Get a subject, optionally only one page of its notes (ordered by note ID).
+        The GPA and note count always cover all notes of the subject.
+        :param user_id: User ID
+        :param subject: Subject name
+        :param after: Only return notes with an ID greater than this
+        :param limit: Maximum number of notes to return, None for all
+        :return: Subject object
+        :raises ValueError: If the user has no notes in the subject
+        """
+
+    @abstractmethod
+    def iter_notes(self, user_id: int, batch_size: int = 500) -> Iterator[Note]:
+        """
+        Iterate over all notes of a user, ordered by subject and ID
+        :param user_id: User ID
+        :param batch_size: Number of notes loaded at once
+        :return: Iterator of notes
+        """
+
+    @abstractmethod
+    def get_all_subjects(self, user_id: int) -> List[Subject]:
+        """
+        Get the summary (note count and GPA) of all subjects of a user ordered by name, the notes are not loaded
+        :param user_id: User ID
+        :return: List of subjects
+        """
+
+    # maintenance, only needed by backends which keep garbage around
+
+    def delete_orphaned_tokens(self, limit: int = 500) -> int:
+        """
+        Delete tokens whose user does not exist anymore, at most limit per call
+        :param limit: Maximum number of deleted tokens
+        :return: Number of deleted tokens
+        """
+        return 0
+
+    def optimize(self) -> None:
+        """
+        Update the statistics of the query planner
+        """
+
+    def incremental_vacuum(self, pages: int = 1000) -> int:
+        """
+        Give free pages back to the file system
+        :param pages: Maximum number of pages to free
+        :return: Number of freed pages
+        """
+        return 0
@@ -0,0 +1,117 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import *
+
+
+@dataclass
+class CacheStats:
+    hits: int
+    misses: int
+    evictions: int
+    size: int
+
+    @property
+    def hit_rate(self) -> float:
+        total: int = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class TokenCache:
+    def __init__(self, max_size: int = 10000, max_ttl: float = 60.0, clock: Callable[[], float] = time.time) -> None:
+        """
+        Bounded LRU cache for authenticated access tokens. An entry lives until the token expires,
+        but never longer than max_ttl seconds (so other processes refreshing a token are picked up).
+        :param max_size: Maximum number of cached tokens
+        :param max_ttl: Maximum seconds an entry is kept
+        :param clock: Current time in seconds since epoch (replaced in tests)
+        """
+        if max_size < 1:
+            raise ValueError('Cache size must be at least 1')
+
+        self.__max_size: int = max_size
+        self.__max_ttl: float = max_ttl
+        self.__clock: Callable[[], float] = clock
+        # (user_id, access_token) -> (deadline, value)
+        self.__entries: OrderedDict[Tuple[int, str], Tuple[float, Any]] = OrderedDict()
+        self.__keys_by_user: Dict[int, Set[Tuple[int, str]]] = {}
+        self.__lock: threading.Lock = threading.Lock()
+
+        self.__hits: int = 0
+        self.__misses: int = 0
+        self.__evictions: int = 0
+
+    def get(self, user_id: int, access_token: str) -> Any | None:
+        """
+        Get a cached value
+        :param user_id: User ID
+        :param access_token: Access token
+        :return: Cached value or None if not cached or expired
+        """
+        key: Tuple[int, str] = (user_id, access_token)
+        with self.__lock:
+            entry: Tuple[float, Any] | None = self.__entries.get(key)
+            if entry is None:
+                self.__misses += 1
+                return None
+
+            if self.__clock() >= entry[0]:
+                self.__remove(key)
+                self.__misses += 1
+                return None
+
+            self.__entries.move_to_end(key)
+            self.__hits += 1
+            return entry[1]
+
+    def put(self, user_id: int, access_token: str, value: Any, expires_at: float) -> None:
+        """
+        Cache a value
+        :param user_id: User ID
+        :param access_token: Access token
+        :param value: Value to cache
+        :param expires_at: Timestamp (seconds since epoch) when the token expires
+        """
+        deadline: float = min(float(expires_at), self.__clock() + self.__max_ttl)
+        key: Tuple[int, str] = (user_id, access_token)
+        with self.__lock:
+            self.__entries[key] = (deadline, value)
+            self.__entries.move_to_end(key)
+            self.__keys_by_user.setdefault(user_id, set()).add(key)
+
+            while len(self.__entries) > self.__max_size:
+                oldest: Tuple[int, str] = next(iter(self.__entries))
+                self.__remove(oldest)
+                self.__evictions += 1
+
+    def invalidate_user(self, user_id: int) -> None:
+        """
+        Remove all cached tokens of a user
+        :param user_id: User ID
+        """
+        with self.__lock:
+            for key in list(self.__keys_by_user.get(user_id, ())):
+                self.__remove(key)
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__entries.clear()
+            self.__keys_by_user.clear()
+
+    def stats(self) -> CacheStats:
+        with self.__lock:
+            return CacheStats(hits=self.__hits, misses=self.__misses, evictions=self.__evictions,
+                              size=len(self.__entries))
+
+    def __remove(self, key: Tuple[int, str]) -> None:
+        """
+        Remove an entry, the lock must be held
+        :param key: Cache key
+        """
+        self.__entries.pop(key, None)
+        keys: Set[Tuple[int, str]] | None = self.__keys_by_user.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.__keys_by_user[key[0]]
@@ -0,0 +1,138 @@
+import collections
+import os
+import threading
+from typing import *
+
+# bytes of randomness drawn per os.urandom call while building tokens
+_chunk_size: int = 4096
+_tables: Dict[str, Tuple[bytes, bytes, float]] = {}
+
+
+def _translation(chars: str) -> Tuple[bytes, bytes, float]:
+    """
+    Translation table which maps random bytes to characters without modulo bias.
+    Bytes above the largest multiple of len(chars) are dropped (rejection sampling).
+    :param chars: Characters of the token (ASCII, at most 256)
+    :return: Table, bytes to drop and the share of bytes which are kept
+    """
+    table: Tuple[bytes, bytes, float] | None = _tables.get(chars)
+    if table is not None:
+        return table
+
+    if not chars or len(chars) > 256 or not chars.isascii():
+        raise ValueError('Token characters must be 1 to 256 ASCII characters')
+
+    alphabet: bytes = chars.encode()
+    limit: int = 256 - 256 % len(alphabet)
+    table = (bytes(alphabet[i % len(alphabet)] for i in range(256)), bytes(range(limit, 256)), limit / 256)
+    _tables[chars] = table
+    return table
+
+
+def generate_token(length: int, chars: str) -> str:
+    """
+    Generate a cryptographically secure random token (os.urandom), encoded in bulk instead of char by char
+    :param length: Length of the token
+    :param chars: Characters to use for the token
+    :return: Random token
+    """
+    table, drop, kept = _translation(chars)
+    token: bytes = b''
+    while len(token) < length:
+        # draw a bit more than needed so one call is enough most of the time
+        missing: int = length - len(token)
+        token += os.urandom(int(missing / kept) + 8).translate(table, drop)
+    return token[:length].decode()
+
+
+def generate_tokens(count: int, length: int, chars: str) -> List[str]:
+    """
+    Generate many tokens at once, one os.urandom call per 4 KiB of randomness
+    :param count: Number of tokens
+    :param length: Length of every token
+    :param chars: Characters to use for the tokens
+    :return: Random tokens
+    """
+    table, drop, kept = _translation(chars)
+    needed: int = count * length
+    buffer: bytearray = bytearray()
+    while len(buffer) < needed:
+        buffer += os.urandom(max(_chunk_size, int((needed - len(buffer)) / kept) + 8)).translate(table, drop)
+    text: str = buffer[:needed].decode()
+    return [text[i:i + length] for i in range(0, needed, length)]
+
+
+class TokenPool:
+    def __init__(self, length: int, chars: str, size: int = 1024) -> None:
+        """
+        Pre-generated tokens which are refilled by a background thread, so taking one costs no generation.
+        If the pool runs empty a token is generated on the spot. Tokens are never handed out twice and
+        a forked process never uses the tokens of its parent.
+        :param length: Length of the tokens
+        :param chars: Characters to use for the tokens
+        :param size: Number of tokens kept in the pool
+        """
+        if size < 1:
+            raise ValueError('Token pool size must be at least 1')
+
+        self.length: int = length
+        self.chars: str = chars
+        self.size: int = size
+        self.__low_water: int = max(1, size // 4)
+        self.__tokens: Deque[str] = collections.deque()
+        self.__refill: threading.Event = threading.Event()
+        self.__lock: threading.Lock = threading.Lock()
+        self.__closed: bool = False
+        self.__pid: int = -1
+        self.__thread: threading.Thread | None = None
+
+        _translation(chars)  # fail early on invalid characters
+        self.__start()
+
+    def __start(self) -> None:
+        with self.__lock:
+            if self.__pid == os.getpid() or self.__closed:
+                return
+            # after a fork the pooled tokens are shared with the parent and the refill thread is gone
+            self.__tokens.clear()
+            self.__pid = os.getpid()
+            self.__refill.set()
+            self.__thread = threading.Thread(target=self.__run, name='token-pool', daemon=True)
+            self.__thread.start()
+
+    def __run(self) -> None:
+        pid: int = os.getpid()
+        while True:
+            self.__refill.wait()
+            self.__refill.clear()
+            if self.__closed or pid != self.__pid:
+                return
+            missing: int = self.size - len(self.__tokens)
+            if missing > 0:
+                self.__tokens.extend(generate_tokens(missing, self.length, self.chars))
+
+    def get(self) -> str:
+        """
+        Take a token from the pool
+        :return: Random token
+        """
+        if self.__pid != os.getpid():
+            self.__start()
+        try:
+            token: str = self.__tokens.popleft()
+        except IndexError:
+            token = generate_token(self.length, self.chars)
+        if len(self.__tokens) < self.__low_water:
+            self.__refill.set()
+        return token
+
+    def __len__(self) -> int:
+        return len(self.__tokens)
+
+    def close(self) -> None:
+        """
+        Stop the refill thread and drop the pooled tokens
+        """
+        self.__closed = True
+        self.__refill.set()
+        self.__tokens.clear()
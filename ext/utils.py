@@ -1,4 +1,3 @@
-import random
 import string
 import time
 from typing import *
@@ -6,7 +5,9 @@ from dataclasses import dataclass
 import hashlib
 import base64
 
-from ext.database_manager import DatabaseManager
+from ext.storage import Storage, TokenPair
+from ext.token_cache import TokenCache
+from ext.token_generator import generate_token
 
 max_username_length = 20
 min_username_length = 4
@@ -14,6 +15,9 @@ min_username_length = 4
 max_password_length = 20
 min_password_length = 8
 
+max_notes_per_request = 500
+max_notes_per_page = 1000
+
 allowed_chars = string.ascii_letters + string.digits + '_!@#'
 
 
@@ -28,15 +32,6 @@ class Hasher:
     def equal_hashes(h1: str, h2: str) -> bool:
         return h1 == h2
 
-    @staticmethod
-    def generate_salt(salt_length: int = 32) -> str:
-        """
-        Generate a salt
-        :param salt_length: Length of the salt
-        :return: Salt as string
-        """
-        return ''.join(random.choice(allowed_chars) for _ in range(salt_length))
-
 
 class InvalidArgumentException(Exception):
     def __init__(self, message) -> None:
@@ -138,22 +133,20 @@ class StringUtils:
         return hasher.hash(password + salt)
 
     @staticmethod
-    def validate_password(password: str, hasher: Hasher, salt: str) -> CheckedParameter:
+    def validate_password(password: str, hasher: Hasher) -> CheckedParameter:
         """
         Check if a password is valid
         :param password: Password as string (base64 encoded)
         :param hasher: Hasher instance to hash the password
-        :param salt: Salt to add to the hashed password
-        :return: True if valid, False otherwise
+        :return: True if valid, False otherwise. The parameter is the hashed password, as sent to /login
         """
         # make password to plain text
         password = base64.b64decode(password).decode()
         hashed_password: str = StringUtils.hash_password(password, hasher)
-        hashed_salted_password: str = StringUtils.add_salt_to_hashed_password(hashed_password, hasher, salt)
 
         result: CheckedParameter = CheckedParameter(valid=False,
                                                     message='',
-                                                    parameter=hashed_salted_password)
+                                                    parameter=hashed_password)
 
         if StringUtils.__matches_length(password, min_password_length, max_password_length):
             print(password)
@@ -172,74 +165,58 @@ class StringUtils:
     @staticmethod
     def generate_token(length: int, token_chars: str) -> str:
         """
-        Generate a random token
+        Generate a cryptographically secure random token
         :param length: Length of the token
         :param token_chars: Characters to use for the token
         :return: Random token
         """
-        return ''.join(random.choice(token_chars) for _ in range(length))
+        return generate_token(length, token_chars)
 
     # generate timestamp for when the token expires
     @staticmethod
-    def generate_expiration_time(duration: int) -> str:
+    def generate_expiration_time(duration: int) -> int:
         """
         Generate a timestamp for when the token expires
-        :return: Timestamp
+        :return: Timestamp in seconds since epoch
         """
-        return str(int(time.time()) + duration)
+        return int(time.time()) + duration
 
     @staticmethod
-    def is_after_expiration_time(expires_at: str) -> bool:
+    def is_after_expiration_time(expires_at: int) -> bool:
         """
         Check if a token is expired
-        :param expires_at: Timestamp when the token expires
+        :param expires_at: Timestamp in seconds since epoch when the token expires
         :return: True if expired, False otherwise
         """
-        return int(time.time()) > int(expires_at)
-
+        return int(time.time()) > expires_at
 
-class LoginUtils:
-    def __init__(self, db: DatabaseManager, hasher: Hasher) -> None:
-        self.__db: DatabaseManager = db
-        self.__hasher: Hasher = hasher
 
-    def username_exists(self, username: str) -> bool:
-        """
-        Check if a username exists
-        :param username: Username to check in plain text
-        :return: True if exists, False otherwise
-        """
-        return self.__db.username_exists(username)
-
-    def get_user_id(self, username: str) -> int:
-        """
-        Get a user ID
-        :param username: Username in plain text
-        :return: User ID
-        """
-        return self.__db.get_user_id(username)
-
-    def get_user_password(self, user_id: int) -> str:
-        """
-        Get a user password
-        :param user_id: User ID
-        :return: User password
-        """
-        return self.__db.get_user_password(user_id)
+@dataclass
+class Principal:
+    user_id: int
+    access_token: str
+    expires_at: int
 
 
 class AuthHelper:
-    def __init__(self, db: DatabaseManager) -> None:
-        self.__db: DatabaseManager = db
+    def __init__(self, db: Storage, token_cache: TokenCache | None = None) -> None:
+        self.__db: Storage = db
+        self.__token_cache: TokenCache | None = token_cache
+
+    @property
+    def token_cache(self) -> TokenCache | None:
+        return self.__token_cache
 
-    def access_token_expired(self, user_id: int) -> bool:
+    def refresh_access_token(self, user_id: int) -> TokenPair:
         """
-        Check if the access token is expired
+        Refresh the access token of a user and drop the old one from the token cache
         :param user_id: User ID
-        :return: True if expired, False otherwise
+        :return: Token pair
         """
-        expires_at: str = self.__db.get_expiration_time(user_id)
-        return StringUtils.is_after_expiration_time(expires_at)
+        token_pair: TokenPair = self.__db.refresh_access_token(user_id)
+        if self.__token_cache is not None:
+            self.__token_cache.invalidate_user(user_id)
+        return token_pair
 
     def correct_api_credentials_refresh(self, user_id: str, refresh_token: str) -> Tuple[bool, str]:
         """
@@ -265,26 +242,38 @@ class AuthHelper:
             return False, 'Refresh token is invalid'
         return True, ''
 
-    def correct_api_credentials(self, user_id: str, access_token: str) -> Tuple[bool, str]:
+    def authenticate(self, user_id: str, access_token: str) -> Principal:
         """
-        Check if the API credentials are correct
+        Check user ID, access token and expiration time with a single database query
         :param user_id: User ID casted to string
         :param access_token: Access token
-        :return: True if correct, False otherwise
+        :return: Principal of the authenticated user
+        :raises InvalidArgumentException: If the credentials are wrong or the token expired
         """
-
         if StringUtils.is_empty(user_id):
-            return False, 'User ID is empty'
+            raise InvalidArgumentException('User ID is empty')
 
         if StringUtils.is_empty(access_token):
-            return False, 'Access token is empty'
+            raise InvalidArgumentException('Access token is empty')
 
         user_id: int = int(user_id)
 
-        if not self.__db.user_id_exists(user_id):
-            return False, 'Invalid User ID'
+        if self.__token_cache is not None:
+            principal: Principal | None = self.__token_cache.get(user_id, access_token)
+            if principal is not None:
+                return principal
 
-        db_access_token: str = self.__db.get_access_token_by_user_id(user_id)
-        if not access_token == db_access_token:
-            return False, 'Access token is invalid'
-        return True, ''
+        token_pair: TokenPair | None = self.__db.get_token_pair_if_user_exists(user_id)
+        if token_pair is None:
+            raise InvalidArgumentException('Invalid User ID')
+
+        if not access_token == token_pair.access_token:
+            raise InvalidArgumentException('Access token is invalid')
+
+        if StringUtils.is_after_expiration_time(token_pair.expires_at):
+            raise InvalidArgumentException('Access token expired')
+
+        principal: Principal = Principal(user_id=user_id, access_token=access_token, expires_at=token_pair.expires_at)
+        if self.__token_cache is not None:
+            self.__token_cache.put(user_id, access_token, principal, expires_at=token_pair.expires_at)
+        return principal
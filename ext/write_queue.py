@@ -0,0 +1,114 @@
+import queue
+import sqlite3 as sqlite
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import *
+
+from ext.connection_pool import ConnectionPool
+
+T = TypeVar('T')
+
+
+@dataclass
+class _Job:
+    work: Callable[[sqlite.Cursor], Any]
+    future: Future = field(default_factory=Future)
+
+
+class GroupCommitQueue:
+    def __init__(self, pool: ConnectionPool, max_batch: int = 64, max_delay: float = 0.0) -> None:
+        """
+        Runs writes on a single writer thread and commits them in groups, so a burst of small writes shares
+        one commit instead of paying for one each. Every write runs in its own savepoint, a failing write
+        is rolled back alone and its caller gets the exception.
+        :param pool: Connection pool of the database
+        :param max_batch: Maximum writes per commit
+        :param max_delay: Seconds the writer waits for more writes before committing. With 0 it commits as soon
+            as it is free, writes which arrive during a commit form the next group (fastest in the benchmark)
+        """
+        if max_batch < 1:
+            raise ValueError('Batch size must be at least 1')
+
+        self.__pool: ConnectionPool = pool
+        self.__max_batch: int = max_batch
+        self.__max_delay: float = max_delay
+        self.__queue: queue.SimpleQueue = queue.SimpleQueue()
+        self.__closed: bool = False
+        self.__thread: threading.Thread = threading.Thread(target=self.__run, name='group-commit', daemon=True)
+        self.__thread.start()
+
+    def submit(self, work: Callable[[sqlite.Cursor], T]) -> T:
+        """
+        Run a write and wait until it is committed
+        :param work: Gets a cursor inside the transaction, must not commit or begin transactions itself
+        :return: Return value of work
+        """
+        if self.__closed:
+            raise RuntimeError('Write queue is closed')
+        job: _Job = _Job(work)
+        self.__queue.put(job)
+        return job.future.result()
+
+    def __run(self) -> None:
+        while True:
+            job: _Job | None = self.__queue.get()
+            if job is None:
+                return
+
+            batch: List[_Job] = [job]
+            deadline: float = time.monotonic() + self.__max_delay
+            stop: bool = False
+            while len(batch) < self.__max_batch:
+                try:
+                    job = self.__queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if job is None:
+                    stop = True
+                    break
+                batch.append(job)
+
+            self.__commit(batch)
+            if stop:
+                return
+
+    def __commit(self, batch: List[_Job]) -> None:
+        results: List[Tuple[_Job, Any, BaseException | None]] = []
+        try:
+            with self.__pool.write() as cursor:
+                cursor.execute('BEGIN IMMEDIATE')
+                for job in batch:
+                    cursor.execute('SAVEPOINT job')
+                    try:
+                        result: Any = job.work(cursor)
+                    except Exception as e:
+                        cursor.execute('ROLLBACK TO job')
+                        cursor.execute('RELEASE job')
+                        results.append((job, None, e))
+                    else:
+                        cursor.execute('RELEASE job')
+                        results.append((job, result, None))
+        except BaseException as e:
+            # the commit itself failed, nothing of the batch was written
+            for job in batch:
+                job.future.set_exception(e)
+            return
+
+        for job, result, error in results:
+            if error is None:
+                job.future.set_result(result)
+            else:
+                job.future.set_exception(error)
+
+    def close(self) -> None:
+        """
+        Commit the queued writes and stop the writer thread
+        """
+        if self.__closed:
+            return
+        self.__closed = True
+        self.__queue.put(None)
+        if self.__thread is not threading.current_thread():
+            self.__thread.join()
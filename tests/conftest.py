@@ -0,0 +1,49 @@
+import base64
+import os
+from typing import *
+
+import pytest
+
+from ext.database_manager import DatabaseManager
+from ext.flask_server import FlaskServer
+from ext.utils import StringUtils
+
+
+@pytest.fixture
+def db_path(tmp_path) -> str:
+    return os.path.join(str(tmp_path), 'MyNotes')
+
+
+@pytest.fixture
+def database(db_path: str) -> Iterator[DatabaseManager]:
+    db: DatabaseManager = DatabaseManager(StringUtils, db=db_path, pool_size=8, token_lifetime=3600)
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def server(db_path: str) -> Iterator[FlaskServer]:
+    # no background threads or processes, the tokens stay valid for the whole test
+    flask_server: FlaskServer = FlaskServer(db=db_path, metrics=False, token_lifetime=3600, token_pool_size=0,
+                                            hash_workers=0, password_hash='pbkdf2-sha256:i=1000', login_limit='off',
+                                            maintenance_interval=0)
+    yield flask_server
+    flask_server.context.db.close()
+
+
+@pytest.fixture
+def register(server: FlaskServer) -> Callable[[str], dict]:
+    """
+    Register a user through /register
+    :return: Function which takes the username and returns user_id and access_token of the new user
+    """
+    client = server.app.test_client()
+
+    def register_user(username: str, password: str = 'password1') -> dict:
+        response: dict = client.post('/register', json={'username': username,
+                                                        'password': base64.b64encode(password.encode()).decode()}
+                                     ).get_json()
+        assert not response['error'], response
+        return {'user_id': response['user_id'], 'access_token': response['access_token']}
+
+    return register_user
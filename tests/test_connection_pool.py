@@ -0,0 +1,118 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import *
+
+from ext.connection_pool import ConnectionPool
+from ext.database_manager import DatabaseManager
+from ext.flask_server import FlaskServer
+from ext.storage import Subject
+
+THREADS: int = 16
+NOTES_PER_THREAD: int = 25
+
+
+def test_concurrent_add_note_and_get_subject(database: DatabaseManager) -> None:
+    user_ids: List[int] = [database.add_user(f'user{i}', 'password').user_id for i in range(THREADS)]
+    added: Dict[int, List[int]] = {user_id: [] for user_id in user_ids}
+    barrier: threading.Barrier = threading.Barrier(THREADS)
+
+    def writer(user_id: int) -> None:
+        barrier.wait()
+        for i in range(NOTES_PER_THREAD):
+            added[user_id].append(database.add_note('math', i % 6 + 1, user_id, weight=1.0))
+            subject: Subject = database.get_subject(user_id, 'math')
+            # only this thread writes notes of this user, so it has to see all of them and nothing else
+            assert [note.id for note in subject.notes] == added[user_id]
+            assert subject.note_count == i + 1
+            assert all(note.user_id == user_id and note.subject == 'math' for note in subject.notes)
+            expected_gpa: float = sum(note.note for note in subject.notes) / len(subject.notes)
+            assert abs(subject.gpa - expected_gpa) < 1e-9
+
+    def reader(user_id: int) -> None:
+        # reads notes of a user while another thread adds them
+        barrier.wait()
+        for _ in range(NOTES_PER_THREAD):
+            try:
+                subject: Subject = database.get_subject(user_id, 'math')
+            except ValueError:
+                continue  # no note added yet
+            ids: List[int] = [note.id for note in subject.notes]
+            assert ids == sorted(ids)
+            assert all(note.user_id == user_id for note in subject.notes)
+
+    with ThreadPoolExecutor(max_workers=THREADS * 2) as executor:
+        futures = [executor.submit(writer, user_id) for user_id in user_ids]
+        futures += [executor.submit(reader, user_id) for user_id in user_ids]
+        for future in futures:
+            future.result()
+
+    for user_id in user_ids:
+        assert [note.id for note in database.get_subject(user_id, 'math').notes] == added[user_id]
+    all_ids: List[int] = [note_id for ids in added.values() for note_id in ids]
+    assert len(set(all_ids)) == THREADS * NOTES_PER_THREAD
+
+
+def test_concurrent_requests(server: FlaskServer, register: Callable[[str], dict]) -> None:
+    users: List[dict] = [register(f'user{i}') for i in range(THREADS)]
+
+    def requests(auth: dict) -> List[int]:
+        # one test client per thread, the app and its connection pool are shared
+        thread_client = server.app.test_client()
+        note_ids: List[int] = []
+        for i in range(NOTES_PER_THREAD):
+            response: dict = thread_client.post('/add_note', json=dict(auth, subject='math', note=i % 6 + 1,
+                                                                       weight=1.0, release_date='2023-01-01')).get_json()
+            assert not response['error'], response
+            note_ids.append(response['note_id'])
+
+            response = thread_client.post('/get_subject', json=dict(auth, subject='math')).get_json()
+            assert not response['error'], response
+            assert [note['id'] for note in response['notes']] == note_ids
+            assert response['subject']['note_count'] == len(note_ids)
+        return note_ids
+
+    with ThreadPoolExecutor(max_workers=THREADS) as executor:
+        results: List[List[int]] = list(executor.map(requests, users))
+
+    all_ids: List[int] = [note_id for note_ids in results for note_id in note_ids]
+    assert len(set(all_ids)) == THREADS * NOTES_PER_THREAD
+
+
+def test_waiting_writers_leave_the_read_connections_free(db_path: str) -> None:
+    pool: ConnectionPool = ConnectionPool(db_path, size=2, timeout=1.0)
+    with pool.write() as cursor:
+        cursor.execute('CREATE TABLE items (id INTEGER PRIMARY KEY)')
+    writing: threading.Event = threading.Event()
+    release: threading.Event = threading.Event()
+
+    def slow_write() -> None:
+        with pool.write() as write_cursor:
+            write_cursor.execute('INSERT INTO items DEFAULT VALUES')
+            writing.set()
+            release.wait()
+
+    def queued_write() -> None:
+        with pool.write() as write_cursor:
+            write_cursor.execute('INSERT INTO items DEFAULT VALUES')
+
+    # one write holds the write lock, two more wait for it
+    threads: List[threading.Thread] = [threading.Thread(target=slow_write)]
+    threads[0].start()
+    writing.wait()
+    threads += [threading.Thread(target=queued_write) for _ in range(2)]
+    for thread in threads[1:]:
+        thread.start()
+    try:
+        for _ in range(2):
+            with pool.read() as cursor:
+                cursor.execute('SELECT COUNT(*) FROM items')
+                assert cursor.fetchone()[0] == 0  # the slow write is not committed yet
+    finally:
+        release.set()
+        for thread in threads:
+            thread.join()
+
+    with pool.read() as cursor:
+        cursor.execute('SELECT COUNT(*) FROM items')
+        assert cursor.fetchone()[0] == 3
+    pool.close()
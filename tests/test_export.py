@@ -0,0 +1,82 @@
+import os
+import sqlite3 as sqlite
+import subprocess
+import sys
+from typing import *
+
+import pytest
+
+from ext.database_manager import DatabaseManager
+from ext.storage import NewNote, Note
+from ext.utils import StringUtils
+
+# measures the peak RSS of a fresh process while it streams the export of a user
+EXPORT_SCRIPT: str = """
+import resource, sys
+from ext.flask_server import FlaskServer
+
+server = FlaskServer(db=sys.argv[1], metrics=False, token_lifetime=3600, token_pool_size=0, hash_workers=0,
+                     login_limit='off', maintenance_interval=0)
+client = server.app.test_client()
+before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+response = client.post('/export', json={'user_id': int(sys.argv[2]), 'access_token': sys.argv[3]}, buffered=False)
+lines = 0
+for chunk in response.response:
+    lines += chunk.count(b'\\n')
+after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(lines, before, after)
+"""
+
+
+@pytest.mark.parametrize('batch_size', [1, 2, 3, 500])
+def test_batches_cover_all_notes(database: DatabaseManager, batch_size: int) -> None:
+    user_id: int = database.add_user('user', 'password').user_id
+    other_id: int = database.add_user('other', 'password').user_id
+    # subjects of different sizes, so batches end inside subjects and at their boundaries
+    database.add_notes(user_id, [NewNote(subject, 3) for subject, count in (('b', 4), ('a', 3), ('', 1), ('c', 2))
+                                 for _ in range(count)])
+    database.add_notes(other_id, [NewNote('a', 3), NewNote('b', 3)])
+
+    notes: List[Note] = list(database.iter_notes(user_id, batch_size=batch_size))
+    keys: List[Tuple[str, int]] = [(note.subject, note.id) for note in notes]
+    assert keys == sorted(keys)
+    assert len(notes) == 10
+    assert all(note.user_id == user_id for note in notes)
+
+
+def test_export_does_not_hold_a_connection(db_path: str) -> None:
+    # one connection only, a running export must not keep it from other requests
+    database: DatabaseManager = DatabaseManager(StringUtils, db=db_path, pool_size=1)
+    try:
+        user_id: int = database.add_user('user', 'password').user_id
+        database.add_notes(user_id, [NewNote('math', 3) for _ in range(10)])
+
+        notes: Iterator[Note] = database.iter_notes(user_id, batch_size=4)
+        next(notes)
+        assert database.get_subject(user_id, 'math').note_count == 10
+        database.add_note('math', 5, user_id)
+        assert len(list(notes)) == 10  # the rest of the first 10, and the new note
+    finally:
+        database.close()
+
+
+def test_export_memory_stays_flat(db_path: str) -> None:
+    notes: int = 1000000
+    database: DatabaseManager = DatabaseManager(StringUtils, db=db_path, pool_size=1, token_lifetime=3600)
+    user = database.add_user('user', 'password')
+    database.close()
+    # inserted from a generator straight into sqlite, so seeding doesn't need much memory either
+    with sqlite.connect(db_path) as connection:
+        connection.executemany("""INSERT INTO notes (subject, note, note_owner, release_date, weight)
+            VALUES (?, ?, ?, '2023-01-01', 1.0)""", ((f'subject{i % 10}', i % 6 + 1, user.user_id)
+                                                    for i in range(notes)))
+    connection.close()
+
+    result: subprocess.CompletedProcess = subprocess.run(
+        [sys.executable, '-c', EXPORT_SCRIPT, db_path, str(user.user_id), user.token_info.access_token],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), check=True)
+    lines, before, after = (int(value) for value in result.stdout.split())
+
+    assert lines == notes
+    # ru_maxrss is in KiB on Linux. The notes as objects would need several hundred MB
+    assert (after - before) / 1024 < 50, f'peak RSS grew by {(after - before) / 1024:.1f} MB'
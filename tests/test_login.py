@@ -0,0 +1,48 @@
+import hashlib
+from typing import *
+
+from ext.flask_server import FlaskServer
+
+
+def test_login_runs_one_sql_statement(server: FlaskServer, register: Callable[[str], dict]) -> None:
+    user: dict = register('student')
+    statements: List[str] = []
+
+    def observer(sql: str, parameters: Any, duration: float, rows: int) -> None:
+        statements.append(sql)
+
+    server.context.db.add_query_observer(observer)
+    try:
+        response: dict = server.app.test_client().post('/login', json={
+            'username': 'student', 'password': hashlib.sha512(b'password1').hexdigest()}).get_json()
+    finally:
+        server.context.db.remove_query_observer(observer)
+
+    assert not response['error'], response
+    assert response['user_id'] == user['user_id']
+    assert response['access_token'] == user['access_token']
+    # user, password hash, salt and tokens come from one join, the token is still valid and the hash current
+    assert len(statements) == 1, statements
+
+
+def test_login_of_unknown_user_hashes_the_password(server: FlaskServer, register: Callable[[str], dict],
+                                                   monkeypatch) -> None:
+    register('student')
+    verified: List[str] = []
+    verify: Callable = server.context.passwords.verify
+
+    def record(password: str, stored: str, legacy_salt: str = '') -> Any:
+        verified.append(stored)
+        return verify(password, stored, legacy_salt=legacy_salt)
+
+    monkeypatch.setattr(server.context.passwords, 'verify', record)
+    client = server.app.test_client()
+    password: str = hashlib.sha512(b'password1').hexdigest()
+    unknown: dict = client.post('/login', json={'username': 'nobody', 'password': password}).get_json()
+    known: dict = client.post('/login', json={'username': 'student', 'password': 'wrong'}).get_json()
+
+    assert unknown['error'] and known['error']
+    assert unknown['error_msg'] == known['error_msg']
+    # the unknown user is checked against a hash of the current scheme, so both answers take as long
+    assert len(verified) == 2
+    assert verified[0].split('$')[1:3] == verified[1].split('$')[1:3]
@@ -0,0 +1,37 @@
+import sqlite3 as sqlite
+
+from ext.database_manager import DatabaseManager
+from ext.maintenance import MaintenanceScheduler
+from ext.storage import NewNote
+from ext.utils import StringUtils
+
+
+def fill_and_delete(database: DatabaseManager, db_path: str, username: str) -> None:
+    user_id: int = database.add_user(username, 'password').user_id
+    database.add_notes(user_id, [NewNote('subject', 1, '2023-01-01', 1.0)] * 5000)
+    with sqlite.connect(db_path) as connection:
+        connection.execute('DELETE FROM notes WHERE note_owner = ?', (user_id,))
+    connection.close()
+
+
+def test_new_database_frees_pages(database: DatabaseManager, db_path: str) -> None:
+    fill_and_delete(database, db_path, 'user')
+    assert MaintenanceScheduler(database, vacuum_pages=10000).run_once()['freed_pages'] > 0
+
+
+def test_old_database_is_converted_once(db_path: str) -> None:
+    # created without auto_vacuum, like the databases of older versions
+    with sqlite.connect(db_path) as connection:
+        connection.execute('PRAGMA auto_vacuum=NONE')
+        connection.execute('CREATE TABLE old (id INTEGER)')
+    connection.close()
+    database: DatabaseManager = DatabaseManager(StringUtils, db=db_path, pool_size=2)
+
+    fill_and_delete(database, db_path, 'before')
+    assert database.incremental_vacuum(10000) == 0
+
+    assert database.enable_incremental_vacuum()
+    assert not database.enable_incremental_vacuum()
+    fill_and_delete(database, db_path, 'after')
+    assert database.incremental_vacuum(10000) > 0
+    database.close()
@@ -0,0 +1,19 @@
+import os
+import signal
+from typing import *
+
+from ext.flask_server import FlaskServer
+
+
+def test_signals_switch_the_metrics(server: FlaskServer) -> None:
+    previous: Dict[int, Any] = {sig: signal.getsignal(sig) for sig in (signal.SIGUSR1, signal.SIGUSR2)}
+    server.handle_metrics_signals()
+    try:
+        os.kill(os.getpid(), signal.SIGUSR1)
+        assert server.context.metrics.enabled
+        assert b'mynotes_metrics_enabled 1' in server.app.test_client().get('/metrics').data
+        os.kill(os.getpid(), signal.SIGUSR2)
+        assert not server.context.metrics.enabled
+    finally:
+        for sig, handler in previous.items():
+            signal.signal(sig, handler)
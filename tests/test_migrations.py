@@ -0,0 +1,102 @@
+import sqlite3 as sqlite
+from typing import *
+
+import pytest
+
+from ext.connection_pool import ConnectionPool
+from ext.database_manager import DatabaseManager
+from ext.migrations import MigrationRunner, MIGRATIONS
+from ext.storage import NewNote
+
+# as they appear in a SEARCH step of a query plan
+USERNAME_INDEX: str = 'INDEX idx_users_username '
+TOKENS_INDEX: str = 'INDEX idx_tokens_user_id '
+NOTES_INDEX: str = 'INDEX idx_notes_owner_subject '
+# primary key of subject_stats
+STATS_INDEX: str = 'INDEX sqlite_autoindex_subject_stats_1 '
+ROWID: str = 'INTEGER PRIMARY KEY '
+
+# hot DatabaseManager methods, called with the user and the IDs of their notes (math, math, physics),
+# and the indexes their statements have to use
+HOT_QUERIES: List[Tuple[str, Callable[[DatabaseManager, int, List[int]], Any], List[str]]] = [
+    ('username_exists', lambda db, user_id, note_ids: db.username_exists('student'), [USERNAME_INDEX]),
+    ('user_id_exists', lambda db, user_id, note_ids: db.user_id_exists(user_id), [ROWID]),
+    ('get_login_credentials', lambda db, user_id, note_ids: db.get_login_credentials('student'),
+     [USERNAME_INDEX, TOKENS_INDEX]),
+    ('get_token_pair_if_user_exists', lambda db, user_id, note_ids: db.get_token_pair_if_user_exists(user_id),
+     [ROWID, TOKENS_INDEX]),
+    ('get_refresh_token_by_user_id', lambda db, user_id, note_ids: db.get_refresh_token_by_user_id(user_id),
+     [TOKENS_INDEX]),
+    ('refresh_access_token', lambda db, user_id, note_ids: db.refresh_access_token(user_id), [TOKENS_INDEX]),
+    ('get_subject', lambda db, user_id, note_ids: db.get_subject(user_id, 'math', after=note_ids[0], limit=10),
+     [NOTES_INDEX]),
+    # a batch of 2 ends exactly after math, so the next batch runs both continuation queries
+    ('iter_notes', lambda db, user_id, note_ids: list(db.iter_notes(user_id, batch_size=2)), [NOTES_INDEX]),
+    ('get_all_subjects', lambda db, user_id, note_ids: db.get_all_subjects(user_id), [STATS_INDEX]),
+    ('get_note_by_id', lambda db, user_id, note_ids: db.get_note_by_id(user_id, note_ids[0]), [ROWID]),
+    ('delete_note_by_id', lambda db, user_id, note_ids: db.delete_note_by_id(user_id, note_ids[2]), [ROWID]),
+]
+
+
+def query_plan(pool: ConnectionPool, sql: str, parameters: Any) -> List[str]:
+    with pool.read() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', parameters)
+        return [row[3] for row in cursor.fetchall()]
+
+
+@pytest.mark.parametrize('name, call, indexes', HOT_QUERIES, ids=[query[0] for query in HOT_QUERIES])
+def test_hot_query_uses_index(database: DatabaseManager, db_path: str, name: str,
+                              call: Callable[[DatabaseManager, int, List[int]], Any], indexes: List[str]) -> None:
+    user_id: int = database.add_user('student', 'hash').user_id
+    note_ids: List[int] = database.add_notes(user_id, [NewNote('math', 5, '', 1.0), NewNote('math', 4, '', 1.0),
+                                                       NewNote('physics', 3, '', 1.0)])
+    statements: List[Tuple[str, Any]] = []
+
+    def observer(sql: str, parameters: Any, duration: float, rows: int) -> None:
+        if sql.split(maxsplit=1)[0] in ('SELECT', 'UPDATE', 'DELETE'):
+            statements.append((sql, parameters))
+
+    database.add_query_observer(observer)
+    try:
+        call(database, user_id, note_ids)
+    finally:
+        database.remove_query_observer(observer)
+    assert statements
+
+    # the captured statements with their real parameters
+    pool: ConnectionPool = ConnectionPool(db_path, size=1)
+    try:
+        plans: List[List[str]] = [query_plan(pool, sql, parameters) for sql, parameters in statements]
+    finally:
+        pool.close()
+    steps: List[str] = [step for plan in plans for step in plan]
+    for index in indexes:
+        assert any(step.startswith('SEARCH') and index in step for step in steps), plans
+    # a SCAN step reads the whole table (or index)
+    assert not any(step.startswith('SCAN') for step in steps), plans
+    # sorting in a temp b-tree would load all rows first
+    assert not any('TEMP B-TREE' in step for step in steps), plans
+
+
+def test_old_database_is_upgraded_in_place(db_path: str) -> None:
+    # a database file as created before the migrations existed, with a duplicate token row
+    with sqlite.connect(db_path) as connection:
+        MIGRATIONS[0].apply(connection.cursor())
+        connection.execute("""INSERT INTO users (username, password) VALUES ('user', 'password')""")
+        connection.executemany("""INSERT INTO tokens (access_token, expires_at, refresh_token, user_id)
+            VALUES (?, '0', 'refresh', 1)""", [('first',), ('second',)])
+        connection.execute("""INSERT INTO notes (subject, note, note_owner) VALUES ('math', '5', 1)""")
+    connection.close()
+
+    pool: ConnectionPool = ConnectionPool(db_path, size=1)
+    try:
+        assert MigrationRunner().migrate(pool) == MIGRATIONS[-1].version
+        with pool.read() as cursor:
+            cursor.execute("""SELECT access_token FROM tokens WHERE user_id = 1""")
+            assert cursor.fetchall() == [('first',)]
+            cursor.execute("""SELECT note FROM notes""")
+            assert cursor.fetchall() == [(5,)]
+        plan: List[str] = query_plan(pool, """SELECT id FROM users WHERE username = ? LIMIT 1""", ('user',))
+        assert not any(step.startswith('SCAN') for step in plan), plan
+    finally:
+        pool.close()
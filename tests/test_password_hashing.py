@@ -0,0 +1,26 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import *
+
+from ext.password_hashing import PasswordEngine, hasher_from_string
+
+
+def test_hashing_processes_started_from_several_threads() -> None:
+    engine: PasswordEngine = PasswordEngine(hasher_from_string('pbkdf2-sha256:i=1000'), workers=2)
+    try:
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            stored: List[str] = list(executor.map(engine.hash, [f'password{i}' for i in range(8)]))
+        assert all(engine.verify(f'password{i}', hashed).valid for i, hashed in enumerate(stored))
+        assert not engine.verify('wrong', stored[0]).valid
+    finally:
+        engine.close()
+
+
+def test_hashing_in_processes_matches_the_calling_thread() -> None:
+    hasher = hasher_from_string('pbkdf2-sha256:i=1000')
+    in_processes: PasswordEngine = PasswordEngine(hasher, workers=1)
+    in_thread: PasswordEngine = PasswordEngine(hasher, workers=0)
+    try:
+        assert in_thread.verify('password', in_processes.hash('password')).valid
+        assert in_processes.verify('password', in_thread.hash('password')).valid
+    finally:
+        in_processes.close()
@@ -0,0 +1,117 @@
+import http.client
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from typing import *
+
+import pytest
+
+from ext.prefork_server import DrainingWSGIServer
+
+ROOT: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def slow_app(environ, start_response) -> List[bytes]:
+    time.sleep(float(environ['QUERY_STRING'] or 0))
+    start_response('200 OK', [('Content-Type', 'text/plain')])
+    return [b'done']
+
+
+def request(port: int, delay: float, responses: List[bytes]) -> None:
+    connection: http.client.HTTPConnection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    connection.request('GET', f'/?{delay}')
+    responses.append(connection.getresponse().read())
+
+
+def start(server: DrainingWSGIServer) -> threading.Thread:
+    thread: threading.Thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return thread
+
+
+def test_drain_waits_for_running_requests() -> None:
+    server: DrainingWSGIServer = DrainingWSGIServer('127.0.0.1', 0, slow_app)
+    start(server)
+    responses: List[bytes] = []
+    client: threading.Thread = threading.Thread(target=request, args=(server.server_port, 0.5, responses))
+    client.start()
+    time.sleep(0.1)
+
+    server.shutdown()
+    assert server.drain(5)
+    client.join()
+    assert responses == [b'done']
+    server.server_close()
+
+
+def test_drain_gives_up_after_the_timeout() -> None:
+    server: DrainingWSGIServer = DrainingWSGIServer('127.0.0.1', 0, slow_app)
+    start(server)
+    responses: List[bytes] = []
+    client: threading.Thread = threading.Thread(target=request, args=(server.server_port, 1, responses))
+    client.start()
+    time.sleep(0.1)
+
+    server.shutdown()
+    assert not server.drain(0.1)
+    assert server.drain(5)
+    client.join()
+    server.server_close()
+
+
+def test_drain_without_requests() -> None:
+    server: DrainingWSGIServer = DrainingWSGIServer('127.0.0.1', 0, slow_app)
+    start(server)
+    request(server.server_port, 0, [])
+    server.shutdown()
+    assert server.drain(0)
+    server.server_close()
+
+
+@pytest.mark.parametrize('delay', [0.0, 0.01, 0.05, 0.2])
+def test_sigterm_while_workers_start(db_path: str, delay: float) -> None:
+    process: subprocess.Popen = subprocess.Popen(
+        [sys.executable, '-m', 'ext.prefork_server', '--host', '127.0.0.1', '--port', '0', '--workers', '3',
+         '--db', db_path],
+        cwd=ROOT, env=dict(os.environ, PYTHONUNBUFFERED='1', MYNOTES_MAINTENANCE_INTERVAL='0'),
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    try:
+        assert 'listening' in process.stdout.readline()
+        time.sleep(delay)
+        process.send_signal(signal.SIGTERM)
+        # the master only exits after all workers have exited
+        assert process.wait(timeout=20) == 0
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+
+
+def test_metrics_signals_reach_every_worker(db_path: str) -> None:
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port: int = probe.getsockname()[1]
+    process: subprocess.Popen = subprocess.Popen(
+        [sys.executable, '-m', 'ext.prefork_server', '--host', '127.0.0.1', '--port', str(port), '--workers', '2',
+         '--db', db_path],
+        cwd=ROOT, env=dict(os.environ, PYTHONUNBUFFERED='1', MYNOTES_MAINTENANCE_INTERVAL='0', MYNOTES_METRICS='1'),
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    try:
+        assert 'listening' in process.stdout.readline()
+        # sent while the workers are still starting, they handle it once they are ready
+        process.send_signal(signal.SIGUSR2)
+        for _ in range(20):
+            connection: http.client.HTTPConnection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+            connection.request('GET', '/metrics')
+            assert 'mynotes_metrics_enabled 0' in connection.getresponse().read().decode()
+            connection.close()
+        process.send_signal(signal.SIGTERM)
+        assert process.wait(timeout=20) == 0
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
@@ -0,0 +1,122 @@
+import hashlib
+import os
+from typing import *
+
+import pytest
+
+from ext.flask_server import FlaskServer
+from ext.rate_limit import (LoginRateLimiter, MemoryRateLimitStore, SqliteRateLimitStore, _retry_after,
+                            _window_state)
+
+
+def test_window_state_moves_the_counters_to_the_current_window() -> None:
+    assert _window_state(5, 3, 2, 5) == (3, 2)
+    # the current window of the key became the previous one
+    assert _window_state(4, 3, 2, 5) == (0, 3)
+    # more than one window has passed, nothing counts anymore
+    assert _window_state(3, 3, 2, 5) == (0, 0)
+
+
+def test_retry_after_at_window_boundaries() -> None:
+    # current window full: wait until it ends
+    assert _retry_after(10, 0, 10, 60.0, 120.0) == pytest.approx(60.0)
+    assert _retry_after(10, 0, 10, 60.0, 179.5) == pytest.approx(0.5)
+    assert _retry_after(9, 0, 10, 60.0, 179.5) == 0.0
+    # a full previous window counts completely at the start of the next one
+    assert _retry_after(0, 10, 10, 60.0, 120.0) == pytest.approx(0.001)
+    assert _retry_after(0, 10, 10, 60.0, 120.6) == 0.0
+    # half of the previous window still overlaps, 5 + 10 * 0.5 reaches the limit exactly
+    assert _retry_after(5, 10, 10, 60.0, 120.0) == pytest.approx(30.001)
+    assert _retry_after(5, 10, 10, 60.0, 150.0) == pytest.approx(0.001)
+    assert _retry_after(5, 10, 10, 60.0, 151.0) == 0.0
+
+
+def test_memory_store_limits_a_key() -> None:
+    store: MemoryRateLimitStore = MemoryRateLimitStore()
+    assert store.hit('user:a', 2, 10.0, now=0.0) == 0.0
+    assert store.hit('user:a', 2, 10.0, now=1.0) == 0.0
+    assert store.hit('user:a', 2, 10.0, now=2.0) == pytest.approx(8.0)
+    # refused requests are not counted
+    assert store.hit('user:a', 2, 10.0, now=20.0) == 0.0
+
+
+def test_memory_store_evicts_expired_keys() -> None:
+    store: MemoryRateLimitStore = MemoryRateLimitStore(eviction_interval=60.0)
+    store.hit('user:a', 1, 10.0, now=0.0)
+    store.hit('user:b', 1, 10.0, now=0.0)
+    assert len(store) == 2
+    # the next eviction is due, both windows are over
+    store.hit('user:c', 1, 10.0, now=100.0)
+    assert len(store) == 1
+
+
+def test_memory_store_drops_the_oldest_key_at_max_keys() -> None:
+    store: MemoryRateLimitStore = MemoryRateLimitStore(max_keys=2, eviction_interval=3600.0)
+    store.hit('user:a', 1, 10.0, now=0.0)
+    store.hit('user:b', 1, 10.0, now=0.0)
+    store.hit('user:c', 1, 10.0, now=1.0)
+    assert len(store) == 2
+    # a was dropped and starts over, b is still limited
+    assert store.hit('user:b', 1, 10.0, now=2.0) > 0
+    assert store.hit('user:c', 1, 10.0, now=2.0) > 0
+    assert store.hit('user:a', 1, 10.0, now=2.0) == 0.0
+
+
+def test_sqlite_store_is_shared_between_instances(tmp_path) -> None:
+    path: str = os.path.join(str(tmp_path), 'limits')
+    first: SqliteRateLimitStore = SqliteRateLimitStore(path)
+    second: SqliteRateLimitStore = SqliteRateLimitStore(path)
+    try:
+        assert first.hit('user:a', 2, 10.0, now=0.0) == 0.0
+        assert second.hit('user:a', 2, 10.0, now=1.0) == 0.0
+        assert first.hit('user:a', 2, 10.0, now=2.0) == pytest.approx(8.0)
+    finally:
+        first.close()
+        second.close()
+
+
+@pytest.fixture
+def limited_server(db_path: str) -> Iterator[FlaskServer]:
+    flask_server: FlaskServer = FlaskServer(db=db_path, metrics=False, token_lifetime=3600, token_pool_size=0,
+                                            hash_workers=0, password_hash='pbkdf2-sha256:i=1000', login_limit='2/60',
+                                            login_ip_limit='100/60', maintenance_interval=0)
+    yield flask_server
+    flask_server.context.db.close()
+
+
+def test_too_many_logins_get_429_with_retry_after(limited_server: FlaskServer) -> None:
+    client = limited_server.app.test_client()
+    password: str = hashlib.sha512(b'password1').hexdigest()
+    for _ in range(2):
+        assert client.post('/login', json={'username': 'student', 'password': password}).status_code != 429
+
+    response = client.post('/login', json={'username': 'student', 'password': password})
+    assert response.status_code == 429
+    assert 1 <= int(response.headers['Retry-After']) <= 60
+    assert response.get_json()['error']
+    # the limit is per username
+    assert client.post('/login', json={'username': 'teacher', 'password': password}).status_code != 429
+
+
+def test_limit_is_checked_before_the_storage(limited_server: FlaskServer, monkeypatch) -> None:
+    calls: List[str] = []
+    limiter: LoginRateLimiter = limited_server.context.login_limiter
+    check: Callable = limiter.check
+
+    def record_check(username: str, ip: str | None) -> int:
+        calls.append('check')
+        return check(username, ip)
+
+    def record_credentials(username: str) -> None:
+        calls.append('storage')
+        return None
+
+    monkeypatch.setattr(limiter, 'check', record_check)
+    monkeypatch.setattr(limited_server.context.db, 'get_login_credentials', record_credentials)
+    client = limited_server.app.test_client()
+    password: str = hashlib.sha512(b'password1').hexdigest()
+    for _ in range(3):
+        client.post('/login', json={'username': 'student', 'password': password})
+
+    # the limited third attempt never reaches the storage
+    assert calls == ['check', 'storage', 'check', 'storage', 'check']
@@ -0,0 +1,51 @@
+import os
+from typing import *
+
+import pytest
+
+from ext.flask_server import FlaskServer
+
+
+def raise_error() -> str:
+    raise RuntimeError('view failed')
+
+
+@pytest.fixture
+def profiled_server(db_path: str, tmp_path, monkeypatch) -> Iterator[FlaskServer]:
+    monkeypatch.setenv('MYNOTES_PROFILE_DIR', os.path.join(str(tmp_path), 'profiles'))
+    flask_server: FlaskServer = FlaskServer(db=db_path, metrics=False, token_lifetime=3600, token_pool_size=0,
+                                            hash_workers=0, login_limit='off', maintenance_interval=0,
+                                            profile='all')
+    flask_server.app.add_url_rule('/raise_error', 'raise_error', raise_error)
+    # like in debug mode, the exception is raised out of the app and after_request does not run
+    flask_server.app.config['PROPAGATE_EXCEPTIONS'] = True
+    yield flask_server
+    flask_server.context.db.close()
+
+
+def test_profiler_is_stopped_when_a_view_raises(profiled_server: FlaskServer, tmp_path) -> None:
+    client = profiled_server.app.test_client()
+    with pytest.raises(RuntimeError):
+        client.get('/raise_error')
+    client.get('/metrics')
+
+    # both requests were profiled, so the first one released the profiler
+    profiles: List[str] = sorted(os.listdir(os.path.join(str(tmp_path), 'profiles')))
+    assert len(profiles) == 2
+    assert any(profile.startswith('raise_error-') for profile in profiles)
+    assert any(profile.startswith('metrics-') for profile in profiles)
+
+
+def test_failed_requests_are_measured(db_path: str) -> None:
+    flask_server: FlaskServer = FlaskServer(db=db_path, metrics=True, token_lifetime=3600, token_pool_size=0,
+                                            hash_workers=0, login_limit='off', maintenance_interval=0)
+    flask_server.app.add_url_rule('/raise_error', 'raise_error', raise_error)
+    flask_server.app.config['PROPAGATE_EXCEPTIONS'] = True
+    client = flask_server.app.test_client()
+    for _ in range(3):
+        with pytest.raises(RuntimeError):
+            client.get('/raise_error')
+
+    metrics: str = flask_server.context.metrics.render()
+    assert 'mynotes_request_duration_seconds_count{endpoint="/raise_error"} 3' in metrics
+    flask_server.context.db.close()
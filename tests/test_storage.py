@@ -0,0 +1,181 @@
+import re
+from typing import *
+
+import pytest
+
+from ext.database_manager import DatabaseManager
+from ext.memory_storage import MemoryStorage
+from ext.storage import Storage, Note, NewNote, Subject, TokenPair, UserInfo, LoginCredentials
+from ext.utils import StringUtils
+
+
+@pytest.fixture(params=['sqlite', 'memory'])
+def storage(request, db_path: str) -> Iterator[Storage]:
+    """
+    Every test runs against both backends, they have to behave the same
+    """
+    backend: Storage
+    if request.param == 'sqlite':
+        backend = DatabaseManager(StringUtils, db=db_path, pool_size=2, token_lifetime=3600)
+    else:
+        backend = MemoryStorage(StringUtils, token_lifetime=3600)
+    yield backend
+    backend.close()
+
+
+@pytest.fixture
+def user_id(storage: Storage) -> int:
+    return storage.add_user('student', 'hash', salt='salt').user_id
+
+
+def add_notes(storage: Storage, user_id: int) -> List[int]:
+    return storage.add_notes(user_id, [
+        NewNote('math', 5, '2023-01-01', 1.0),
+        NewNote('physics', 3, '2023-01-02', 2.0),
+        NewNote('math', 2, '2023-01-03', 0.5),
+        NewNote('art', 6, '2023-01-04', 1.0),
+    ])
+
+
+# users and tokens
+
+def test_add_user(storage: Storage) -> None:
+    first: UserInfo = storage.add_user('first', 'hash')
+    second: UserInfo = storage.add_user('second', 'hash')
+
+    assert second.user_id > first.user_id
+    assert first.token_info.access_token != first.token_info.refresh_token
+    assert first.token_info.access_token != second.token_info.access_token
+    assert isinstance(first.token_info.expires_at, int)
+    assert storage.username_exists('first')
+    assert not storage.username_exists('third')
+    assert storage.user_id_exists(second.user_id)
+    assert not storage.user_id_exists(second.user_id + 1)
+
+
+def test_add_user_with_existing_username(storage: Storage, user_id: int) -> None:
+    with pytest.raises(ValueError):
+        storage.add_user('student', 'other hash')
+    assert storage.get_login_credentials('student').password == 'hash'
+
+
+def test_get_login_credentials(storage: Storage, user_id: int) -> None:
+    credentials: LoginCredentials = storage.get_login_credentials('student')
+
+    assert (credentials.user_id, credentials.password, credentials.salt) == (user_id, 'hash', 'salt')
+    assert credentials.token_pair == storage.get_token_pair_if_user_exists(user_id)
+    assert storage.get_login_credentials('nobody') is None
+
+
+def test_token_pair(storage: Storage, user_id: int) -> None:
+    token_pair: TokenPair = storage.get_token_pair_if_user_exists(user_id)
+
+    assert storage.get_refresh_token_by_user_id(user_id) == token_pair.refresh_token
+    assert storage.get_token_pair_if_user_exists(user_id + 1) is None
+
+
+def test_refresh_access_token(storage: Storage, user_id: int) -> None:
+    old: TokenPair = storage.get_token_pair_if_user_exists(user_id)
+    refreshed: TokenPair = storage.refresh_access_token(user_id)
+
+    assert refreshed.access_token != old.access_token
+    assert refreshed.refresh_token == ''
+    assert storage.get_token_pair_if_user_exists(user_id) == TokenPair(refreshed.access_token, old.refresh_token,
+                                                                       refreshed.expires_at)
+
+
+def test_update_password(storage: Storage, user_id: int) -> None:
+    storage.update_password(user_id, '$scrypt$ln=14,r=8,p=1$salt$key')
+    credentials: LoginCredentials = storage.get_login_credentials('student')
+
+    # new hashes contain their salt
+    assert (credentials.password, credentials.salt) == ('$scrypt$ln=14,r=8,p=1$salt$key', '')
+
+
+# notes
+
+def test_add_and_get_note(storage: Storage, user_id: int) -> None:
+    note_id: int = storage.add_note('math', 5, user_id, release_date='2023-01-01', weight=2)
+    note: Note = storage.get_note_by_id(user_id, note_id)
+
+    assert (note.id, note.subject, note.note, note.user_id, note.weight, note.release_date) == \
+           (note_id, 'math', 5, user_id, 2.0, '2023-01-01')
+    assert type(note.note) is int and type(note.weight) is float
+    assert re.fullmatch(r'\d{4}-\d\d-\d\d \d\d:\d\d:\d\d', note.created_at)
+    assert storage.get_note_by_id(user_id, note_id + 1) is None
+
+
+def test_note_of_other_user_is_invisible(storage: Storage, user_id: int) -> None:
+    other_id: int = storage.add_user('other', 'hash').user_id
+    note_id: int = storage.add_note('math', 5, other_id)
+
+    assert storage.get_note_by_id(user_id, note_id) is None
+    storage.delete_note_by_id(user_id, note_id)
+    assert storage.get_note_by_id(other_id, note_id) is not None
+
+
+def test_add_notes(storage: Storage, user_id: int) -> None:
+    note_ids: List[int] = add_notes(storage, user_id)
+
+    assert note_ids == sorted(note_ids) and len(set(note_ids)) == 4
+    assert [storage.get_note_by_id(user_id, note_id).note for note_id in note_ids] == [5, 3, 2, 6]
+    assert storage.add_notes(user_id, []) == []
+
+
+def test_get_subject(storage: Storage, user_id: int) -> None:
+    note_ids: List[int] = add_notes(storage, user_id)
+    subject: Subject = storage.get_subject(user_id, 'math')
+
+    assert (subject.name, subject.note_count) == ('math', 2)
+    assert subject.gpa == pytest.approx((5 * 1.0 + 2 * 0.5) / 1.5)
+    assert [note.id for note in subject.notes] == [note_ids[0], note_ids[2]]
+    assert all(note.subject == 'math' and note.user_id == user_id for note in subject.notes)
+    with pytest.raises(ValueError):
+        storage.get_subject(user_id, 'history')
+
+
+def test_get_subject_pages(storage: Storage, user_id: int) -> None:
+    note_ids: List[int] = storage.add_notes(user_id, [NewNote('math', i % 6 + 1) for i in range(5)])
+
+    first: Subject = storage.get_subject(user_id, 'math', limit=2)
+    second: Subject = storage.get_subject(user_id, 'math', after=first.notes[-1].id, limit=2)
+    last: Subject = storage.get_subject(user_id, 'math', after=second.notes[-1].id, limit=2)
+
+    assert [note.id for page in (first, second, last) for note in page.notes] == note_ids
+    # the summary always covers the whole subject
+    assert first.note_count == second.note_count == last.note_count == 5
+    assert storage.get_subject(user_id, 'math', after=note_ids[-1]).notes == []
+
+
+def test_delete_note(storage: Storage, user_id: int) -> None:
+    note_ids: List[int] = add_notes(storage, user_id)
+
+    storage.delete_note_by_id(user_id, note_ids[2])
+    assert storage.get_note_by_id(user_id, note_ids[2]) is None
+    subject: Subject = storage.get_subject(user_id, 'math')
+    assert (subject.note_count, subject.gpa) == (1, pytest.approx(5.0))
+
+    # a subject without notes does not exist anymore
+    storage.delete_note_by_id(user_id, note_ids[0])
+    with pytest.raises(ValueError):
+        storage.get_subject(user_id, 'math')
+
+
+def test_get_all_subjects(storage: Storage, user_id: int) -> None:
+    add_notes(storage, user_id)
+    subjects: List[Subject] = storage.get_all_subjects(user_id)
+
+    assert [(subject.name, subject.note_count) for subject in subjects] == [('art', 1), ('math', 2), ('physics', 1)]
+    assert [subject.gpa for subject in subjects] == pytest.approx([6.0, 4.0, 3.0])
+    assert all(subject.notes == [] for subject in subjects)
+    assert storage.get_all_subjects(user_id + 1) == []
+
+
+def test_iter_notes(storage: Storage, user_id: int) -> None:
+    note_ids: List[int] = add_notes(storage, user_id)
+    notes: List[Note] = list(storage.iter_notes(user_id, batch_size=1))
+
+    # ordered by subject, then ID
+    assert [note.id for note in notes] == [note_ids[3], note_ids[0], note_ids[2], note_ids[1]]
+    assert notes[0] == storage.get_note_by_id(user_id, note_ids[3])
+    assert list(storage.iter_notes(user_id + 1)) == []
@@ -0,0 +1,88 @@
+from typing import *
+
+import pytest
+
+from ext.database_manager import DatabaseManager
+from ext.token_cache import TokenCache
+from ext.utils import AuthHelper, Principal, InvalidArgumentException
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0) -> None:
+        self.now: float = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_entry_expires_with_the_token() -> None:
+    clock: FakeClock = FakeClock()
+    cache: TokenCache = TokenCache(max_ttl=60, clock=clock)
+    cache.put(1, 'token', 'principal', expires_at=clock.now + 10)
+
+    clock.now += 9.9
+    assert cache.get(1, 'token') == 'principal'
+    clock.now += 0.1
+    assert cache.get(1, 'token') is None
+    assert cache.stats().size == 0
+
+
+def test_entry_expires_after_max_ttl() -> None:
+    clock: FakeClock = FakeClock()
+    cache: TokenCache = TokenCache(max_ttl=60, clock=clock)
+    # the token is valid for a day, but the cache keeps it at most max_ttl seconds
+    cache.put(1, 'token', 'principal', expires_at=clock.now + 24 * 60 * 60)
+
+    clock.now += 59
+    assert cache.get(1, 'token') == 'principal'
+    clock.now += 1
+    assert cache.get(1, 'token') is None
+
+
+def test_least_recently_used_entry_is_evicted() -> None:
+    clock: FakeClock = FakeClock()
+    cache: TokenCache = TokenCache(max_size=2, clock=clock)
+    cache.put(1, 'a', 'first', expires_at=clock.now + 10)
+    cache.put(2, 'b', 'second', expires_at=clock.now + 10)
+    assert cache.get(1, 'a') == 'first'  # now 2 is the least recently used
+
+    cache.put(3, 'c', 'third', expires_at=clock.now + 10)
+    assert cache.get(2, 'b') is None
+    assert cache.get(1, 'a') == 'first'
+    assert cache.get(3, 'c') == 'third'
+    assert cache.stats().evictions == 1
+    assert cache.stats().size == 2
+
+
+def test_hits_and_misses_are_counted() -> None:
+    clock: FakeClock = FakeClock()
+    cache: TokenCache = TokenCache(clock=clock)
+    cache.put(1, 'token', 'principal', expires_at=clock.now + 10)
+    cache.get(1, 'token')
+    cache.get(1, 'token')
+    cache.get(1, 'other')
+
+    assert (cache.stats().hits, cache.stats().misses) == (2, 1)
+    assert abs(cache.stats().hit_rate - 2 / 3) < 1e-9
+
+
+def test_refresh_invalidates_cached_tokens_of_the_user(database: DatabaseManager) -> None:
+    cache: TokenCache = TokenCache()
+    auth_helper: AuthHelper = AuthHelper(database, token_cache=cache)
+    user_id: int = database.add_user('user', 'password').user_id
+    other_id: int = database.add_user('other', 'password').user_id
+    old_token: str = database.get_token_pair_if_user_exists(user_id).access_token
+    other_token: str = database.get_token_pair_if_user_exists(other_id).access_token
+
+    assert isinstance(auth_helper.authenticate(str(user_id), old_token), Principal)
+    auth_helper.authenticate(str(other_id), other_token)
+    assert cache.get(user_id, old_token) is not None
+
+    new_token: str = auth_helper.refresh_access_token(user_id).access_token
+    assert cache.get(user_id, old_token) is None
+    # tokens of other users stay cached
+    assert cache.get(other_id, other_token) is not None
+
+    with pytest.raises(InvalidArgumentException, match='Access token is invalid'):
+        auth_helper.authenticate(str(user_id), old_token)
+    assert auth_helper.authenticate(str(user_id), new_token).access_token == new_token
@@ -0,0 +1,144 @@
+import sqlite3 as sqlite
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import *
+
+import pytest
+
+from ext.connection_pool import ConnectionPool
+from ext.database_manager import DatabaseManager
+from ext.utils import StringUtils
+from ext.write_queue import GroupCommitQueue
+
+
+@pytest.fixture
+def pool(db_path: str) -> Iterator[ConnectionPool]:
+    connection_pool: ConnectionPool = ConnectionPool(db_path, size=1)
+    with connection_pool.write() as cursor:
+        cursor.execute("""CREATE TABLE items (name TEXT UNIQUE NOT NULL)""")
+        cursor.execute("""INSERT INTO items (name) VALUES ('taken')""")
+    yield connection_pool
+    connection_pool.close()
+
+
+def insert(name: str) -> Callable[[sqlite.Cursor], int]:
+    def work(cursor: sqlite.Cursor) -> int:
+        cursor.execute("""INSERT INTO items (name) VALUES (?)""", (name,))
+        return cursor.lastrowid
+    return work
+
+
+def names(pool: ConnectionPool) -> Set[str]:
+    with pool.read() as cursor:
+        cursor.execute("""SELECT name FROM items""")
+        return {row[0] for row in cursor.fetchall()}
+
+
+def submit_all(write_queue: GroupCommitQueue, works: List[Callable[[sqlite.Cursor], Any]]) -> List[Future]:
+    executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=len(works))
+    futures: List[Future] = [executor.submit(write_queue.submit, work) for work in works]
+    executor.shutdown(wait=True)
+    return futures
+
+
+def test_failing_job_is_rolled_back_alone(pool: ConnectionPool) -> None:
+    transactions: List[str] = []
+    pool.add_observer(lambda sql, parameters, duration, rows: transactions.append(sql) if sql == 'BEGIN IMMEDIATE'
+                      else None)
+
+    def partial_then_duplicate(cursor: sqlite.Cursor) -> None:
+        cursor.execute("""INSERT INTO items (name) VALUES ('partial')""")
+        cursor.execute("""INSERT INTO items (name) VALUES ('taken')""")
+
+    # the writer only commits once the batch is full, so all three share one transaction
+    write_queue: GroupCommitQueue = GroupCommitQueue(pool, max_batch=3, max_delay=10.0)
+    try:
+        first, failing, second = submit_all(write_queue, [insert('first'), partial_then_duplicate, insert('second')])
+    finally:
+        write_queue.close()
+
+    assert len(transactions) == 1
+    assert isinstance(failing.exception(), sqlite.IntegrityError)
+    assert first.result() != second.result()
+    # the savepoint undid the first insert of the failing job, its neighbours are committed
+    assert names(pool) == {'taken', 'first', 'second'}
+
+
+def test_failed_commit_fails_every_job_of_the_batch(pool: ConnectionPool) -> None:
+    with pool.write() as cursor:
+        cursor.execute("""CREATE TABLE parents (id INTEGER PRIMARY KEY)""")
+        cursor.execute("""CREATE TABLE children (parent_id INTEGER REFERENCES parents (id)
+            DEFERRABLE INITIALLY DEFERRED)""")
+        # outside of a transaction, so it is applied to the write connection
+        cursor.execute('PRAGMA foreign_keys=ON')
+
+    def orphan(cursor: sqlite.Cursor) -> None:
+        # a deferred foreign key is only checked by the commit
+        cursor.execute("""INSERT INTO children (parent_id) VALUES (42)""")
+
+    write_queue: GroupCommitQueue = GroupCommitQueue(pool, max_batch=3, max_delay=10.0)
+    try:
+        futures: List[Future] = submit_all(write_queue, [insert('first'), orphan, insert('second')])
+    finally:
+        write_queue.close()
+
+    assert all(isinstance(future.exception(), sqlite.IntegrityError) for future in futures)
+    assert names(pool) == {'taken'}
+
+
+def test_close_commits_the_queued_jobs(pool: ConnectionPool) -> None:
+    started: threading.Event = threading.Event()
+    release: threading.Event = threading.Event()
+
+    def blocking(cursor: sqlite.Cursor) -> None:
+        started.set()
+        release.wait()
+
+    write_queue: GroupCommitQueue = GroupCommitQueue(pool, max_batch=1)
+    executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=4)
+    executor.submit(write_queue.submit, blocking)
+    assert started.wait(timeout=5)
+    futures: List[Future] = [executor.submit(write_queue.submit, insert(f'queued{i}')) for i in range(3)]
+    # wait until the writes are in the queue behind the blocked one, close has to come after them
+    deadline: float = time.monotonic() + 5
+    while write_queue._GroupCommitQueue__queue.qsize() < 3 and time.monotonic() < deadline:
+        time.sleep(0.001)
+
+    closer: threading.Thread = threading.Thread(target=write_queue.close)
+    closer.start()
+    release.set()
+    closer.join(timeout=5)
+    executor.shutdown(wait=True)
+
+    assert not closer.is_alive()
+    assert all(future.exception() is None for future in futures)
+    assert names(pool) == {'taken', 'queued0', 'queued1', 'queued2'}
+
+
+def test_submit_after_close_raises(pool: ConnectionPool) -> None:
+    write_queue: GroupCommitQueue = GroupCommitQueue(pool)
+    write_queue.close()
+    with pytest.raises(RuntimeError):
+        write_queue.submit(insert('late'))
+    assert names(pool) == {'taken'}
+
+
+def test_concurrent_add_note_ids_are_unique(db_path: str) -> None:
+    database: DatabaseManager = DatabaseManager(StringUtils, db=db_path, pool_size=2, group_commit=True)
+    try:
+        user_id: int = database.add_user('student', 'hash').user_id
+        barrier: threading.Barrier = threading.Barrier(8)
+
+        def add(thread: int) -> List[int]:
+            barrier.wait()
+            return [database.add_note('math', i % 6 + 1, user_id) for i in range(25)]
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            note_ids: List[int] = [note_id for ids in executor.map(add, range(8)) for note_id in ids]
+
+        # every caller got the id of its own row, even when the rows share a commit
+        assert len(set(note_ids)) == len(note_ids) == 200
+        assert sorted(note_ids) == [note.id for note in database.get_subject(user_id, 'math').notes]
+    finally:
+        database.close()